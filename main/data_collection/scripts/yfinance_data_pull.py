@@ -73,6 +73,20 @@ def retrieve_tickers_from_list(
     return price_df
 
 
+def retrieve_new_price_rows(
+    ticker_list: list[str],
+    start_date: datetime.date,
+) -> pd.DataFrame:
+
+    """The prices of ticker_list from start_date on, for the incremental daily update. Unlike retrieve_tickers_from_list no minimum series length applies"""
+
+    price_df = yf.download(
+        list(ticker_list), start=start_date.strftime(YFINANCE_DATE_FORMAT)
+    )[COLUMN_TO_RETRIEVE]
+    logging.info(f"downloaded {len(price_df)} new price rows")
+    return price_df
+
+
 if __name__ == "__main__":
 
     price_df = retrieve_tickers_from_list()
@@ -1,5 +1,7 @@
+from __future__ import annotations
 from datetime import datetime
 from math import floor
+from typing import NamedTuple
 import logging
 
 import pandas as pd
@@ -14,6 +16,11 @@ from main.utilities.functions import (
 from main.model_building.backtesting.database_utils import (
     TradeHistorySaver,
     RegularSpreadSaver,
+    LAST_LISTING_COLUMN,
+    STATUS_LAST_LISTING,
+    STATUS_NOT_TRADED,
+    ledger_status_codes,
+    valuation_ledger_frame,
 )
 
 from main.utilities.paths import (
@@ -24,7 +31,7 @@ from main.utilities.paths import (
 
 from main.utilities.constants import (
     CAPITAL_STARTING,
-    TRADE_STARTED_ABANDONED_STRING,
+    LAST_LISTING_STRING,
 )
 
 DATABASE_NAME_BACKTEST_TRADEFRAMES = (
@@ -60,6 +67,14 @@ class BackTest:
         ticker2 (str): the second ticker of the pair
         ticker1_prices (pd.Series): the price series of the first ticker
         ticker2_prices (pd.Series): the price series of the second ticker
+        ticker1_price_array (np.ndarray): ticker1_prices aligned to the standardised spread as float64, set by trade
+        ticker2_price_array (np.ndarray): ticker2_prices aligned to the standardised spread as float64, set by trade
+        standardised_spread_array (np.ndarray): the standardised spread as float64, set by trade
+        ticker1_price (float): the price of ticker 1 on the bar being traded
+        ticker2_price (float): the price of ticker 2 on the bar being traded
+        position (int): the integer position of the bar being traded
+        ledger_valuation (np.ndarray): the per day valuation, float64 on the standardised spread's positions, set by trade
+        ledger_status (np.ndarray): the per day int8 status code (trade open, abandoned and last listing flags, see database_utils), set by trade
         kalman_spread (bool): whether to use the kalman spread or not
         regular_spread (pd.Series): the regular spread series
         standardised_spread (pd.Series): the standardised spread series
@@ -67,7 +82,8 @@ class BackTest:
         spread_to_trigger_trade_exit (int): the spread to trigger a trade exit, a default exists but can be overwritten by user
         spread_to_abandon_trade (int): the spread to abandon a trade, a default exists but can be overwritten by user
         capital (float): the starting capital for the strategy
-        trade_history_frame (pd.DataFrame): the dataframe that records the trade history
+        trade_log (TradeLog): the closed trades, held as typed arrays while trading
+        trade_history_frame (pd.DataFrame): the dataframe that records the trade history, built from trade_log once trading ends
         trade_counter (int): the trade counter, incremented by 1 for each trade
         trade_abandoned (bool): whether the trade was abandoned or not. Once abandoned, the strategy will not engage in any more trades
         trade_status_open (bool): whether the trade is open or not
@@ -80,7 +96,11 @@ class BackTest:
         short_capital_pool (float): the capital pool for the short position, done on a per trade basis, as this may change
         ticker1_trade_opening_price (float): the price of ticker 1 at trade entry
         ticker2_trade_opening_price (float): the price of ticker 2 at trade entry
+        last_listing_date (datetime): the date a trade still open is exited on as a delisting, the last date of the standardised spread
+        last_date (datetime): the last date traded, None before the first
+        last_standardised_spread (float): the standardised spread on the last date traded, carried forward as the previous day's spread for the hop check
 
+    The trading state can be saved with state() and a backtest resumed from it with from_state(), after which step() trades one bar at a time.
     """
 
     STARTING_TRADE_COUNTER = 0
@@ -108,6 +128,7 @@ class BackTest:
         "short_ticker",
         "closing_capital",
         "trade_abandoned",
+        "opened_abandoned",
     ]
 
     DEFAULT_SPREAD_TO_TRIGGER_TRADE_ENTRY = 2
@@ -148,9 +169,7 @@ class BackTest:
         self.spread_to_trigger_trade_exit = spread_to_trigger_trade_exit
         self.spread_to_abandon_trade = spread_to_abandon_trade
         self.capital = CAPITAL_STARTING
-        self.trade_history_frame = pd.DataFrame(
-            columns=self.TRADE_DF_RECORD_COLUMNS_LIST
-        )
+        self.trade_log = TradeLog(self.ticker1, self.ticker2)
         self.trade_counter = self.STARTING_TRADE_COUNTER
         self.trade_abandoned = False
 
@@ -174,6 +193,8 @@ class BackTest:
         self.short_capital_pool = 0
         self.ticker1_trade_opening_price = None
         self.ticker2_trade_opening_price = None
+        self.last_date = None
+        self.last_standardised_spread = None
 
         if self.ticker1_prices.empty:
             raise ValueError(f"The price series for {self.ticker1} is empty.")
@@ -203,57 +224,214 @@ class BackTest:
 
         """
 
-        self._set_trade_df_if_trade_opens_abandoned()
+        self._set_trade_log_if_trade_opens_abandoned()
 
-        self.regular_spread[self.SPREAD_SERIES_VALUATION_AND_INFO_COLS] = np.nan
+        self.last_listing_date = self.standardised_spread.index.max()
+        self._align_price_arrays()
+        self._allocate_ledger(len(self.standardised_spread))
 
-        for date, standardised_spread in self.standardised_spread.items():
-            if self._check_and_set_abandoned_or_zero_spread(
+        for position, date in enumerate(self.standardised_spread.index):
+            self.position = position
+            standardised_spread = self.standardised_spread_array[position]
+            self.ticker1_price = self.ticker1_price_array[position]
+            self.ticker2_price = self.ticker2_price_array[position]
+            self._trade_on_date(
                 date=date,
                 standardised_spread=standardised_spread,
-            ):
-                continue
+            )
+            self.last_date = date
+            self.last_standardised_spread = standardised_spread  # the previous day's spread for the next day's hop check
+
+        self.trade_history_frame = self.trade_log.to_frame()
+        self._assign_valuation_ledger(
+            valuation_ledger_frame(
+                self.ledger_valuation,
+                self.ledger_status,
+                self.standardised_spread.index,
+            )
+        )
 
-            # this mark to mark values the strategy, if its open or not
-            self._record_trade_valuation_on_date(
-                date=date,
+        # results df and sql table creation
+        if test_inputs is None:
+            self._save_trade_trade_history_information_to_databases()
+
+        logging.info(f"Completed backtest for {self.ticker1} & {self.ticker2}")
+
+    def _align_price_arrays(
+        self,
+    ) -> None:
+
+        """Aligns both price series to the standardised spread once, as contiguous float64 arrays sharing the spread's integer position, so the daily loop reads each bar's prices by position rather than by a label lookup on the series"""
+
+        self.standardised_spread_array = np.ascontiguousarray(
+            self.standardised_spread.to_numpy(dtype=np.float64)
+        )
+        self.ticker1_price_array = np.ascontiguousarray(
+            self.ticker1_prices.reindex(self.standardised_spread.index).to_numpy(
+                dtype=np.float64
+            )
+        )
+        self.ticker2_price_array = np.ascontiguousarray(
+            self.ticker2_prices.reindex(self.standardised_spread.index).to_numpy(
+                dtype=np.float64
             )
+        )
 
-            # these next two if/elif are for when the trade is to be abandoned
-            if self._check_set_trade_abandoned_this_date(
-                date=date,
-                standardised_spread=standardised_spread,
-            ):
-                continue
+    def _allocate_ledger(
+        self,
+        number_of_dates: int,
+    ) -> None:
+        self.ledger_valuation = np.full(number_of_dates, np.nan)
+        self.ledger_status = np.full(number_of_dates, STATUS_NOT_TRADED, dtype=np.int8)
 
-            # here we put a condition to exit the trade if it is the last day of the standardised spread, as this would be delisting or similar
-            if self._check_if_delisted_then_exit_trade(
-                date=date,
-                standardised_spread=standardised_spread,
-            ):
-                continue
+    def _record_ledger_entry(
+        self,
+        valuation: float,
+    ) -> None:
 
-            # these two elifs are for if the trade 'hops the spread' in one direction
-            if self._check_if_trade_hopped_spread_then_exit(
-                date=date,
-                standardised_spread=standardised_spread,
-            ):
-                continue
+        self.ledger_valuation[self.position] = valuation
+        self.ledger_status[self.position] = ledger_status_codes(
+            self.trade_status_open, self.trade_abandoned
+        )
 
-            # these next two elifs are for the 4 regular conditions for trade entry and exit
-            if self._check_four_regular_conditions_for_trade_entry_and_exit(
-                date=date,
-                standardised_spread=standardised_spread,
-            ):
-                continue
+    def _assign_valuation_ledger(
+        self,
+        valuation_ledger: pd.DataFrame,
+    ) -> None:
 
-        # results df and sql table creation
-        if test_inputs is None:
-            self._save_trade_trade_history_information_to_databases()
+        """Writes a ledger from valuation_ledger_frame into the valuation columns of the regular spread in one go, appending the traded dates the regular spread lacks"""
 
-        logging.info(f"Completed backtest for {self.ticker1} & {self.ticker2}")
+        dates = valuation_ledger.index
+        self.regular_spread[self.SPREAD_SERIES_VALUATION_AND_INFO_COLS] = np.nan
+
+        dates_missing_from_regular_spread = dates[
+            ~dates.isin(self.regular_spread.index)
+        ]
+        if len(dates_missing_from_regular_spread):
+            self.regular_spread = self.regular_spread.reindex(
+                self.regular_spread.index.append(dates_missing_from_regular_spread)
+            )
+
+        self.regular_spread.loc[
+            dates, self.SPREAD_SERIES_VALUATION_AND_INFO_COLS
+        ] = valuation_ledger[self.SPREAD_SERIES_VALUATION_AND_INFO_COLS].to_numpy()
+
+        if LAST_LISTING_COLUMN in valuation_ledger.columns:
+            last_listing_dates = valuation_ledger[LAST_LISTING_COLUMN].dropna().index
+            self.regular_spread[LAST_LISTING_COLUMN] = pd.Series(
+                np.nan, index=self.regular_spread.index, dtype=object
+            )  # enlarging with .loc would fill the other dates with a truncated "n" string
+            self.regular_spread.loc[
+                last_listing_dates, LAST_LISTING_COLUMN
+            ] = LAST_LISTING_STRING
 
-    def _set_trade_df_if_trade_opens_abandoned(
+    def _trade_on_date(
+        self,
+        date: datetime,
+        standardised_spread: float,
+    ) -> None:
+
+        if self._check_and_set_abandoned_or_zero_spread(
+            date=date,
+            standardised_spread=standardised_spread,
+        ):
+            return
+
+        # this mark to mark values the strategy, if its open or not
+        self._record_trade_valuation_on_date(
+            date=date,
+        )
+
+        # these next two if/elif are for when the trade is to be abandoned
+        if self._check_set_trade_abandoned_this_date(
+            date=date,
+            standardised_spread=standardised_spread,
+        ):
+            return
+
+        # here we put a condition to exit the trade if it is the last day of the standardised spread, as this would be delisting or similar
+        if self._check_if_delisted_then_exit_trade(
+            date=date,
+            standardised_spread=standardised_spread,
+        ):
+            return
+
+        # these two elifs are for if the trade 'hops the spread' in one direction
+        if self._check_if_trade_hopped_spread_then_exit(
+            date=date,
+            standardised_spread=standardised_spread,
+        ):
+            return
+
+        # these next two elifs are for the 4 regular conditions for trade entry and exit
+        self._check_four_regular_conditions_for_trade_entry_and_exit(
+            date=date,
+            standardised_spread=standardised_spread,
+        )
+
+    def state(
+        self,
+    ) -> BackTestState:
+
+        """A snapshot of everything carried from one bar to the next, to save and resume from with from_state"""
+
+        return BackTestState(
+            **{field: getattr(self, field) for field in BackTestState._fields}
+        )
+
+    @classmethod
+    def from_state(
+        cls,
+        state: BackTestState,
+    ) -> BackTest:
+
+        """A backtest carrying on from a saved state, for trading bar by bar with step. Nothing is read from the price parquet or the spread databases, and a fresh BackTestState(ticker1, ticker2, entry, exit, abandon) starts a new backtest"""
+
+        backtest = cls.__new__(cls)
+        for field, value in state._asdict().items():
+            setattr(backtest, field, value)
+        backtest.trade_log = TradeLog(backtest.ticker1, backtest.ticker2)
+
+        return backtest
+
+    def step(
+        self,
+        date: pd.Timestamp,
+        standardised_spread: float,
+        ticker1_price: float,
+        ticker2_price: float,
+        last_listing: bool = False,
+    ) -> tuple[pd.Series, pd.DataFrame]:
+
+        """Trades a single bar with the same logic trade applies to each day, from the state alone, so the work per bar does not grow with the length of the backtest. last_listing marks the bar as the pair's last, exiting an open trade as a delisting.
+
+        Returns the bar's valuation row (the columns trade adds to the regular spread) and the trades closed on it, in the trade history frame's layout.
+        """
+
+        self.ticker1_price = ticker1_price
+        self.ticker2_price = ticker2_price
+        self.standardised_spread = pd.Series([standardised_spread], index=[date])
+        self.position = 0
+        self._allocate_ledger(1)
+        self.trade_log = TradeLog(self.ticker1, self.ticker2)
+        self.last_listing_date = date if last_listing else None
+
+        if self.last_date is None:
+            self._set_trade_log_if_trade_opens_abandoned()
+        self._trade_on_date(
+            date=date,
+            standardised_spread=standardised_spread,
+        )
+        self.last_date = date
+        self.last_standardised_spread = standardised_spread
+        self.trade_history_frame = self.trade_log.to_frame()
+        self.regular_spread = valuation_ledger_frame(
+            self.ledger_valuation, self.ledger_status, [date]
+        )
+
+        return self.regular_spread.iloc[0], self.trade_history_frame
+
+    def _set_trade_log_if_trade_opens_abandoned(
         self,
     ) -> None:
 
@@ -261,15 +439,7 @@ class BackTest:
             self.standardised_spread.iloc[0] < -self.spread_to_abandon_trade
         ):
             self.trade_abandoned = True
-            self.trade_history_frame.loc[
-                self.FIRST_INDEX_TRADE_DF, self.TRADE_DF_RECORD_COLUMNS_LIST
-            ] = np.nan
-            self.trade_history_frame.loc[
-                self.FIRST_INDEX_TRADE_DF, "trade_abandoned"
-            ] = True
-            self.trade_history_frame.loc[
-                self.FIRST_INDEX_TRADE_DF, "closing_capital"
-            ] = TRADE_STARTED_ABANDONED_STRING
+            self.trade_log.opened_abandoned = True
 
     def _check_and_set_abandoned_or_zero_spread(
         self,
@@ -277,13 +447,7 @@ class BackTest:
         standardised_spread: float,
     ) -> bool:
         if (self.trade_abandoned == True) or (standardised_spread == 0):
-            self.regular_spread.loc[
-                date, self.SPREAD_SERIES_VALUATION_AND_INFO_COLS
-            ] = (
-                self.capital,
-                float(self.trade_status_open),
-                float(self.trade_abandoned),
-            )
+            self._record_ledger_entry(self.capital)
             return True
 
         else:
@@ -295,24 +459,9 @@ class BackTest:
     ) -> None:
 
         if self.trade_status_open:
-
-            self.regular_spread.loc[
-                date, self.SPREAD_SERIES_VALUATION_AND_INFO_COLS
-            ] = (
-                self._perform_valuation_trade_open(date),
-                float(self.trade_status_open),
-                float(self.trade_abandoned),
-            )
-
+            self._record_ledger_entry(self._perform_valuation_trade_open(date))
         else:
-
-            self.regular_spread.loc[
-                date, self.SPREAD_SERIES_VALUATION_AND_INFO_COLS
-            ] = (
-                self.capital,
-                float(self.trade_status_open),
-                float(self.trade_abandoned),
-            )
+            self._record_ledger_entry(self.capital)
 
     def _check_set_trade_abandoned_this_date(
         self,
@@ -354,17 +503,15 @@ class BackTest:
         date: datetime,
         standardised_spread: float,
     ) -> bool:
-        if (
-            date == self.standardised_spread.index.max()
-        ) and self.trade_status_open == True:
+        if (date == self.last_listing_date) and self.trade_status_open == True:
             if standardised_spread > 0:
                 self._exit_when_spread_was_positive(date)
-                self.regular_spread.loc[date, "trade_abandoned"] = "last_listing"
+                self.ledger_status[self.position] |= STATUS_LAST_LISTING
                 self._record_trade(closing_date=date)
                 self._close_trade_attributes()
             elif standardised_spread < 0:
                 self._exit_when_spread_was_negative(date)
-                self.regular_spread.loc[date, "trade_abandoned"] = "last_listing"
+                self.ledger_status[self.position] |= STATUS_LAST_LISTING
                 self._record_trade(closing_date=date)
                 self._close_trade_attributes()
 
@@ -394,8 +541,7 @@ class BackTest:
             )
 
             if abs(standardised_spread) > self.spread_to_abandon_trade or (
-                abs(standardised_spread)
-                + abs(self.standardised_spread.shift().loc[date])
+                abs(standardised_spread) + abs(self.last_standardised_spread)
                 > self.DEFAULT_SPREAD_HOP_TO_ABANDON_TRADE
             ):
 
@@ -416,7 +562,7 @@ class BackTest:
                 f"trade ({self.ticker1}_{self.ticker2}) has 'hopped the spread' from neg to pos on date {date}"
             )
             if abs(standardised_spread) > self.spread_to_abandon_trade or (
-                (standardised_spread - self.standardised_spread.shift().loc[date])
+                (standardised_spread - self.last_standardised_spread)
                 > self.DEFAULT_SPREAD_HOP_TO_ABANDON_TRADE
             ):
 
@@ -521,8 +667,8 @@ class BackTest:
         self.trade_status_open = True
         self.ticker1_minus_ticker2_trade_opening_spread_positive = spread_positive
         self.trade_opening_date = date
-        self.ticker2_trade_opening_price = self.ticker2_prices[date]
-        self.ticker1_trade_opening_price = self.ticker1_prices[date]
+        self.ticker2_trade_opening_price = self.ticker2_price
+        self.ticker1_trade_opening_price = self.ticker1_price
 
     # entries
     def _entry_when_spread_was_negative(
@@ -548,18 +694,18 @@ class BackTest:
 
         self.short_position_holding_name = self.ticker2
         self.capital -= (
-            self.ticker1_holding * self.ticker1_prices[date]
+            self.ticker1_holding * self.ticker1_price
         ) - self._transaction_cost_calculator(
             self.ticker1_holding,
             date,
-            self.ticker1_prices[date],
+            self.ticker1_price,
         )  # reduce the capital by the amount of ticker 1 stock we bought
         self.short_capital_pool += (
-            self.ticker2_holding * self.ticker2_prices[date]
+            self.ticker2_holding * self.ticker2_price
         ) - self._transaction_cost_calculator(
             self.ticker2_holding,
             date,
-            self.ticker2_prices[date],
+            self.ticker2_price,
             exit_and_short=True,
         )
 
@@ -586,59 +732,59 @@ class BackTest:
 
         self.short_position_holding_name = self.ticker1
         self.capital -= (
-            self.ticker2_holding * self.ticker2_prices[date]
+            self.ticker2_holding * self.ticker2_price
         ) - self._transaction_cost_calculator(
             self.ticker2_holding,
             date,
-            self.ticker2_prices[date],
+            self.ticker2_price,
         )  # reduce the capital by the amount of ticker 2 stock we bought
         self.short_capital_pool += (
-            self.ticker1_holding * self.ticker1_prices[date]
+            self.ticker1_holding * self.ticker1_price
         ) - self._transaction_cost_calculator(
             self.ticker1_holding,
             date,
-            self.ticker1_prices[date],
+            self.ticker1_price,
             exit_and_short=True,
         )
 
     # exits
     def _exit_when_spread_was_positive(self, date) -> None:
-        revenue_from_long_position = self.ticker2_prices[date] * self.ticker2_holding
-        outflow_from_short_position = self.ticker1_prices[date] * self.ticker1_holding
+        revenue_from_long_position = self.ticker2_price * self.ticker2_holding
+        outflow_from_short_position = self.ticker1_price * self.ticker1_holding
 
         self.short_capital_pool -= (
             outflow_from_short_position
             + self._transaction_cost_calculator(
                 self.ticker1_holding,
                 date,
-                self.ticker1_prices[date],
+                self.ticker1_price,
                 exit_and_short=True,
             )
         )
         self.capital += revenue_from_long_position - self._transaction_cost_calculator(
             self.ticker2_holding,
             date,
-            self.ticker2_prices[date],
+            self.ticker2_price,
         )
         self.capital += self.short_capital_pool
 
     def _exit_when_spread_was_negative(self, date: datetime) -> None:
-        revenue_from_long_position = self.ticker1_prices[date] * self.ticker1_holding
-        outflow_from_short_position = self.ticker2_prices[date] * self.ticker2_holding
+        revenue_from_long_position = self.ticker1_price * self.ticker1_holding
+        outflow_from_short_position = self.ticker2_price * self.ticker2_holding
 
         self.short_capital_pool -= (
             outflow_from_short_position
             + self._transaction_cost_calculator(
                 self.ticker1_holding,
                 date,
-                self.ticker1_prices[date],
+                self.ticker1_price,
                 exit_and_short=True,
             )
         )
         self.capital += revenue_from_long_position - self._transaction_cost_calculator(
             self.ticker2_holding,
             date,
-            self.ticker2_prices[date],
+            self.ticker2_price,
         )
         self.capital += self.short_capital_pool
 
@@ -648,26 +794,22 @@ class BackTest:
     ) -> tuple[int, int]:
 
         (
-            higher_priced_asset_price_series,
-            lower_priced_asset_price_series,
-        ) = self._return_higher_priced_asset_price_series(date)
+            current_price_of_higher_priced_asset,
+            current_price_of_lower_priced_asset,
+        ) = self._return_higher_and_lower_asset_prices()
 
         (
             capital_allocated_to_higher_priced_asset,
             number_assets_of_higher_priced_asset,
-            current_price_of_higher_priced_asset,
         ) = self._determine_capital_and_units_higher_priced_asset(
-            date,
-            higher_priced_asset_price_series,
+            current_price_of_higher_priced_asset,
         )
 
-        (
-            number_assets_of_lower_priced_asset,
-            current_price_of_lower_priced_asset,
-        ) = self._determine_capital_and_units_lower_priced_asset(
-            date,
-            capital_allocated_to_higher_priced_asset,
-            lower_priced_asset_price_series,
+        number_assets_of_lower_priced_asset = (
+            self._determine_capital_and_units_lower_priced_asset(
+                capital_allocated_to_higher_priced_asset,
+                current_price_of_lower_priced_asset,
+            )
         )
 
         if (
@@ -680,24 +822,22 @@ class BackTest:
 
         return number_assets_of_higher_priced_asset, number_assets_of_lower_priced_asset
 
-    def _return_higher_priced_asset_price_series(
-        self, date: datetime
-    ) -> tuple[pd.Series, pd.Series]:
-        if self.ticker1_prices[date] > self.ticker2_prices[date]:
-            self.higher_priced_asset_ticker = self.ticker1_prices.name
-            return self.ticker1_prices, self.ticker2_prices
+    def _return_higher_and_lower_asset_prices(
+        self,
+    ) -> tuple[float, float]:
+        if self.ticker1_price > self.ticker2_price:
+            self.higher_priced_asset_ticker = self.ticker1
+            return self.ticker1_price, self.ticker2_price
         else:
-            self.higher_priced_asset_ticker = self.ticker2_prices.name
-            return self.ticker2_prices, self.ticker1_prices
+            self.higher_priced_asset_ticker = self.ticker2
+            return self.ticker2_price, self.ticker1_price
 
     def _determine_capital_and_units_lower_priced_asset(
         self,
-        date: datetime,
         capital_allocated_to_higher_priced_asset: float,
-        lower_priced_asset_price_series: pd.Series,
-    ) -> tuple[int, float]:
+        current_price_of_lower_priced_asset: float,
+    ) -> int:
 
-        current_price_of_lower_priced_asset = lower_priced_asset_price_series[date]
         if (
             round(
                 capital_allocated_to_higher_priced_asset
@@ -716,15 +856,13 @@ class BackTest:
                 / current_price_of_lower_priced_asset
             )
 
-        return number_assets_of_lower_priced_asset, current_price_of_lower_priced_asset
+        return number_assets_of_lower_priced_asset
 
     def _determine_capital_and_units_higher_priced_asset(
         self,
-        date: datetime,
-        higher_priced_asset_price_series: pd.Series,
-    ) -> tuple[float, int, float]:
+        current_price_of_higher_priced_asset: float,
+    ) -> tuple[float, int]:
 
-        current_price_of_higher_priced_asset = higher_priced_asset_price_series[date]
         number_assets_of_higher_priced_asset = floor(
             (self.capital / 2) / current_price_of_higher_priced_asset
         )
@@ -735,18 +873,8 @@ class BackTest:
         return (
             capital_allocated_to_higher_priced_asset,
             number_assets_of_higher_priced_asset,
-            current_price_of_higher_priced_asset,
         )
 
-    def _return_price_series_from_ticker(
-        self,
-        ticker: str,
-    ) -> pd.Series:
-        if ticker == self.ticker1_prices.name:
-            return self.ticker1_prices
-        else:
-            return self.ticker2_prices
-
     def _transaction_cost_calculator(
         self,
         number_of_units_transacted: int,
@@ -789,23 +917,21 @@ class BackTest:
         self,
         closing_date: datetime,
     ) -> None:
-        trade_instance_data = {
-            "trade_counter": self.trade_counter,
-            "opening_date": self.trade_opening_date,
-            "closing_date": closing_date,
-            "position_ticker1": self.ticker1_holding,
-            "opening_price_ticker1": self.ticker1_trade_opening_price,
-            "closing_price_ticker1": self.ticker1_prices[closing_date],
-            "position_ticker2": self.ticker2_holding,
-            "opening_price_ticker2": self.ticker2_trade_opening_price,
-            "closing_price_ticker2": self.ticker2_prices[closing_date],
-            "days_trade_open": (closing_date - self.trade_opening_date).days,
-            "short_ticker": self.short_position_holding_name,
-            "closing_capital": self.capital,
-            "trade_abandoned": self.trade_abandoned,
-        }
-
-        self.trade_history_frame.loc[self.trade_counter] = trade_instance_data
+        self.trade_log.append(
+            trade_counter=self.trade_counter,
+            opening_date=self.trade_opening_date,
+            closing_date=closing_date,
+            position_ticker1=self.ticker1_holding,
+            opening_price_ticker1=self.ticker1_trade_opening_price,
+            closing_price_ticker1=self.ticker1_price,
+            position_ticker2=self.ticker2_holding,
+            opening_price_ticker2=self.ticker2_trade_opening_price,
+            closing_price_ticker2=self.ticker2_price,
+            days_trade_open=(closing_date - self.trade_opening_date).days,
+            short_ticker_is_ticker1=self.short_position_holding_name == self.ticker1,
+            closing_capital=self.capital,
+            trade_abandoned=self.trade_abandoned,
+        )
         self.trade_counter += 1
 
     def _perform_valuation_trade_open(
@@ -817,42 +943,44 @@ class BackTest:
             # this means we are short ticker 1
             short_position_value = (
                 self.short_capital_pool
-                - (self.ticker1_holding * self.ticker1_prices[date])
+                - (self.ticker1_holding * self.ticker1_price)
                 - self._transaction_cost_calculator(
                     self.ticker1_holding,
                     date,
-                    self.ticker1_prices[date],
+                    self.ticker1_price,
                     exit_and_short=True,
                 )
             )
 
-            long_position_value = self.ticker2_holding * self.ticker2_prices[
-                date
-            ] - self._transaction_cost_calculator(
-                self.ticker2_holding,
-                date,
-                self.ticker2_prices[date],
+            long_position_value = (
+                self.ticker2_holding * self.ticker2_price
+                - self._transaction_cost_calculator(
+                    self.ticker2_holding,
+                    date,
+                    self.ticker2_price,
+                )
             )
 
         else:
 
             short_position_value = (
                 self.short_capital_pool
-                - (self.ticker2_holding * self.ticker2_prices[date])
+                - (self.ticker2_holding * self.ticker2_price)
                 - self._transaction_cost_calculator(
                     self.ticker2_holding,
                     date,
-                    self.ticker2_prices[date],
+                    self.ticker2_price,
                     exit_and_short=True,
                 )
             )
 
-            long_position_value = self.ticker1_holding * self.ticker1_prices[
-                date
-            ] - self._transaction_cost_calculator(
-                self.ticker1_holding,
-                date,
-                self.ticker1_prices[date],
+            long_position_value = (
+                self.ticker1_holding * self.ticker1_price
+                - self._transaction_cost_calculator(
+                    self.ticker1_holding,
+                    date,
+                    self.ticker1_price,
+                )
             )
 
         return long_position_value + short_position_value + self.capital
@@ -875,3 +1003,164 @@ class BackTest:
                 pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
             )
         return regular_spread
+
+
+BACKTEST_STATE_DATE_FIELDS = ["trade_opening_date", "last_date"]
+
+
+class BackTestState(NamedTuple):
+
+    """The trading state of a BackTest between two bars, a few scalars. to_dict and from_dict convert it to and from plain values (dates as iso strings) for json, parquet rows or similar"""
+
+    ticker1: str
+    ticker2: str
+    spread_to_trigger_trade_entry: int | float = (
+        BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_ENTRY
+    )
+    spread_to_trigger_trade_exit: int | float = (
+        BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_EXIT
+    )
+    spread_to_abandon_trade: int | float = BackTest.DEFAULT_SPREAD_TO_ABANDON_TRADE
+    kalman_spread: bool = False
+    capital: float = CAPITAL_STARTING
+    trade_counter: int = BackTest.STARTING_TRADE_COUNTER
+    trade_abandoned: bool = False
+    trade_status_open: bool = False
+    ticker1_minus_ticker2_trade_opening_spread_positive: bool | None = None
+    higher_priced_asset_ticker: str | None = None
+    ticker1_holding: int | None = None
+    ticker2_holding: int | None = None
+    short_position_holding_name: str | None = None
+    trade_opening_date: pd.Timestamp | None = None
+    short_capital_pool: float = 0
+    ticker1_trade_opening_price: float | None = None
+    ticker2_trade_opening_price: float | None = None
+    last_date: pd.Timestamp | None = None
+    last_standardised_spread: float | None = None
+
+    def to_dict(
+        self,
+    ) -> dict:
+        return {
+            field: (
+                value.isoformat()
+                if isinstance(value, datetime)
+                else value.item()
+                if isinstance(value, np.generic)
+                else value
+            )
+            for field, value in self._asdict().items()
+        }
+
+    @classmethod
+    def from_dict(
+        cls,
+        state_dict: dict,
+    ) -> BackTestState:
+        return cls(
+            **{
+                **state_dict,
+                **{
+                    field: pd.Timestamp(state_dict[field])
+                    for field in BACKTEST_STATE_DATE_FIELDS
+                    if state_dict.get(field) is not None
+                },
+            }
+        )
+
+
+class TradeLog:
+
+    """The closed trades of one pair, held field by field in preallocated typed arrays which double in capacity when full, so recording a trade writes one slot per field rather than growing a dataframe by a row. to_frame builds the trade history frame once trading ends.
+
+    A backtest whose spread opens beyond the abandon threshold is flagged with opened_abandoned instead of being written as a row. to_frame still gives such a backtest a single row, flagged in its opened_abandoned column with every trade field, closing_capital included, left missing, which is how stored trade histories and the performance measures recognise it.
+    """
+
+    INITIAL_CAPACITY = 8
+    FIELD_DTYPES = {
+        "trade_counter": np.int64,
+        "opening_date": "datetime64[ns]",
+        "closing_date": "datetime64[ns]",
+        "position_ticker1": np.int64,
+        "opening_price_ticker1": np.float64,
+        "closing_price_ticker1": np.float64,
+        "position_ticker2": np.int64,
+        "opening_price_ticker2": np.float64,
+        "closing_price_ticker2": np.float64,
+        "days_trade_open": np.int64,
+        "short_ticker_is_ticker1": np.bool_,
+        "closing_capital": np.float64,
+        "trade_abandoned": np.bool_,
+    }
+
+    def __init__(
+        self,
+        ticker1: str,
+        ticker2: str,
+        capacity: int = INITIAL_CAPACITY,
+    ) -> None:
+
+        self.ticker1 = ticker1
+        self.ticker2 = ticker2
+        self.opened_abandoned = False
+        self.number_of_trades = 0
+        self.fields = {
+            field: np.empty(capacity, dtype=dtype)
+            for field, dtype in self.FIELD_DTYPES.items()
+        }
+
+    def __len__(
+        self,
+    ) -> int:
+        return self.number_of_trades
+
+    def append(
+        self,
+        **trade_fields,
+    ) -> None:
+
+        """Writes one closed trade, given as a value for every field in FIELD_DTYPES"""
+
+        if self.number_of_trades == len(self.fields["trade_counter"]):
+            self._grow()
+
+        for field, values in self.fields.items():
+            values[self.number_of_trades] = trade_fields[field]
+        self.number_of_trades += 1
+
+    def _grow(
+        self,
+    ) -> None:
+
+        for field, values in self.fields.items():
+            grown_values = np.empty(max(2 * len(values), 1), dtype=values.dtype)
+            grown_values[: self.number_of_trades] = values[: self.number_of_trades]
+            self.fields[field] = grown_values
+
+    def to_frame(
+        self,
+    ) -> pd.DataFrame:
+
+        trades = {
+            field: values[: self.number_of_trades]
+            for field, values in self.fields.items()
+        }
+        trade_history_frame = pd.DataFrame(
+            {
+                **trades,
+                "short_ticker": np.where(
+                    trades["short_ticker_is_ticker1"], self.ticker1, self.ticker2
+                ).astype(object),
+                "opened_abandoned": np.zeros(self.number_of_trades, dtype=bool),
+            },
+            index=trades["trade_counter"],
+            columns=BackTest.TRADE_DF_RECORD_COLUMNS_LIST,
+        )
+
+        if self.opened_abandoned:
+            trade_history_frame = trade_history_frame.iloc[:0].reindex(
+                [BackTest.FIRST_INDEX_TRADE_DF]
+            )
+            trade_history_frame[["trade_abandoned", "opened_abandoned"]] = True
+
+        return trade_history_frame
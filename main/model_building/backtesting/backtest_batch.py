@@ -0,0 +1,265 @@
+import logging
+
+import pandas as pd
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+from main.model_building.backtesting.backtest import (
+    BackTest,
+)
+
+from main.model_building.backtesting.backtest_vectorised import (
+    run_vectorised_backtest,
+    build_trade_history_frame,
+    build_valuation_ledger_frame,
+    select_column_trades,
+)
+
+from main.model_building.backtesting_analysis.performance_measures import (
+    calculate_sharpe_ratio_columns,
+)
+
+from main.utilities.constants import (
+    BACKTEST_PARAMETER_COLUMNS,
+    CAPITAL_STARTING,
+)
+from main.utilities.shared_prices import (
+    SharedPriceMatrix,
+)
+
+FIRST_TICKER_ELEMENT = 0
+SECOND_TICKER_ELEMENT = 1
+BACKTEST_SUMMARY_COLUMNS = [
+    "closing_capital",
+    "number_of_trades",
+    "no_profitable_trades",
+    "fraction_profitable_trades",
+    "sharpe_ratio",
+    "trade_opened_abandoned",
+]
+
+
+def _pair_column_name(
+    pair: tuple[str, str],
+) -> str:
+    return f"{pair[FIRST_TICKER_ELEMENT]}_{pair[SECOND_TICKER_ELEMENT]}"
+
+
+def _aligned_ticker_prices(
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    tickers: list[str],
+    dates: pd.DatetimeIndex,
+) -> np.ndarray:
+
+    """The (dates x tickers) prices of tickers, missing where prices_df has no row for a date. Each ticker is read once on its own, so a SharedPriceMatrix is never copied whole"""
+
+    ticker_prices = {
+        ticker: prices_df[ticker].reindex(dates).to_numpy(dtype=float)
+        for ticker in dict.fromkeys(tickers)
+    }
+    aligned_prices = np.empty((len(dates), len(tickers)))
+    for column, ticker in enumerate(tickers):
+        aligned_prices[:, column] = ticker_prices[ticker]
+
+    return aligned_prices
+
+
+def _first_and_last_valid_positions(
+    spread_values: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+
+    valid = ~np.isnan(spread_values)
+    has_values = valid.any(axis=0)
+    number_of_dates = len(spread_values)
+
+    start_positions = np.where(has_values, valid.argmax(axis=0), number_of_dates)
+    last_positions = np.where(
+        has_values, number_of_dates - 1 - valid[::-1].argmax(axis=0), -1
+    )
+
+    return start_positions, last_positions
+
+
+def backtest_pairs_batch(
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    standardised_spread_df: pd.DataFrame,
+    pairs: list[tuple[str, str]],
+    spread_to_trigger_trade_entry: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_ENTRY,
+    spread_to_trigger_trade_exit: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_EXIT,
+    spread_to_abandon_trade: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_ABANDON_TRADE,
+    live_pairs: np.ndarray | None = None,
+) -> dict:
+
+    """Backtests every pair in one vectorised sweep over already loaded data.
+
+    prices_df (or a SharedPriceMatrix of it) holds tickers as columns, standardised_spread_df holds one column per pair named first_ticker_second_ticker (as returned by retrieve_spread_tables_from_sql_df). Each pair's series runs from its first to its last non missing spread value, which is where BackTest would start trading and exit on a delisting. Pairs flagged in the boolean live_pairs are still trading after the data ends, so open trades are carried in the final state rather than exited on their last date.
+    """
+
+    column_names = [_pair_column_name(pair) for pair in pairs]
+    standardised_spread_df = standardised_spread_df[column_names]
+    dates = standardised_spread_df.index
+
+    standardised_spread_values = standardised_spread_df.to_numpy(dtype=float)
+    start_positions, last_positions = _first_and_last_valid_positions(
+        standardised_spread_values
+    )
+    trading_last_positions = last_positions
+    if live_pairs is not None:
+        trading_last_positions = np.where(live_pairs, len(dates), last_positions)
+
+    backtest_results = run_vectorised_backtest(
+        standardised_spread=standardised_spread_values,
+        ticker1_prices=_aligned_ticker_prices(
+            prices_df, [pair[FIRST_TICKER_ELEMENT] for pair in pairs], dates
+        ),
+        ticker2_prices=_aligned_ticker_prices(
+            prices_df, [pair[SECOND_TICKER_ELEMENT] for pair in pairs], dates
+        ),
+        dates=dates.to_numpy(dtype="datetime64[ns]"),
+        spread_to_trigger_trade_entry=spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit=spread_to_trigger_trade_exit,
+        spread_to_abandon_trade=spread_to_abandon_trade,
+        start_positions=start_positions,
+        last_positions=trading_last_positions,
+    )
+
+    backtest_results.update(
+        {
+            "pairs": list(pairs),
+            "column_names": column_names,
+            "dates": dates,
+            "start_positions": start_positions,
+            "last_positions": last_positions,
+        }
+    )
+
+    return backtest_results
+
+
+def pair_backtest_frames(
+    backtest_results: dict,
+    column: int,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    """The trade history frame and valuation ledger of one pair from a batch, cut to that pair's own dates"""
+
+    pair = backtest_results["pairs"][column]
+    dates = backtest_results["dates"]
+
+    trade_history_frame = build_trade_history_frame(
+        trades=select_column_trades(backtest_results["trades"], column),
+        dates=dates,
+        ticker1=pair[FIRST_TICKER_ELEMENT],
+        ticker2=pair[SECOND_TICKER_ELEMENT],
+        opened_abandoned=backtest_results["opened_abandoned"][column],
+    )
+    valuation_ledger = build_valuation_ledger_frame(
+        backtest_results=backtest_results,
+        column=column,
+        dates=dates,
+    ).iloc[
+        backtest_results["start_positions"][column] : backtest_results[
+            "last_positions"
+        ][column]
+        + 1
+    ]
+
+    return trade_history_frame, valuation_ledger
+
+
+def summarise_backtest_columns(
+    backtest_results: dict,
+) -> pd.DataFrame:
+
+    """One row of performance metrics per backtested column, following the definitions in performance_measures (trade pnl is the change in closing capital from trade to trade, starting from CAPITAL_STARTING)"""
+
+    trades = backtest_results["trades"]
+    number_of_columns = len(backtest_results["column_names"])
+
+    columns = trades["column"].astype(np.int64)
+    previous_closing_capital = np.full(len(columns), float(CAPITAL_STARTING))
+    same_column_as_previous_trade = columns[1:] == columns[:-1]
+    previous_closing_capital[1:][same_column_as_previous_trade] = trades[
+        "closing_capital"
+    ][:-1][same_column_as_previous_trade]
+    trade_pnl = trades["closing_capital"] - previous_closing_capital
+
+    number_of_trades = np.bincount(columns, minlength=number_of_columns)
+    no_profitable_trades = np.bincount(
+        columns, weights=trade_pnl > 0, minlength=number_of_columns
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction_profitable_trades = np.where(
+            number_of_trades > 0, no_profitable_trades / number_of_trades, 0.0
+        )
+
+    opened_abandoned = backtest_results["opened_abandoned"]
+    failed = backtest_results["state"]["failed"]
+    unavailable = opened_abandoned | failed
+
+    return pd.DataFrame(
+        {
+            "first_ticker": [
+                pair[FIRST_TICKER_ELEMENT] for pair in backtest_results["pairs"]
+            ],
+            "second_ticker": [
+                pair[SECOND_TICKER_ELEMENT] for pair in backtest_results["pairs"]
+            ],
+            "closing_capital": np.where(
+                failed, np.nan, backtest_results["state"]["capital"]
+            ),
+            "number_of_trades": np.where(unavailable, np.nan, number_of_trades),
+            "no_profitable_trades": np.where(unavailable, np.nan, no_profitable_trades),
+            "fraction_profitable_trades": np.where(
+                unavailable, np.nan, fraction_profitable_trades
+            ),
+            "sharpe_ratio": np.where(
+                failed,
+                np.nan,
+                calculate_sharpe_ratio_columns(backtest_results["valuation"]),
+            ),
+            "trade_opened_abandoned": opened_abandoned,
+        }
+    )
+
+
+def sweep_backtest_parameter_grid(
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    standardised_spread_df: pd.DataFrame,
+    pairs: list[tuple[str, str]],
+    parameter_grid: list[tuple[float, float, float]],
+) -> pd.DataFrame:
+
+    """Evaluates every (entry, exit, abandon) threshold combination against every pair in a single sweep, each spread is only loaded once.
+
+    Pair columns are repeated once per combination with that combination's thresholds, and the result is a tidy table keyed by first_ticker, second_ticker and the three threshold columns.
+    """
+
+    parameter_grid = np.asarray(parameter_grid, dtype=float).reshape(
+        -1, len(BACKTEST_PARAMETER_COLUMNS)
+    )
+    number_of_pairs = len(pairs)
+
+    backtest_results = backtest_pairs_batch(
+        prices_df=prices_df,
+        standardised_spread_df=standardised_spread_df,
+        pairs=list(pairs) * len(parameter_grid),
+        spread_to_trigger_trade_entry=np.repeat(parameter_grid[:, 0], number_of_pairs),
+        spread_to_trigger_trade_exit=np.repeat(parameter_grid[:, 1], number_of_pairs),
+        spread_to_abandon_trade=np.repeat(parameter_grid[:, 2], number_of_pairs),
+    )
+
+    sweep_results_df = summarise_backtest_columns(backtest_results)
+    sweep_results_df[BACKTEST_PARAMETER_COLUMNS] = np.repeat(
+        parameter_grid, number_of_pairs, axis=0
+    )
+
+    return sweep_results_df[
+        ["first_ticker", "second_ticker"]
+        + BACKTEST_PARAMETER_COLUMNS
+        + BACKTEST_SUMMARY_COLUMNS
+    ]
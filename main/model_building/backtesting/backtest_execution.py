@@ -1,3 +1,4 @@
+from typing import Iterator
 from joblib import Parallel, delayed
 import pandas as pd
 import logging
@@ -6,15 +7,56 @@ logging.basicConfig(level=logging.INFO)
 
 from main.utilities.constants import (
     CORES_TO_USE,
+    BACKTEST_BATCH_SIZE,
+    CAPITAL_STARTING,
+    LENGTH_OF_ROLLING_HEDGE_RATIO,
 )
 
 from main.utilities.paths import (
     PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
+    PATHWAY_TO_PRICE_DF,
+    PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+)
+
+from main.utilities.functions import (
+    retrieve_spread_tables_from_sql_df,
+)
+from main.utilities.series_store import (
+    get_series_store,
+    SeriesRecord,
+)
+from main.utilities.results_sink import (
+    ResultsSink,
+    PAIR_KEY_COLUMNS,
+)
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
 )
 
 from main.model_building.backtesting.backtest import (
     BackTest,
 )
+from main.model_building.backtesting.backtest_batch import (
+    backtest_pairs_batch,
+    pair_backtest_frames,
+    sweep_backtest_parameter_grid,
+    BACKTEST_PARAMETER_COLUMNS,
+    BACKTEST_SUMMARY_COLUMNS,
+)
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    KALMAN_PROCESS_NOISE,
+    KALMAN_MEASUREMENT_NOISE,
+    KALMAN_INITIAL_ERROR_COV,
+)
+from main.model_building.backtesting.database_utils import (
+    TradeHistorySaver,
+    RegularSpreadSaver,
+)
 
 
 def execute_trade(
@@ -42,9 +84,331 @@ def execute_trade(
         )
 
 
+def execute_trade_batch(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+    kalman_spread: bool,
+) -> tuple[list[SeriesRecord], list[SeriesRecord]]:
+
+    """Backtests every row of results_df in one vectorised sweep. The spreads of the whole batch are read in one pass over the store, rather than BackTest's two price reads and two connections per pair.
+
+    Returns the trade history and valuation ledger records of every pair for the writer to save, workers do not write to the stores themselves.
+    """
+
+    standardised_spread_df = retrieve_spread_tables_from_sql_df(
+        results_df,
+        pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+        spread_type="_standardised_spread",
+    )
+    regular_spread_type = f"_regular_spread{'_kalman' if kalman_spread else ''}"
+    regular_spread_df = retrieve_spread_tables_from_sql_df(
+        results_df,
+        pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+        spread_type=regular_spread_type,
+    )
+
+    pairs = [
+        (first_ticker, second_ticker)
+        for first_ticker, second_ticker in zip(
+            results_df["first_ticker"], results_df["second_ticker"]
+        )
+        if f"{first_ticker}_{second_ticker}" in standardised_spread_df.columns
+        and f"{first_ticker}_{second_ticker}" in regular_spread_df.columns
+        and first_ticker in prices_df.columns
+        and second_ticker in prices_df.columns
+    ]
+    if not pairs:
+        return [], []
+
+    backtest_results = backtest_pairs_batch(
+        prices_df=prices_df,
+        standardised_spread_df=standardised_spread_df,
+        pairs=pairs,
+        spread_to_trigger_trade_entry=spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit=spread_to_trigger_trade_exit,
+        spread_to_abandon_trade=spread_to_abandon_trade,
+    )
+
+    trade_history_records, regular_spread_records = backtest_series_records(
+        backtest_results,
+        regular_spread_df,
+        spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit,
+        spread_to_abandon_trade,
+        kalman_spread,
+    )
+
+    logging.info(f"Completed batch backtest for {len(pairs)} pairs")
+
+    return trade_history_records, regular_spread_records
+
+
+def backtest_series_records(
+    backtest_results: dict,
+    regular_spread_df: pd.DataFrame,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+    kalman_spread: bool,
+) -> tuple[list[SeriesRecord], list[SeriesRecord]]:
+
+    """The trade history and valuation ledger records of every pair of a backtest_pairs_batch result, the ledger joined to the pair's regular spread from regular_spread_df. Pairs whose allocation failed are skipped"""
+
+    regular_spread_type = f"_regular_spread{'_kalman' if kalman_spread else ''}"
+    trade_history_records = []
+    regular_spread_records = []
+    for column, (first_ticker, second_ticker) in enumerate(backtest_results["pairs"]):
+        if backtest_results["state"]["failed"][column]:
+            logging.info(
+                f"{first_ticker} and {second_ticker} FAILED SOMEHOW: allocation failed on an entry date"
+            )
+            continue
+
+        trade_history_frame, valuation_ledger = pair_backtest_frames(
+            backtest_results, column
+        )
+        regular_spread = (
+            regular_spread_df[f"{first_ticker}_{second_ticker}"]
+            .reindex(valuation_ledger.index)
+            .to_frame(f"{first_ticker}_{second_ticker}{regular_spread_type}")
+            .join(valuation_ledger)
+        )
+
+        trade_history_records.append(
+            TradeHistorySaver(
+                first_ticker,
+                second_ticker,
+                spread_to_trigger_trade_entry,
+                spread_to_trigger_trade_exit,
+                spread_to_abandon_trade,
+                kalman_spread,
+                trade_history_frame,
+            ).trade_history_series_record()
+        )
+        regular_spread_records.append(
+            RegularSpreadSaver(
+                first_ticker,
+                second_ticker,
+                spread_to_trigger_trade_entry,
+                spread_to_trigger_trade_exit,
+                spread_to_abandon_trade,
+                kalman_spread,
+                regular_spread,
+            ).regular_spread_series_record()
+        )
+
+    return trade_history_records, regular_spread_records
+
+
+def _backtest_pair_records(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+    kalman_spread: bool,
+    batch_size: int,
+) -> Iterator[tuple[SeriesRecord, SeriesRecord] | None]:
+
+    """The trade history and valuation ledger record of every row of results_df, in row order, as batches arrive from the workers. Rows execute_trade_batch skips give None.
+
+    The workers read prices from a SharedPriceMatrix of prices_df, which is kept until the last batch has been yielded.
+    """
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        batch_records_list = Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
+            delayed(execute_trade_batch)(
+                results_df.iloc[batch_start : batch_start + batch_size],
+                shared_prices,
+                spread_to_trigger_trade_entry,
+                spread_to_trigger_trade_exit,
+                spread_to_abandon_trade,
+                kalman_spread,
+            )
+            for batch_start in range(0, len(results_df), batch_size)
+        )
+
+        for batch_start, (trade_history_records, regular_spread_records) in zip(
+            range(0, len(results_df), batch_size), batch_records_list
+        ):
+            pair_records = {
+                (
+                    trade_history_record.first_ticker,
+                    trade_history_record.second_ticker,
+                ): (trade_history_record, regular_spread_record)
+                for trade_history_record, regular_spread_record in zip(
+                    trade_history_records, regular_spread_records
+                )
+            }
+            batch_df = results_df.iloc[batch_start : batch_start + batch_size]
+            yield from (
+                pair_records.get(pair)
+                for pair in zip(batch_df["first_ticker"], batch_df["second_ticker"])
+            )
+
+
+def execute_trade_whole_set_batched(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+    kalman_spread: bool,
+    batch_size: int = BACKTEST_BATCH_SIZE,
+    stage_cache: StageCache | None = None,
+) -> None:
+
+    """Batches run in parallel while this process is the single writer of both stores, committing each batch's records as it arrives.
+
+    With a stage_cache only pairs whose prices, spread parameters or thresholds changed since an earlier run are backtested, the records of the others are loaded and written as they are.
+    """
+
+    pair_records_list = cached_pair_outputs(
+        stage_cache,
+        "backtest",
+        results_df,
+        prices_df,
+        lambda pairs_df: _backtest_pair_records(
+            pairs_df,
+            prices_df,
+            spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit,
+            spread_to_abandon_trade,
+            kalman_spread,
+            batch_size,
+        ),
+        spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit,
+        spread_to_abandon_trade,
+        kalman_spread,
+        CAPITAL_STARTING,
+        LENGTH_OF_ROLLING_HEDGE_RATIO,
+        (KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE, KALMAN_INITIAL_ERROR_COV),
+    )
+
+    trade_history_store = get_series_store(
+        TradeHistorySaver.PATHWAY_TO_BACKTEST_TRADEFRAMES
+    )
+    regular_spread_store = get_series_store(
+        RegularSpreadSaver.PATHWAY_TO_SPREAD_BACKTEST
+    )
+    trade_history_records, regular_spread_records = [], []
+    for pair_records in pair_records_list:
+        if pair_records is not None:
+            trade_history_records.append(pair_records[0])
+            regular_spread_records.append(pair_records[1])
+        if len(trade_history_records) == batch_size:
+            trade_history_store.write_series_many(trade_history_records)
+            regular_spread_store.write_series_many(regular_spread_records)
+            trade_history_records, regular_spread_records = [], []
+    trade_history_store.write_series_many(trade_history_records)
+    regular_spread_store.write_series_many(regular_spread_records)
+
+
+def execute_parameter_sweep_batch(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    parameter_grid: list[tuple[float, float, float]],
+) -> pd.DataFrame | None:
+
+    standardised_spread_df = retrieve_spread_tables_from_sql_df(
+        results_df,
+        pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+        spread_type="_standardised_spread",
+    )
+
+    pairs = [
+        (first_ticker, second_ticker)
+        for first_ticker, second_ticker in zip(
+            results_df["first_ticker"], results_df["second_ticker"]
+        )
+        if f"{first_ticker}_{second_ticker}" in standardised_spread_df.columns
+        and first_ticker in prices_df.columns
+        and second_ticker in prices_df.columns
+    ]
+    if not pairs:
+        return None
+
+    return sweep_backtest_parameter_grid(
+        prices_df=prices_df,
+        standardised_spread_df=standardised_spread_df,
+        pairs=pairs,
+        parameter_grid=parameter_grid,
+    )
+
+
+def execute_parameter_sweep_whole_set(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    parameter_grid: list[tuple[float, float, float]],
+    batch_size: int = BACKTEST_BATCH_SIZE,
+    results_sink: ResultsSink | None = None,
+) -> pd.DataFrame:
+
+    """Sweeps the threshold grid over every pair in results_df. The batch size is shared between pairs and grid combinations so the number of columns in a sweep stays at batch_size.
+
+    With a results_sink (keyed by pair and thresholds) each batch's rows are appended to it as they arrive, pairs it already holds from an interrupted run are skipped, and the compacted sink is returned.
+    """
+
+    pairs_per_batch = max(1, batch_size // len(parameter_grid))
+
+    if results_sink is not None:
+        written_pairs = {
+            written_key[: len(PAIR_KEY_COLUMNS)]
+            for written_key in results_sink.written_keys()
+        }
+        logging.info(
+            f"{len(written_pairs)} pairs already in the results sink, skipping"
+        )
+        results_df = results_df[
+            [
+                pair not in written_pairs
+                for pair in zip(results_df["first_ticker"], results_df["second_ticker"])
+            ]
+        ]
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        sweep_results_list = Parallel(
+            n_jobs=CORES_TO_USE,
+            return_as="list" if results_sink is None else "generator",
+        )(
+            delayed(execute_parameter_sweep_batch)(
+                results_df.iloc[batch_start : batch_start + pairs_per_batch],
+                shared_prices,
+                parameter_grid,
+            )
+            for batch_start in range(0, len(results_df), pairs_per_batch)
+        )
+
+        if results_sink is not None:
+            for sweep_results in sweep_results_list:
+                if sweep_results is not None:
+                    results_sink.append(sweep_results.to_dict(orient="records"))
+            results_sink.compact()
+            return results_sink.read()
+
+    sweep_results_list = [
+        sweep_results
+        for sweep_results in sweep_results_list
+        if sweep_results is not None
+    ]
+    if not sweep_results_list:
+        return pd.DataFrame(
+            columns=PAIR_KEY_COLUMNS
+            + BACKTEST_PARAMETER_COLUMNS
+            + BACKTEST_SUMMARY_COLUMNS
+        )
+
+    return pd.concat(sweep_results_list).reset_index(drop=True)
+
+
 if __name__ == "__main__":
 
     results_df = pd.read_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
+    prices_df = pd.read_parquet(PATHWAY_TO_PRICE_DF)
 
     # NOTE TO USER: these 3 numeric configs below must also be set in the config file, they must match
 
@@ -54,15 +418,13 @@ if __name__ == "__main__":
     spread_to_abandon_trade = 6
     kalman_spread = False
 
-    Parallel(n_jobs=CORES_TO_USE)(
-        delayed(execute_trade)(
-            row,
-            spread_to_trigger_trade_entry,
-            spread_to_trigger_trade_exit,
-            spread_to_abandon_trade,
-            kalman_spread=kalman_spread,
-        )
-        for _, row in results_df.iterrows()
+    execute_trade_whole_set_batched(
+        results_df,
+        prices_df,
+        spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit,
+        spread_to_abandon_trade,
+        kalman_spread=kalman_spread,
     )
 
     # Second backtest with Kalman set to True
@@ -71,15 +433,13 @@ if __name__ == "__main__":
     spread_to_abandon_trade = 6
     kalman_spread = True
 
-    Parallel(n_jobs=CORES_TO_USE)(
-        delayed(execute_trade)(
-            row,
-            spread_to_trigger_trade_entry,
-            spread_to_trigger_trade_exit,
-            spread_to_abandon_trade,
-            kalman_spread=kalman_spread,
-        )
-        for _, row in results_df.iterrows()
+    execute_trade_whole_set_batched(
+        results_df,
+        prices_df,
+        spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit,
+        spread_to_abandon_trade,
+        kalman_spread=kalman_spread,
     )
 
     logging.info("Backtest execution complete")
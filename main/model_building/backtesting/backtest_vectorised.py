@@ -0,0 +1,735 @@
+import logging
+
+import pandas as pd
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+from main.model_building.backtesting.backtest import (
+    BackTest,
+)
+
+from main.model_building.backtesting.database_utils import (
+    LAST_LISTING_COLUMN,
+)
+
+from main.utilities.constants import (
+    CAPITAL_STARTING,
+    LAST_LISTING_STRING,
+)
+
+NANOSECONDS_IN_DAY = 86_400_000_000_000
+TRADE_RECORD_FIELDS = [
+    "column",
+    "trade_counter",
+    "opening_position",
+    "closing_position",
+    "position_ticker1",
+    "opening_price_ticker1",
+    "closing_price_ticker1",
+    "position_ticker2",
+    "opening_price_ticker2",
+    "closing_price_ticker2",
+    "days_trade_open",
+    "short_ticker_is_ticker1",
+    "closing_capital",
+    "trade_abandoned",
+]
+
+
+def _transaction_cost(
+    number_of_units_transacted: np.ndarray,
+    cost_of_asset: np.ndarray,
+    days_trade_open: np.ndarray,
+    exit_and_short: bool,
+) -> np.ndarray:
+
+    """Array version of BackTest._transaction_cost_calculator, the operation order is kept identical so results match to the bit"""
+
+    commission_costs = (
+        number_of_units_transacted * cost_of_asset
+    ) * BackTest.IBKR_COMMISSION_RATE
+    bid_ask_spread_costs = (
+        number_of_units_transacted * BackTest.AVGE_SP500_BID_ASK_SPREAD_PERCENT
+    )
+    short_exit_costs = (
+        days_trade_open
+        / BackTest.DAYS_IN_CALENDAR_YEAR
+        * BackTest.DEFAULT_SHORTING_RATE_PER_ANNUM
+        * exit_and_short
+    )
+
+    return commission_costs + bid_ask_spread_costs + short_exit_costs
+
+
+def create_initial_backtest_state(
+    number_of_columns: int,
+) -> dict[str, np.ndarray]:
+
+    return {
+        "capital": np.full(number_of_columns, float(CAPITAL_STARTING)),
+        "short_capital_pool": np.zeros(number_of_columns),
+        "trade_status_open": np.zeros(number_of_columns, dtype=bool),
+        "trade_abandoned": np.zeros(number_of_columns, dtype=bool),
+        "spread_positive": np.zeros(number_of_columns, dtype=bool),
+        "ticker1_holding": np.zeros(number_of_columns),
+        "ticker2_holding": np.zeros(number_of_columns),
+        "ticker1_trade_opening_price": np.full(number_of_columns, np.nan),
+        "ticker2_trade_opening_price": np.full(number_of_columns, np.nan),
+        "trade_opening_date_ns": np.zeros(number_of_columns, dtype=np.int64),
+        "trade_opening_position": np.zeros(number_of_columns, dtype=np.int64),
+        "trade_counter": np.full(
+            number_of_columns, BackTest.STARTING_TRADE_COUNTER, dtype=np.int64
+        ),
+        "previous_standardised_spread": np.full(number_of_columns, np.nan),
+        "failed": np.zeros(number_of_columns, dtype=bool),
+    }
+
+
+def _broadcast_thresholds(
+    threshold: float | np.ndarray,
+    number_of_columns: int,
+) -> np.ndarray:
+
+    return np.broadcast_to(
+        np.asarray(threshold, dtype=float), (number_of_columns,)
+    ).copy()
+
+
+def _value_open_trades(
+    state: dict[str, np.ndarray],
+    ticker1_price: np.ndarray,
+    ticker2_price: np.ndarray,
+    days_trade_open: np.ndarray,
+) -> np.ndarray:
+
+    ticker1_holding = state["ticker1_holding"]
+    ticker2_holding = state["ticker2_holding"]
+
+    short_position_value = np.where(
+        state["spread_positive"],
+        state["short_capital_pool"]
+        - (ticker1_holding * ticker1_price)
+        - _transaction_cost(ticker1_holding, ticker1_price, days_trade_open, True),
+        state["short_capital_pool"]
+        - (ticker2_holding * ticker2_price)
+        - _transaction_cost(ticker2_holding, ticker2_price, days_trade_open, True),
+    )
+    long_position_value = np.where(
+        state["spread_positive"],
+        ticker2_holding * ticker2_price
+        - _transaction_cost(ticker2_holding, ticker2_price, days_trade_open, False),
+        ticker1_holding * ticker1_price
+        - _transaction_cost(ticker1_holding, ticker1_price, days_trade_open, False),
+    )
+
+    return long_position_value + short_position_value + state["capital"]
+
+
+def _enter_trades(
+    state: dict[str, np.ndarray],
+    mask: np.ndarray,
+    spread_positive: bool,
+    ticker1_price: np.ndarray,
+    ticker2_price: np.ndarray,
+    date_ns: int,
+    position: int,
+) -> None:
+
+    capital = state["capital"][mask]
+    price1 = ticker1_price[mask]
+    price2 = ticker2_price[mask]
+    no_days = np.zeros(len(capital), dtype=np.int64)
+
+    higher_priced_is_ticker1 = price1 > price2
+    higher_price = np.where(higher_priced_is_ticker1, price1, price2)
+    lower_price = np.where(higher_priced_is_ticker1, price2, price1)
+
+    number_assets_of_higher_priced_asset = np.floor((capital / 2) / higher_price)
+    capital_allocated_to_higher_priced_asset = (
+        number_assets_of_higher_priced_asset * higher_price
+    )
+    rounded_lower_priced_units = np.round(
+        capital_allocated_to_higher_priced_asset / lower_price
+    )
+    number_assets_of_lower_priced_asset = np.where(
+        rounded_lower_priced_units * lower_price
+        + capital_allocated_to_higher_priced_asset
+        < capital,
+        rounded_lower_priced_units,
+        np.floor(capital_allocated_to_higher_priced_asset / lower_price),
+    )
+
+    ticker1_holding = np.where(
+        higher_priced_is_ticker1,
+        number_assets_of_higher_priced_asset,
+        number_assets_of_lower_priced_asset,
+    )
+    ticker2_holding = np.where(
+        higher_priced_is_ticker1,
+        number_assets_of_lower_priced_asset,
+        number_assets_of_higher_priced_asset,
+    )
+
+    # BackTest raises (and execute_trade skips the pair) when an allocation cannot be made
+    failed = ~(np.isfinite(ticker1_holding) & np.isfinite(ticker2_holding))
+
+    if spread_positive:
+        long_holding, long_price = ticker2_holding, price2
+        short_holding, short_price = ticker1_holding, price1
+    else:
+        long_holding, long_price = ticker1_holding, price1
+        short_holding, short_price = ticker2_holding, price2
+
+    state["capital"][mask] = capital - (
+        (long_holding * long_price)
+        - _transaction_cost(long_holding, long_price, no_days, False)
+    )
+    state["short_capital_pool"][mask] = state["short_capital_pool"][mask] + (
+        (short_holding * short_price)
+        - _transaction_cost(short_holding, short_price, no_days, True)
+    )
+    state["ticker1_holding"][mask] = ticker1_holding
+    state["ticker2_holding"][mask] = ticker2_holding
+    state["trade_status_open"][mask] = True
+    state["spread_positive"][mask] = spread_positive
+    state["trade_opening_date_ns"][mask] = date_ns
+    state["trade_opening_position"][mask] = position
+    state["ticker1_trade_opening_price"][mask] = price1
+    state["ticker2_trade_opening_price"][mask] = price2
+    state["failed"][mask] |= failed
+
+
+def _exit_trades(
+    state: dict[str, np.ndarray],
+    mask: np.ndarray,
+    exit_as_spread_positive: np.ndarray,
+    ticker1_price: np.ndarray,
+    ticker2_price: np.ndarray,
+    days_trade_open: np.ndarray,
+) -> None:
+
+    # BackTest charges the short leg against ticker 1 and the long leg against ticker 2 in both exit directions
+    ticker1_holding = state["ticker1_holding"][mask]
+    ticker2_holding = state["ticker2_holding"][mask]
+    price1 = ticker1_price[mask]
+    price2 = ticker2_price[mask]
+    days = days_trade_open[mask]
+    spread_positive = exit_as_spread_positive[mask]
+
+    revenue_from_long_position = np.where(
+        spread_positive, price2 * ticker2_holding, price1 * ticker1_holding
+    )
+    outflow_from_short_position = np.where(
+        spread_positive, price1 * ticker1_holding, price2 * ticker2_holding
+    )
+
+    short_capital_pool = state["short_capital_pool"][mask] - (
+        outflow_from_short_position
+        + _transaction_cost(ticker1_holding, price1, days, True)
+    )
+    capital = state["capital"][mask] + (
+        revenue_from_long_position
+        - _transaction_cost(ticker2_holding, price2, days, False)
+    )
+    state["capital"][mask] = capital + short_capital_pool
+    state["short_capital_pool"][mask] = short_capital_pool
+
+
+def _record_and_close_trades(
+    state: dict[str, np.ndarray],
+    mask: np.ndarray,
+    ticker1_price: np.ndarray,
+    ticker2_price: np.ndarray,
+    days_trade_open: np.ndarray,
+    position: int,
+    trade_records: dict[str, list],
+) -> None:
+
+    columns = np.flatnonzero(mask)
+    record = {
+        "column": columns,
+        "trade_counter": state["trade_counter"][mask],
+        "opening_position": state["trade_opening_position"][mask],
+        "closing_position": np.full(len(columns), position, dtype=np.int64),
+        "position_ticker1": state["ticker1_holding"][mask],
+        "opening_price_ticker1": state["ticker1_trade_opening_price"][mask],
+        "closing_price_ticker1": ticker1_price[mask],
+        "position_ticker2": state["ticker2_holding"][mask],
+        "opening_price_ticker2": state["ticker2_trade_opening_price"][mask],
+        "closing_price_ticker2": ticker2_price[mask],
+        "days_trade_open": days_trade_open[mask],
+        "short_ticker_is_ticker1": state["spread_positive"][mask],
+        "closing_capital": state["capital"][mask],
+        "trade_abandoned": state["trade_abandoned"][mask],
+    }
+    for field in TRADE_RECORD_FIELDS:
+        trade_records[field].append(record[field])
+
+    state["trade_counter"][mask] += 1
+    state["trade_status_open"][mask] = False
+    state["spread_positive"][mask] = False
+    state["ticker1_holding"][mask] = 0.0
+    state["ticker2_holding"][mask] = 0.0
+    state["short_capital_pool"][mask] = 0.0
+    state["ticker1_trade_opening_price"][mask] = np.nan
+    state["ticker2_trade_opening_price"][mask] = np.nan
+
+
+def _concatenate_trade_records(
+    trade_records: dict[str, list],
+) -> dict[str, np.ndarray]:
+
+    if not trade_records["column"]:
+        return {
+            "column": np.array([], dtype=np.int64),
+            **{field: np.array([]) for field in TRADE_RECORD_FIELDS[1:]},
+        }
+
+    concatenated = {
+        field: np.concatenate(values) for field, values in trade_records.items()
+    }
+    order = np.argsort(concatenated["column"], kind="stable")
+
+    return {field: values[order] for field, values in concatenated.items()}
+
+
+def run_vectorised_backtest(
+    standardised_spread: np.ndarray,
+    ticker1_prices: np.ndarray,
+    ticker2_prices: np.ndarray,
+    dates: np.ndarray,
+    spread_to_trigger_trade_entry: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_ENTRY,
+    spread_to_trigger_trade_exit: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_TRIGGER_TRADE_EXIT,
+    spread_to_abandon_trade: float
+    | np.ndarray = BackTest.DEFAULT_SPREAD_TO_ABANDON_TRADE,
+    start_positions: np.ndarray | None = None,
+    last_positions: np.ndarray | None = None,
+    state: dict[str, np.ndarray] | None = None,
+) -> dict:
+
+    """Runs the BackTest entry/exit/abandon/hop state machine over (dates x columns) arrays, one column per backtest.
+
+    Time is walked once and every column is advanced together with boolean masks, so the per day cost is a handful of numpy operations regardless of how many columns are being traded. Thresholds may be scalars or one value per column. start_positions/last_positions give the first and last row of each column's own series (the last row is where BackTest exits on a delisting). Passing a state from a previous run resumes from it rather than starting fresh.
+
+    Returns a dictionary with the per day ledger (valuation, trade_open_bool, trade_abandoned_bool, last_listing), the closed trades as flat arrays, the columns that opened abandoned, and the final state.
+    """
+
+    standardised_spread = np.asarray(standardised_spread, dtype=float)
+    if standardised_spread.ndim == 1:
+        standardised_spread = standardised_spread[:, None]
+    number_of_dates, number_of_columns = standardised_spread.shape
+    ticker1_prices = np.asarray(ticker1_prices, dtype=float).reshape(
+        standardised_spread.shape
+    )
+    ticker2_prices = np.asarray(ticker2_prices, dtype=float).reshape(
+        standardised_spread.shape
+    )
+    dates = np.asarray(dates, dtype="datetime64[ns]")
+    dates_ns = dates.view(np.int64)
+
+    spread_to_trigger_trade_entry = _broadcast_thresholds(
+        spread_to_trigger_trade_entry, number_of_columns
+    )
+    spread_to_trigger_trade_exit = _broadcast_thresholds(
+        spread_to_trigger_trade_exit, number_of_columns
+    )
+    spread_to_abandon_trade = _broadcast_thresholds(
+        spread_to_abandon_trade, number_of_columns
+    )
+
+    if start_positions is None:
+        start_positions = np.zeros(number_of_columns, dtype=np.int64)
+    if last_positions is None:
+        last_positions = np.full(number_of_columns, number_of_dates - 1)
+    columns = np.arange(number_of_columns)
+
+    opened_abandoned = np.zeros(number_of_columns, dtype=bool)
+    if state is None:
+        state = create_initial_backtest_state(number_of_columns)
+        has_rows = start_positions < number_of_dates
+        opening_spread = np.full(number_of_columns, np.nan)
+        opening_spread[has_rows] = standardised_spread[
+            start_positions[has_rows], columns[has_rows]
+        ]
+        opened_abandoned = (opening_spread > spread_to_abandon_trade) | (
+            opening_spread < -spread_to_abandon_trade
+        )
+        state["trade_abandoned"] |= opened_abandoned
+
+    valuation = np.full((number_of_dates, number_of_columns), np.nan)
+    trade_open_bool = np.full((number_of_dates, number_of_columns), np.nan)
+    trade_abandoned_bool = np.full((number_of_dates, number_of_columns), np.nan)
+    last_listing = np.zeros((number_of_dates, number_of_columns), dtype=bool)
+    trade_records = {field: [] for field in TRADE_RECORD_FIELDS}
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        for position in range(number_of_dates):
+
+            spread = standardised_spread[position]
+            ticker1_price = ticker1_prices[position]
+            ticker2_price = ticker2_prices[position]
+            date_ns = dates_ns[position]
+            previous_spread = state["previous_standardised_spread"]
+
+            in_window = (
+                (position >= start_positions)
+                & (position <= last_positions)
+                & ~state["failed"]
+            )
+            if not in_window.any():
+                continue
+
+            days_trade_open = (
+                date_ns - state["trade_opening_date_ns"]
+            ) // NANOSECONDS_IN_DAY
+            trade_open = state["trade_status_open"].copy()
+            spread_positive = state["spread_positive"].copy()
+
+            skipped = in_window & (state["trade_abandoned"] | (spread == 0))
+            active = in_window & ~skipped
+
+            valuation[position] = np.where(
+                in_window,
+                np.where(
+                    active & trade_open,
+                    _value_open_trades(
+                        state, ticker1_price, ticker2_price, days_trade_open
+                    ),
+                    state["capital"],
+                ),
+                np.nan,
+            )
+            trade_open_bool[position] = np.where(in_window, trade_open, np.nan)
+            trade_abandoned_bool[position] = np.where(
+                in_window, state["trade_abandoned"], np.nan
+            )
+
+            # abandon threshold crossed while open
+            abandoned_today = (
+                active
+                & trade_open
+                & (
+                    (spread_positive & (spread >= spread_to_abandon_trade))
+                    | (~spread_positive & (spread <= -spread_to_abandon_trade))
+                )
+            )
+            if abandoned_today.any():
+                _exit_trades(
+                    state,
+                    abandoned_today,
+                    spread_positive,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                )
+                state["trade_abandoned"] |= abandoned_today
+                _record_and_close_trades(
+                    state,
+                    abandoned_today,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                    position,
+                    trade_records,
+                )
+            handled = abandoned_today
+
+            # last day of the series with a trade open, treated as a delisting
+            delisted_today = (
+                active & ~handled & trade_open & (position == last_positions)
+            )
+            if delisted_today.any():
+                delisting_exit = delisted_today & ((spread > 0) | (spread < 0))
+                _exit_trades(
+                    state,
+                    delisting_exit,
+                    spread > 0,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                )
+                last_listing[position] = delisting_exit
+                _record_and_close_trades(
+                    state,
+                    delisting_exit,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                    position,
+                    trade_records,
+                )
+                for ticker_pair_column in np.flatnonzero(delisted_today):
+                    logging.info(
+                        f"column {ticker_pair_column} backtest incurred a last listing event on date {dates[position]}"
+                    )
+            handled = handled | delisted_today
+
+            # the spread 'hopped' from one side of zero to the other in one day
+            hop_candidates = active & ~handled & trade_open & ~state["trade_abandoned"]
+            hopped_from_positive = hop_candidates & spread_positive & (spread < 0)
+            hopped_from_negative = hop_candidates & ~spread_positive & (spread > 0)
+            hopped = hopped_from_positive | hopped_from_negative
+            if hopped.any():
+                hop_past_abandon = np.abs(spread) > spread_to_abandon_trade
+                state["trade_abandoned"] |= hopped_from_positive & (
+                    hop_past_abandon
+                    | (
+                        np.abs(spread) + np.abs(previous_spread)
+                        > BackTest.DEFAULT_SPREAD_HOP_TO_ABANDON_TRADE
+                    )
+                )
+                state["trade_abandoned"] |= hopped_from_negative & (
+                    hop_past_abandon
+                    | (
+                        (spread - previous_spread)
+                        > BackTest.DEFAULT_SPREAD_HOP_TO_ABANDON_TRADE
+                    )
+                )
+                _exit_trades(
+                    state,
+                    hopped,
+                    spread_positive,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                )
+                _record_and_close_trades(
+                    state,
+                    hopped,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                    position,
+                    trade_records,
+                )
+            handled = handled | hopped
+
+            # the four regular entry and exit conditions
+            regular = active & ~handled & ~state["trade_abandoned"]
+            enter_positive = (
+                regular & ~trade_open & (spread >= spread_to_trigger_trade_entry)
+            )
+            enter_negative = (
+                regular
+                & ~trade_open
+                & ~enter_positive
+                & (spread <= -spread_to_trigger_trade_entry)
+            )
+            exit_positive = (
+                regular
+                & trade_open
+                & (spread < spread_to_trigger_trade_exit)
+                & (spread > 0)
+            )
+            exit_negative = (
+                regular
+                & trade_open
+                & (spread > -spread_to_trigger_trade_exit)
+                & (spread < 0)
+            )
+
+            if enter_positive.any():
+                _enter_trades(
+                    state,
+                    enter_positive,
+                    True,
+                    ticker1_price,
+                    ticker2_price,
+                    date_ns,
+                    position,
+                )
+            if enter_negative.any():
+                _enter_trades(
+                    state,
+                    enter_negative,
+                    False,
+                    ticker1_price,
+                    ticker2_price,
+                    date_ns,
+                    position,
+                )
+            exited = exit_positive | exit_negative
+            if exited.any():
+                _exit_trades(
+                    state,
+                    exited,
+                    spread_positive,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                )
+                _record_and_close_trades(
+                    state,
+                    exited,
+                    ticker1_price,
+                    ticker2_price,
+                    days_trade_open,
+                    position,
+                    trade_records,
+                )
+
+            state["previous_standardised_spread"] = np.where(
+                in_window, spread, previous_spread
+            )
+
+    return {
+        "valuation": valuation,
+        "trade_open_bool": trade_open_bool,
+        "trade_abandoned_bool": trade_abandoned_bool,
+        "last_listing": last_listing,
+        "trades": _concatenate_trade_records(trade_records),
+        "opened_abandoned": opened_abandoned,
+        "state": state,
+    }
+
+
+def build_trade_history_frame(
+    trades: dict[str, np.ndarray],
+    dates: pd.Index,
+    ticker1: str,
+    ticker2: str,
+    opened_abandoned: bool = False,
+) -> pd.DataFrame:
+
+    """Turns one column's closed trade arrays into the same trade history frame BackTest records row by row"""
+
+    trade_history_frame = pd.DataFrame(
+        {
+            "trade_counter": trades["trade_counter"].astype(np.int64),
+            "opening_date": dates[trades["opening_position"].astype(np.int64)],
+            "closing_date": dates[trades["closing_position"].astype(np.int64)],
+            "position_ticker1": trades["position_ticker1"].astype(np.int64),
+            "opening_price_ticker1": trades["opening_price_ticker1"],
+            "closing_price_ticker1": trades["closing_price_ticker1"],
+            "position_ticker2": trades["position_ticker2"].astype(np.int64),
+            "opening_price_ticker2": trades["opening_price_ticker2"],
+            "closing_price_ticker2": trades["closing_price_ticker2"],
+            "days_trade_open": trades["days_trade_open"].astype(np.int64),
+            "short_ticker": np.where(
+                trades["short_ticker_is_ticker1"].astype(bool), ticker1, ticker2
+            ),
+            "closing_capital": trades["closing_capital"],
+            "trade_abandoned": trades["trade_abandoned"].astype(bool),
+            "opened_abandoned": np.zeros(len(trades["trade_counter"]), dtype=bool),
+        },
+        columns=BackTest.TRADE_DF_RECORD_COLUMNS_LIST,
+    )
+
+    trade_history_frame.index = trade_history_frame["trade_counter"].to_numpy()
+    if opened_abandoned:
+        trade_history_frame = trade_history_frame.iloc[:0].reindex(
+            [BackTest.FIRST_INDEX_TRADE_DF]
+        )
+        trade_history_frame[["trade_abandoned", "opened_abandoned"]] = True
+
+    return trade_history_frame
+
+
+def build_valuation_ledger_frame(
+    backtest_results: dict,
+    column: int,
+    dates: pd.Index,
+) -> pd.DataFrame:
+
+    """One column's per day valuation columns, with the 'trade_abandoned' last listing marker BackTest adds when a trade is open on the final day"""
+
+    valuation_ledger = pd.DataFrame(
+        {
+            "valuation": backtest_results["valuation"][:, column],
+            "trade_open_bool": backtest_results["trade_open_bool"][:, column],
+            "trade_abandoned_bool": backtest_results["trade_abandoned_bool"][:, column],
+        },
+        index=dates,
+        columns=BackTest.SPREAD_SERIES_VALUATION_AND_INFO_COLS,
+    )
+
+    last_listing = backtest_results["last_listing"][:, column]
+    if last_listing.any():
+        valuation_ledger[LAST_LISTING_COLUMN] = pd.Series(
+            np.nan, index=dates, dtype=object
+        )
+        valuation_ledger.loc[last_listing, LAST_LISTING_COLUMN] = LAST_LISTING_STRING
+
+    return valuation_ledger
+
+
+def select_column_trades(
+    trades: dict[str, np.ndarray],
+    column: int,
+) -> dict[str, np.ndarray]:
+
+    start, end = np.searchsorted(trades["column"], [column, column + 1])
+    return {field: values[start:end] for field, values in trades.items()}
+
+
+class VectorisedBackTest(BackTest):
+
+    """Drop-in replacement for BackTest which runs the daily trading logic on numpy arrays.
+
+    Instantiation (data loading, thresholds, test inputs) is inherited unchanged from BackTest. The trade method hands the aligned spread and price arrays to run_vectorised_backtest and then writes the same trade history frame and valuation columns that BackTest.trade builds one day at a time, so the two produce identical closing capital.
+    """
+
+    def trade(
+        self,
+        test_inputs: dict | None = None,
+    ) -> None:
+
+        dates = self.standardised_spread.index
+
+        backtest_results = run_vectorised_backtest(
+            standardised_spread=self.standardised_spread.to_numpy(dtype=float),
+            ticker1_prices=self.ticker1_prices.reindex(dates).to_numpy(dtype=float),
+            ticker2_prices=self.ticker2_prices.reindex(dates).to_numpy(dtype=float),
+            dates=dates.to_numpy(dtype="datetime64[ns]"),
+            spread_to_trigger_trade_entry=self.spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit=self.spread_to_trigger_trade_exit,
+            spread_to_abandon_trade=self.spread_to_abandon_trade,
+            last_positions=np.array([dates.argmax()]),
+        )
+        state = backtest_results["state"]
+
+        if state["failed"][0]:
+            raise ValueError(
+                f"Allocation failed for {self.ticker1} & {self.ticker2}, missing or zero prices on an entry date."
+            )
+
+        self.trade_history_frame = build_trade_history_frame(
+            trades=backtest_results["trades"],
+            dates=dates,
+            ticker1=self.ticker1,
+            ticker2=self.ticker2,
+            opened_abandoned=backtest_results["opened_abandoned"][0],
+        )
+        self._assign_valuation_columns(backtest_results, dates)
+
+        self.capital = state["capital"][0]
+        self.trade_counter = int(state["trade_counter"][0])
+        self.trade_abandoned = bool(state["trade_abandoned"][0])
+        self.trade_status_open = bool(state["trade_status_open"][0])
+        if len(dates):
+            self.last_date = dates[-1]
+            self.last_standardised_spread = self.standardised_spread.iloc[-1]
+
+        if test_inputs is None:
+            self._save_trade_trade_history_information_to_databases()
+
+        logging.info(
+            f"Completed vectorised backtest for {self.ticker1} & {self.ticker2}"
+        )
+
+    def _assign_valuation_columns(
+        self,
+        backtest_results: dict,
+        dates: pd.Index,
+    ) -> None:
+
+        self._assign_valuation_ledger(
+            build_valuation_ledger_frame(
+                backtest_results=backtest_results,
+                column=0,
+                dates=dates,
+            )
+        )
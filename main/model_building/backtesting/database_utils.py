@@ -1,8 +1,11 @@
+import numpy as np
 import pandas as pd
-import sqlite3
 
-from main.utilities.functions import (
-    custom_create_db_engine,
+from main.utilities.series_store import (
+    backtest_parameters_series_type,
+    get_series_store,
+    SeriesRecord,
+    SeriesStore,
 )
 
 from main.utilities.paths import (
@@ -10,14 +13,24 @@ from main.utilities.paths import (
     PATHWAY_TO_SQL_DB_OF_BACKTEST_RESULT_DFS,
 )
 
+from main.utilities.constants import (
+    LAST_LISTING_STRING,
+)
+
+VALUATION_LEDGER_COLUMNS = ["valuation", "trade_open_bool", "trade_abandoned_bool"]
+LAST_LISTING_COLUMN = "trade_abandoned"
+STATUS_COLUMN = "status"
+STATUS_NOT_TRADED = -1  # a date the backtest made no ledger entry on
+STATUS_TRADE_OPEN = 1
+STATUS_TRADE_ABANDONED = 2
+STATUS_LAST_LISTING = 4
+
 
 class TradeHistorySaver:
 
-    """This class is used to save the trade history dataframe to a SQL database."""
+    """This class is used to save the trade history dataframe to the backtest results series store."""
 
-    DATABASE_NAME_BACKTEST_TRADEFRAMES = (
-        f"sqlite:///{PATHWAY_TO_SQL_DB_OF_BACKTEST_RESULT_DFS}"
-    )
+    PATHWAY_TO_BACKTEST_TRADEFRAMES = PATHWAY_TO_SQL_DB_OF_BACKTEST_RESULT_DFS
 
     def __init__(
         self,
@@ -38,23 +51,33 @@ class TradeHistorySaver:
         self.kalman_spread = kalman_spread
         self.trade_history_frame = trade_history_frame
 
+    def trade_history_series_record(
+        self,
+    ) -> SeriesRecord:
+        return SeriesRecord(
+            self.ticker1,
+            self.ticker2,
+            backtest_parameters_series_type(
+                self.spread_to_trigger_trade_entry,
+                self.spread_to_trigger_trade_exit,
+                self.spread_to_abandon_trade,
+            ),
+            self.trade_history_frame,
+            self.kalman_spread,
+        )
+
     def save_trade_history_df_to_sql(
         self,
     ) -> None:
-        engine = custom_create_db_engine(self.DATABASE_NAME_BACKTEST_TRADEFRAMES)
-        results_table_name = (
-            f"{self.ticker1}_{self.ticker2}_{self.spread_to_trigger_trade_entry}_{self.spread_to_trigger_trade_exit}_{self.spread_to_abandon_trade}{'_kalman' if self.kalman_spread else ''}"
-        ).replace(".", "")
         save_pandas_object_to_database(
-            results_table_name,
-            self.trade_history_frame,
-            engine,
+            get_series_store(self.PATHWAY_TO_BACKTEST_TRADEFRAMES),
+            self.trade_history_series_record(),
         )
 
 
 class RegularSpreadSaver:
 
-    DATABASE_NAME_SPREAD_BACKTEST = f"sqlite:///{PATHWAY_TO_SQL_DB_SPREADS_BACKTEST}"
+    PATHWAY_TO_SPREAD_BACKTEST = PATHWAY_TO_SQL_DB_SPREADS_BACKTEST
 
     def __init__(
         self,
@@ -75,30 +98,135 @@ class RegularSpreadSaver:
         self.kalman_spread = kalman_spread
         self.regular_spread = regular_spread
 
+    def regular_spread_series_record(
+        self,
+        kalman_spread: bool | None = None,
+    ) -> SeriesRecord:
+        if kalman_spread is None:
+            kalman_spread = self.kalman_spread
+        return SeriesRecord(
+            self.ticker1,
+            self.ticker2,
+            backtest_parameters_series_type(
+                self.spread_to_trigger_trade_entry,
+                self.spread_to_trigger_trade_exit,
+                self.spread_to_abandon_trade,
+            ),
+            compact_valuation_ledger(self.regular_spread),
+            kalman_spread,
+        )
+
     def save_regular_spread_df_to_sql(
         self,
-        kalman_spread: bool,
+        kalman_spread: bool | None = None,
     ) -> None:
-        engine = custom_create_db_engine(self.DATABASE_NAME_SPREAD_BACKTEST)
-        spread_series_name = (
-            f"{self.ticker1}_{self.ticker2}_{self.spread_to_trigger_trade_entry}_{self.spread_to_trigger_trade_exit}_{self.spread_to_abandon_trade}{'_kalman' if kalman_spread else ''}"
-        ).replace(".", "")
         save_pandas_object_to_database(
-            spread_series_name,
-            self.regular_spread,
-            engine,
+            get_series_store(self.PATHWAY_TO_SPREAD_BACKTEST),
+            self.regular_spread_series_record(kalman_spread),
         )
 
 
 def save_pandas_object_to_database(
-    table_name: str,
-    trade_history_df: pd.DataFrame,
-    engine: sqlite3.Connection,
+    series_store: SeriesStore,
+    series_record: SeriesRecord,
 ) -> None:
-    trade_history_df.name = table_name
-    trade_history_df.to_sql(
-        table_name,
-        engine,
-        if_exists="replace",
-        index=True,
+    series_store.write_series(*series_record)
+
+
+def ledger_status_codes(
+    trade_open: np.ndarray,
+    trade_abandoned: np.ndarray,
+    last_listing: np.ndarray | bool = False,
+) -> np.ndarray:
+
+    """Packs the per day trade open, trade abandoned and last listing flags into int8 status codes"""
+
+    return (
+        STATUS_TRADE_OPEN * np.asarray(trade_open, dtype=bool)
+        + STATUS_TRADE_ABANDONED * np.asarray(trade_abandoned, dtype=bool)
+        + STATUS_LAST_LISTING * np.asarray(last_listing, dtype=bool)
+    ).astype(np.int8)
+
+
+def valuation_ledger_frame(
+    valuation: np.ndarray,
+    status: np.ndarray,
+    index: pd.Index,
+) -> pd.DataFrame:
+
+    """The valuation columns BackTest adds to the regular spread, from the valuations and status codes of a ledger. Dates without an entry are NaN throughout, and the 'trade_abandoned' last listing marker column is only added when a last listing occurred"""
+
+    status = np.asarray(status, dtype=np.int8)
+    not_traded = status == STATUS_NOT_TRADED
+    valuation_ledger = pd.DataFrame(
+        {
+            "valuation": np.asarray(valuation, dtype=np.float64),
+            "trade_open_bool": np.where(
+                not_traded, np.nan, (status & STATUS_TRADE_OPEN) > 0
+            ),
+            "trade_abandoned_bool": np.where(
+                not_traded, np.nan, (status & STATUS_TRADE_ABANDONED) > 0
+            ),
+        },
+        index=index,
+        columns=VALUATION_LEDGER_COLUMNS,
+    )
+
+    last_listing = ~not_traded & ((status & STATUS_LAST_LISTING) > 0)
+    if last_listing.any():
+        valuation_ledger[LAST_LISTING_COLUMN] = pd.Series(
+            np.nan, index=index, dtype=object
+        )
+        valuation_ledger.loc[last_listing, LAST_LISTING_COLUMN] = LAST_LISTING_STRING
+
+    return valuation_ledger
+
+
+def compact_valuation_ledger(
+    regular_spread: pd.DataFrame,
+) -> pd.DataFrame:
+
+    """The regular spread with its valuation columns stored compactly, the valuation as float32 and the three flag columns as a single int8 status column. Frames without valuation columns are returned as they are"""
+
+    if not set(VALUATION_LEDGER_COLUMNS).issubset(regular_spread.columns):
+        return regular_spread
+
+    trade_open = regular_spread["trade_open_bool"].to_numpy(dtype=float)
+    last_listing = (
+        regular_spread[LAST_LISTING_COLUMN].eq(LAST_LISTING_STRING).to_numpy()
+        if LAST_LISTING_COLUMN in regular_spread.columns
+        else False
+    )
+    status = ledger_status_codes(
+        trade_open == 1,
+        regular_spread["trade_abandoned_bool"].to_numpy(dtype=float) == 1,
+        last_listing,
+    )
+    status[np.isnan(trade_open)] = STATUS_NOT_TRADED
+
+    return regular_spread.drop(
+        columns=VALUATION_LEDGER_COLUMNS + [LAST_LISTING_COLUMN], errors="ignore"
+    ).assign(
+        **{
+            "valuation": regular_spread["valuation"].to_numpy(dtype=np.float32),
+            STATUS_COLUMN: status,
+        }
+    )
+
+
+def expand_valuation_ledger(
+    stored_regular_spread: pd.DataFrame,
+) -> pd.DataFrame:
+
+    """Reverses compact_valuation_ledger, giving back the valuation columns BackTest trades with (valuations keep float32 precision). Frames stored before the ledger was compacted are returned as they are"""
+
+    if STATUS_COLUMN not in stored_regular_spread.columns:
+        return stored_regular_spread
+
+    return stored_regular_spread.drop(columns=["valuation", STATUS_COLUMN]).join(
+        valuation_ledger_frame(
+            stored_regular_spread["valuation"].to_numpy(),
+            stored_regular_spread[STATUS_COLUMN].to_numpy(),
+            stored_regular_spread.index,
+        )
     )
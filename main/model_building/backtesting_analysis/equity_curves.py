@@ -1,45 +1,95 @@
+import os
+import uuid
 import pandas as pd
 from joblib import Parallel, delayed
 import numpy as np
-from datetime import datetime
+import logging
+
+logging.basicConfig(level=logging.INFO)
 
 from main.utilities.constants import (
     CORES_TO_USE,
+    EQUITY_CURVE_BATCH_SIZE,
+)
+
+from main.utilities.paths import (
+    PATHWAY_TO_PRICE_DF,
+    PATHWAY_TO_GROUPED_EQUITY_CURVES,
 )
 
 from main.utilities.functions import (
     retrieve_backtest_equity_curve_spread_table_from_sql_df,
 )
 
+ALL_PAIRS_GROUPING = "all_pairs"
+SECTOR_GROUPINGS = [
+    "first_ticker_sector",
+    "second_ticker_sector",
+    "tickers_sectors_concat",
+]
+GROUPED_EQUITY_CURVE_KEY_COLUMNS = ["grouping", "group", "kalman"]
 
-def _equity_table_adder(
-    row: pd.Series,
-    kalman: bool = False,
-) -> tuple:
-    spread_table = retrieve_backtest_equity_curve_spread_table_from_sql_df(
-        row=row,
-        kalman=kalman,
-    )
 
-    spread_table.columns = [""]
-    return (
-        spread_table,
-        spread_table.first_valid_index(),
-        spread_table.last_valid_index(),
+def _filled_valuation_on_dates(
+    valuation_series: pd.Series,
+    dates: pd.Index,
+) -> np.ndarray | None:
+
+    """A pair's valuation on every date of dates, back filled before and between its own valuations and forward filled after its last, the column an outer concat of every pair followed by bfill and ffill would give it. None if the pair has no valuation"""
+
+    valid_valuation_series = valuation_series.dropna()
+    if valid_valuation_series.empty:
+        return None
+
+    valid_positions = dates.get_indexer(valid_valuation_series.index)
+    if (valid_positions < 0).any():
+        raise ValueError(
+            f"{valuation_series.name} has valuations on dates missing from the equity curve dates"
+        )
+    order = np.argsort(valid_positions, kind="stable")
+    next_valid_valuation = np.searchsorted(
+        valid_positions[order], np.arange(len(dates)), side="left"
     )
 
+    return valid_valuation_series.to_numpy(dtype=np.float64)[order][
+        np.minimum(next_valid_valuation, len(order) - 1)
+    ]
 
-def _concat_modify_sum_results(
-    results: list[list[pd.Series], datetime, datetime],
-) -> pd.Series:
 
-    table_list, min_dates, max_dates = zip(*results)
-    result = pd.concat(table_list, axis=1, join="outer")
-    result = result.fillna(method="bfill", axis=0)
-    result = result.fillna(method="ffill", axis=0)
-    summed_result = result.sum(axis=1)
+def _add_filled_valuation(
+    summed_valuation: np.ndarray,
+    dates_with_rows: np.ndarray,
+    valuation_series: pd.Series,
+    dates: pd.Index,
+) -> None:
 
-    return summed_result, min_dates, max_dates
+    filled_valuation = _filled_valuation_on_dates(valuation_series, dates)
+    if filled_valuation is not None:
+        summed_valuation += filled_valuation
+    row_positions = dates.get_indexer(valuation_series.index)
+    dates_with_rows[row_positions[row_positions >= 0]] = True
+
+
+def _summed_equity_curve_batch(
+    results_df: pd.DataFrame,
+    dates: pd.Index,
+    kalman: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+
+    """The filled valuations of a batch of pairs summed on dates, with a mask of the dates any of the pairs has a row on"""
+
+    summed_valuation = np.zeros(len(dates))
+    dates_with_rows = np.zeros(len(dates), dtype=bool)
+    for _, row in results_df.iterrows():
+        valuation_series = retrieve_backtest_equity_curve_spread_table_from_sql_df(
+            row=row,
+            kalman=kalman,
+        )
+        _add_filled_valuation(
+            summed_valuation, dates_with_rows, valuation_series, dates
+        )
+
+    return summed_valuation, dates_with_rows
 
 
 def create_eq_curve(
@@ -48,8 +98,15 @@ def create_eq_curve(
     second_ticker_sector: str | None = None,
     combined_tickers_sectors: str | None = None,
     kalman: bool = False,
+    dates: pd.Index | None = None,
+    batch_size: int = EQUITY_CURVE_BATCH_SIZE,
 ) -> pd.Series:
 
+    """The summed valuation of every pair in results_df (optionally filtered by sector), each pair's valuation held at its first value before it starts and its last after it ends.
+
+    Batches of batch_size pairs are summed by the workers and added to a running total as they arrive, so memory is bounded by one array over dates (the price parquet's dates by default) rather than a column per pair. The curve covers the dates any pair has a row on.
+    """
+
     if first_ticker_sector is not None:
         results_df = results_df[
             results_df["first_ticker_sector"] == first_ticker_sector
@@ -63,20 +120,162 @@ def create_eq_curve(
             results_df["tickers_sectors_concat"] == combined_tickers_sectors
         ]
 
-    results = Parallel(n_jobs=CORES_TO_USE)(
-        delayed(_equity_table_adder)(
-            row=row,
+    if dates is None:
+        dates = pd.read_parquet(PATHWAY_TO_PRICE_DF, columns=[]).index
+
+    summed_valuation = np.zeros(len(dates))
+    dates_with_rows = np.zeros(len(dates), dtype=bool)
+    for batch_summed_valuation, batch_dates_with_rows in Parallel(
+        n_jobs=CORES_TO_USE, return_as="generator"
+    )(
+        delayed(_summed_equity_curve_batch)(
+            results_df=results_df.iloc[batch_start : batch_start + batch_size],
+            dates=dates,
             kalman=kalman,
         )
-        for _, row in results_df.iterrows()
-    )
+        for batch_start in range(0, len(results_df), batch_size)
+    ):
+        summed_valuation += batch_summed_valuation
+        dates_with_rows |= batch_dates_with_rows
 
-    summed_result, min_dates, max_dates = _concat_modify_sum_results(
-        results=results,
+    summed_result = pd.Series(
+        summed_valuation[dates_with_rows], index=dates[dates_with_rows]
     )
 
-    assert summed_result.first_valid_index() == min(min_dates)
-    assert summed_result.last_valid_index() == max(max_dates)
     assert not summed_result.isna().any()
 
     return summed_result
+
+
+def _grouped_equity_curve_batch(
+    results_df: pd.DataFrame,
+    dates: pd.Index,
+    groupings: list[str],
+    kalman_variants: tuple[bool, ...],
+) -> dict[tuple[str, str, bool], tuple[np.ndarray, np.ndarray]]:
+
+    """The filled valuations of a batch of pairs summed on dates for every group a pair belongs to, keyed by (grouping, group, kalman). Each pair's valuation is read once per kalman variant however many groups it is added to"""
+
+    grouped_curves = {}
+    for _, row in results_df.iterrows():
+        pair_groups = [(ALL_PAIRS_GROUPING, ALL_PAIRS_GROUPING)] + [
+            (grouping, row[grouping])
+            for grouping in groupings
+            if not pd.isna(row[grouping])
+        ]
+        for kalman in kalman_variants:
+            valuation_series = retrieve_backtest_equity_curve_spread_table_from_sql_df(
+                row=row,
+                kalman=kalman,
+            )
+            for grouping, group in pair_groups:
+                summed_valuation, dates_with_rows = grouped_curves.setdefault(
+                    (grouping, group, kalman),
+                    (np.zeros(len(dates)), np.zeros(len(dates), dtype=bool)),
+                )
+                _add_filled_valuation(
+                    summed_valuation, dates_with_rows, valuation_series, dates
+                )
+
+    return grouped_curves
+
+
+def create_grouped_eq_curves(
+    results_df: pd.DataFrame,
+    groupings: list[str] = SECTOR_GROUPINGS,
+    kalman_variants: tuple[bool, ...] = (False, True),
+    dates: pd.Index | None = None,
+    batch_size: int = EQUITY_CURVE_BATCH_SIZE,
+    pathway: str = PATHWAY_TO_GROUPED_EQUITY_CURVES,
+) -> pd.DataFrame:
+
+    """The equity curve create_eq_curve gives every group of results_df, for every value of each of the groupings columns and for all pairs, in each kalman variant, from a single pass over the pairs.
+
+    The curves are written to pathway as one long Parquet table (grouping, group, kalman and valuation on a Date index) and returned in that layout, read_grouped_eq_curve then looks a curve up without touching the pairs' ledgers. Rerun after backtesting again.
+    """
+
+    if dates is None:
+        dates = pd.read_parquet(PATHWAY_TO_PRICE_DF, columns=[]).index
+
+    grouped_curves = {}
+    for batch_grouped_curves in Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
+        delayed(_grouped_equity_curve_batch)(
+            results_df=results_df.iloc[batch_start : batch_start + batch_size],
+            dates=dates,
+            groupings=groupings,
+            kalman_variants=kalman_variants,
+        )
+        for batch_start in range(0, len(results_df), batch_size)
+    ):
+        for group_key, (
+            batch_summed_valuation,
+            batch_dates_with_rows,
+        ) in batch_grouped_curves.items():
+            if group_key not in grouped_curves:
+                grouped_curves[group_key] = (
+                    batch_summed_valuation,
+                    batch_dates_with_rows,
+                )
+                continue
+            summed_valuation, dates_with_rows = grouped_curves[group_key]
+            summed_valuation += batch_summed_valuation
+            dates_with_rows |= batch_dates_with_rows
+
+    grouped_curves_df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "grouping": grouping,
+                    "group": group,
+                    "kalman": kalman,
+                    "valuation": summed_valuation[dates_with_rows],
+                },
+                index=dates[dates_with_rows].rename("Date"),
+            )
+            for (grouping, group, kalman), (
+                summed_valuation,
+                dates_with_rows,
+            ) in sorted(grouped_curves.items())
+        ]
+        or [
+            pd.DataFrame(
+                columns=GROUPED_EQUITY_CURVE_KEY_COLUMNS + ["valuation"],
+                index=pd.DatetimeIndex([], name="Date"),
+            )
+        ]
+    )
+
+    os.makedirs(os.path.dirname(pathway), exist_ok=True)
+    temporary_pathway = os.path.join(
+        os.path.dirname(pathway), f".{os.path.basename(pathway)}.{uuid.uuid4().hex}"
+    )
+    grouped_curves_df.to_parquet(temporary_pathway, index=True)
+    os.replace(temporary_pathway, pathway)
+    logging.info(f"wrote {len(grouped_curves)} grouped equity curves to {pathway}")
+
+    return grouped_curves_df
+
+
+def read_grouped_eq_curve(
+    grouping: str = ALL_PAIRS_GROUPING,
+    group: str = ALL_PAIRS_GROUPING,
+    kalman: bool = False,
+    pathway: str = PATHWAY_TO_GROUPED_EQUITY_CURVES,
+) -> pd.Series:
+
+    """One curve written by create_grouped_eq_curves, eg grouping "tickers_sectors_concat" and one of its values, or the all pairs curve by default. Only the curve's rows are read"""
+
+    grouped_curve_df = pd.read_parquet(
+        pathway,
+        filters=[
+            ("grouping", "==", grouping),
+            ("group", "==", group),
+            ("kalman", "==", kalman),
+        ],
+    )
+    if grouped_curve_df.empty:
+        raise KeyError(
+            f"no grouped equity curve for {grouping}={group}, kalman={kalman}"
+        )
+
+    return grouped_curve_df["valuation"]
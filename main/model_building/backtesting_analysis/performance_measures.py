@@ -14,6 +14,7 @@ from main.utilities.paths import (
 from main.utilities.constants import (
     CORES_TO_USE,
     ANNUAL_RISK_FREE_RATE,
+    BACKTEST_PARAMETER_COLUMNS,
     CAPITAL_STARTING,
     NUMBER_DAYS_TRADING_YEAR,
     TRADE_STARTED_ABANDONED_STRING,
@@ -23,8 +24,17 @@ from main.utilities.functions import (
     retrieve_backtest_equity_curve_spread_table_from_sql_df,
     get_table_from_backtest_results_dfs,
 )
+from main.utilities.results_sink import (
+    ResultsSink,
+    PAIR_KEY_COLUMNS,
+)
 
 INDEX_POSITION_STARTING_CAPITAL = 0
+PERFORMANCE_METRIC_COLUMNS = [
+    "sharpe_ratio",
+    "no_profitable_trades",
+    "fraction_profitable_trades",
+]
 
 
 def _calculate_sharpe_ratio(
@@ -43,23 +53,62 @@ def _calculate_sharpe_ratio(
     return sharpe_ratio
 
 
+def calculate_sharpe_ratio_columns(
+    valuation_matrix: np.ndarray,
+    risk_free_rate: float = ANNUAL_RISK_FREE_RATE,
+) -> np.ndarray:
+
+    """_calculate_sharpe_ratio applied to every column of a (dates x backtests) valuation matrix, missing days are skipped"""
+
+    arith_return_matrix = np.diff(valuation_matrix, axis=0)
+    number_of_returns = (~np.isnan(arith_return_matrix)).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_returns = np.nansum(arith_return_matrix, axis=0) / number_of_returns
+        std_returns = np.sqrt(
+            np.nansum((arith_return_matrix - mean_returns) ** 2, axis=0)
+            / (number_of_returns - 1)
+        )
+        sharpe_ratios = (
+            mean_returns - (risk_free_rate / NUMBER_DAYS_TRADING_YEAR)
+        ) / std_returns
+
+    sharpe_ratios[sharpe_ratios == -np.inf] = np.nan
+
+    return sharpe_ratios
+
+
+def _backtest_opened_abandoned(
+    backtest_result_df: pd.DataFrame,
+) -> bool:
+
+    """Trade histories saved before the opened_abandoned column existed mark a backtest that opened abandoned with TRADE_STARTED_ABANDONED_STRING as its closing capital"""
+
+    if "opened_abandoned" in backtest_result_df.columns:
+        return backtest_result_df["opened_abandoned"].astype(bool).any()
+
+    return (
+        backtest_result_df["closing_capital"].eq(TRADE_STARTED_ABANDONED_STRING).any()
+    )
+
+
 def _create_trade_pnl_list(
     row: pd.Series,
-    backtest_params: str,
+    backtest_parameters: tuple[float, float, float],
     kalman: bool = False,
 ) -> pd.Series:
 
     table_name = f"{row['first_ticker']}_{row['second_ticker']}"
     backtest_result_df = get_table_from_backtest_results_dfs(
         table_name=table_name,
-        backtest_params=backtest_params,
+        backtest_parameters=backtest_parameters,
         kalman=kalman,
     )
 
     if backtest_result_df.empty:
         return None
 
-    elif backtest_result_df["closing_capital"].eq(TRADE_STARTED_ABANDONED_STRING).any():
+    elif _backtest_opened_abandoned(backtest_result_df):
         return TRADE_STARTED_ABANDONED_STRING
 
     series_with_start_cap = pd.Series(
@@ -111,18 +160,20 @@ def _fraction_of_profitable_trades(
 
 def _calculate_various_performance_metrics_single(
     row: pd.Series,
-    backtest_params: str,
+    backtest_parameters: tuple[float, float, float],
     kalman: bool = False,
 ) -> list[float]:
 
     valuation_series = retrieve_backtest_equity_curve_spread_table_from_sql_df(
         row=row,
         pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+        backtest_parameters=backtest_parameters,
+        kalman=kalman,
     )
 
     trade_pnl_list = _create_trade_pnl_list(
         row=row,
-        backtest_params=backtest_params,
+        backtest_parameters=backtest_parameters,
         kalman=kalman,
     )
 
@@ -142,20 +193,65 @@ def _calculate_various_performance_metrics_single(
 
 
 def calculate_various_performance_metrics_whole_set(
-    backtest_params: str,
+    results_df: pd.DataFrame,
+    backtest_parameters: tuple[float, float, float],
     kalman: bool = True,
+    results_sink: ResultsSink | None = None,
 ) -> list:
 
-    valuation_metrics = Parallel(n_jobs=CORES_TO_USE)(
+    """The sharpe ratio, number and fraction of profitable trades of every row of results_df, backtested with the (entry, exit, abandon) thresholds of backtest_parameters.
+
+    With a results_sink each pair's metrics are appended to it as they arrive from the workers, pairs it already holds from an interrupted run are skipped, and the sink is compacted once every pair is in.
+    """
+
+    if results_sink is None:
+        return Parallel(n_jobs=CORES_TO_USE)(
+            delayed(_calculate_various_performance_metrics_single)(
+                row=row,
+                backtest_parameters=backtest_parameters,
+                kalman=kalman,
+            )
+            for _, row in results_df.iterrows()
+        )
+
+    written_keys = results_sink.written_keys()
+    results_df_to_calculate = results_df[
+        [
+            pair not in written_keys
+            for pair in zip(results_df["first_ticker"], results_df["second_ticker"])
+        ]
+    ]
+    logging.info(
+        f"{len(results_df) - len(results_df_to_calculate)} pairs already in the results sink, skipping"
+    )
+
+    valuation_metrics = Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
         delayed(_calculate_various_performance_metrics_single)(
             row=row,
-            backtest_params=backtest_params,
+            backtest_parameters=backtest_parameters,
             kalman=kalman,
         )
-        for _, row in results_df.iterrows()
+        for _, row in results_df_to_calculate.iterrows()
     )
+    for (_, row), metrics in zip(results_df_to_calculate.iterrows(), valuation_metrics):
+        results_sink.append(
+            [
+                {
+                    "first_ticker": row["first_ticker"],
+                    "second_ticker": row["second_ticker"],
+                    **dict(zip(PERFORMANCE_METRIC_COLUMNS, metrics)),
+                }
+            ]
+        )
+    results_sink.compact()
 
-    return valuation_metrics
+    return (
+        results_df[PAIR_KEY_COLUMNS]
+        .merge(results_sink.read(), on=PAIR_KEY_COLUMNS, how="left")[
+            PERFORMANCE_METRIC_COLUMNS
+        ]
+        .values.tolist()
+    )
 
 
 if __name__ == "__main__":
@@ -166,32 +262,26 @@ if __name__ == "__main__":
         PRESENT_BACKTEST_PARAMS,
     )
 
+    results_df[BACKTEST_PARAMETER_COLUMNS] = PRESENT_BACKTEST_PARAMS
+
     valuation_metrics_kalman = calculate_various_performance_metrics_whole_set(
-        backtest_params=PRESENT_BACKTEST_PARAMS,
+        results_df=results_df,
+        backtest_parameters=PRESENT_BACKTEST_PARAMS,
         kalman=False,
     )
 
-    results_df[
-        [
-            f"sharpe_ratio_{PRESENT_BACKTEST_PARAMS}",
-            f"no_profitable_trades_{PRESENT_BACKTEST_PARAMS}",
-            f"fraction_profitable_trades_{PRESENT_BACKTEST_PARAMS}",
-        ]
-    ] = valuation_metrics_kalman
+    results_df[PERFORMANCE_METRIC_COLUMNS] = valuation_metrics_kalman
 
     logging.info("completed NON KALMAN performance metrics")
 
     valuation_metrics = calculate_various_performance_metrics_whole_set(
-        backtest_params=PRESENT_BACKTEST_PARAMS,
+        results_df=results_df,
+        backtest_parameters=PRESENT_BACKTEST_PARAMS,
         kalman=True,
     )
 
     results_df[
-        [
-            f"sharpe_ratio_{PRESENT_BACKTEST_PARAMS}_kalman",
-            f"no_profitable_trades_{PRESENT_BACKTEST_PARAMS}_kalman",
-            f"fraction_profitable_trades_{PRESENT_BACKTEST_PARAMS}_kalman",
-        ]
+        [f"{metric_column}_kalman" for metric_column in PERFORMANCE_METRIC_COLUMNS]
     ] = valuation_metrics
 
     results_df.to_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
@@ -16,25 +16,75 @@ from main.utilities.constants import (
 
 from main.utilities.functions import (
     retrieve_spread_table_from_sql_df,
+    left_align_spread_columns,
+)
+
+from main.model_building.scripts.batched_adf import (
+    batched_adf_statistics,
+    mackinnon_p_values,
 )
 
 ADF_TEST_RESULT_P_VAL_ELEMENT_NO = 1
+ADF_REGRESSION = "c"
 
 
 def perform_adf_single(
     row: pd.Series,
+    spread_series_from_rolling: pd.DataFrame | None = None,
 ) -> tuple:
 
     if row["engle_test_training"] >= ENGLE_COINT_P_VALUE_THRESHOLD:
         return np.nan
 
-    spread_series_from_rolling = retrieve_spread_table_from_sql_df(
-        row, spread_type="_regular_spread"
-    )
+    if spread_series_from_rolling is None:
+        spread_series_from_rolling = retrieve_spread_table_from_sql_df(
+            row, spread_type="_regular_spread"
+        )
 
     return adfuller(spread_series_from_rolling)[ADF_TEST_RESULT_P_VAL_ELEMENT_NO]
 
 
+def batched_adf_p_values(
+    spread_matrix: np.ndarray,
+    maxlag: int | None = None,
+    autolag: str | None = "aic",
+) -> np.ndarray:
+
+    """adfuller p values (constant only regression) for every column of a (dates x pairs) spread matrix, each column running from its first to its last value. Columns of the same length are solved together by batched_adf_statistics with lags picked by AIC up to maxlag, or fixed at maxlag when autolag is None.
+
+    Columns with missing values inside their span, which adfuller refuses, get NaN. A group whose moment matrices are singular goes through adfuller itself.
+    """
+
+    spread_matrix = np.asarray(spread_matrix, dtype=float)
+    aligned_spreads, series_lengths, has_gaps = left_align_spread_columns(spread_matrix)
+    adfuller_autolag = "AIC" if autolag == "aic" else autolag
+
+    def adfuller_p_value(column: int) -> float:
+        return adfuller(
+            aligned_spreads[: series_lengths[column], column],
+            maxlag=maxlag,
+            regression=ADF_REGRESSION,
+            autolag=adfuller_autolag,
+        )[ADF_TEST_RESULT_P_VAL_ELEMENT_NO]
+
+    p_values = np.full(spread_matrix.shape[1], np.nan)
+    for series_length in np.unique(series_lengths[~has_gaps & (series_lengths > 0)]):
+        columns = np.flatnonzero(~has_gaps & (series_lengths == series_length))
+        try:
+            test_statistics, _ = batched_adf_statistics(
+                aligned_spreads[:series_length, columns],
+                regression=ADF_REGRESSION,
+                maxlag=maxlag,
+                autolag=autolag,
+            )
+        except np.linalg.LinAlgError:
+            p_values[columns] = [adfuller_p_value(column) for column in columns]
+            continue
+        p_values[columns] = mackinnon_p_values(test_statistics, ADF_REGRESSION)
+
+    return p_values
+
+
 def perform_adf_whole_set(
     results_df: pd.DataFrame,
 ) -> list:
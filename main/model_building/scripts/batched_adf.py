@@ -0,0 +1,305 @@
+import numpy as np
+from scipy.stats import norm
+from statsmodels.tsa.adfvalues import (
+    _tau_maxs,
+    _tau_mins,
+    _tau_stars,
+    _tau_smallps,
+    _tau_largeps,
+)
+
+REGRESSIONS_SUPPORTED = ("n", "c")
+LEVEL_COLUMN_WITH_CONSTANT = 1
+LEVEL_COLUMN_WITHOUT_CONSTANT = 0
+SCHWERT_MAXLAG_MULTIPLIER = 12.0
+SCHWERT_MAXLAG_OBSERVATION_SCALE = 100.0
+SCHWERT_MAXLAG_POWER = 1 / 4.0
+
+
+def mackinnon_p_values(
+    test_statistics: np.ndarray,
+    regression: str = "c",
+    number_of_series: int = 1,
+) -> np.ndarray:
+
+    """MacKinnon (1994) approximate p-values for an array of (A)DF or Engle-Granger statistics, elementwise identical to statsmodels' mackinnonp"""
+
+    test_statistics = np.asarray(test_statistics, dtype=float)
+    series_element = number_of_series - 1
+
+    small_p_coefficients = np.asarray(_tau_smallps[regression][series_element])
+    large_p_coefficients = np.asarray(_tau_largeps[regression][series_element])
+    with np.errstate(invalid="ignore", over="ignore"):
+        p_values = np.where(
+            test_statistics <= _tau_stars[regression][series_element],
+            norm.cdf(np.polyval(small_p_coefficients[::-1], test_statistics)),
+            norm.cdf(np.polyval(large_p_coefficients[::-1], test_statistics)),
+        )
+    p_values = np.where(
+        test_statistics > _tau_maxs[regression][series_element], 1.0, p_values
+    )
+    p_values = np.where(
+        test_statistics < _tau_mins[regression][series_element], 0.0, p_values
+    )
+
+    return np.where(np.isnan(test_statistics), np.nan, p_values)
+
+
+def default_adf_maxlag(
+    number_of_observations: int,
+    regression: str = "c",
+) -> int:
+
+    """The maximum lag adfuller uses when none is given (Schwert 1989), capped so the regression keeps enough observations"""
+
+    number_of_trend_terms = 0 if regression == "n" else len(regression)
+    maxlag = int(
+        np.ceil(
+            SCHWERT_MAXLAG_MULTIPLIER
+            * np.power(
+                number_of_observations / SCHWERT_MAXLAG_OBSERVATION_SCALE,
+                SCHWERT_MAXLAG_POWER,
+            )
+        )
+    )
+    maxlag = min(number_of_observations // 2 - number_of_trend_terms - 1, maxlag)
+    if maxlag < 0:
+        raise ValueError(
+            "sample size is too short to use selected regression component"
+        )
+
+    return maxlag
+
+
+def _window_sum_parts(
+    products: np.ndarray,
+    number_of_edge_rows: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """Column totals of products plus cumulative sums of their first and last number_of_edge_rows rows. The regression windows of a batch only differ by a few rows at either end, so this is all that is needed to sum products over any of them"""
+
+    number_of_edge_rows = min(number_of_edge_rows, len(products))
+    head_sums = np.zeros((number_of_edge_rows + 1, products.shape[1]))
+    tail_sums = np.zeros((number_of_edge_rows + 1, products.shape[1]))
+    np.cumsum(products[:number_of_edge_rows], axis=0, out=head_sums[1:])
+    np.cumsum(
+        products[len(products) - number_of_edge_rows :][::-1], axis=0, out=tail_sums[1:]
+    )
+
+    return products.sum(axis=0), head_sums, tail_sums
+
+
+def _window_sums(
+    window_sum_parts: tuple[np.ndarray, np.ndarray, np.ndarray],
+    first_rows: np.ndarray,
+    number_of_trailing_rows: int,
+) -> np.ndarray:
+
+    """Sum of each column of products from its first row up to, but excluding, the last number_of_trailing_rows rows. First rows below zero only occur for columns of the moment matrix a lag length never uses, they are clipped rather than wrapped"""
+
+    totals, head_sums, tail_sums = window_sum_parts
+    first_rows = np.clip(first_rows, 0, len(head_sums) - 1)
+
+    return (
+        totals
+        - head_sums[first_rows, np.arange(len(totals))]
+        - tail_sums[number_of_trailing_rows]
+    )
+
+
+def _adf_moment_matrices(
+    series_matrix: np.ndarray,
+    first_positions: np.ndarray,
+    number_of_lags: int,
+    regression: str,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """Cross products of the ADF regression of every column, without building the lagged design matrices.
+
+    Row i of the regression is diff[i] on [constant, level[i], diff[i - 1], ..., diff[i - number_of_lags]] for i from the column's first position to the end of the series, so every entry is a window sum of a product of two shifted series, and the windows only differ by at most number_of_lags rows at either end.
+    """
+
+    differences = np.diff(series_matrix, axis=0)
+    levels = series_matrix[:-1]
+    number_of_differences = len(differences)
+    number_of_edge_rows = number_of_lags + 1
+    has_constant = regression == "c"
+    level_column = int(has_constant)
+    number_of_columns = level_column + 1 + number_of_lags
+    number_of_series = series_matrix.shape[1]
+
+    moment_matrix = np.empty((number_of_series, number_of_columns, number_of_columns))
+    regressor_response_products = np.empty((number_of_series, number_of_columns))
+
+    for lag_distance in range(number_of_lags + 1):
+        window_sum_parts = _window_sum_parts(
+            differences[lag_distance:]
+            * differences[: number_of_differences - lag_distance],
+            number_of_edge_rows,
+        )
+        if lag_distance == 0:
+            response_sum_of_squares = _window_sums(window_sum_parts, first_positions, 0)
+        else:
+            regressor_response_products[:, level_column + lag_distance] = _window_sums(
+                window_sum_parts, first_positions - lag_distance, 0
+            )
+        for first_lag in range(1, number_of_lags + 1 - lag_distance):
+            second_lag = first_lag + lag_distance
+            moment_matrix[
+                :, level_column + first_lag, level_column + second_lag
+            ] = moment_matrix[
+                :, level_column + second_lag, level_column + first_lag
+            ] = _window_sums(
+                window_sum_parts,
+                first_positions - second_lag,
+                first_lag,
+            )
+
+    for lag in range(number_of_lags + 1):
+        level_lag_sums = _window_sums(
+            _window_sum_parts(
+                levels[lag:] * differences[: number_of_differences - lag],
+                number_of_edge_rows,
+            ),
+            first_positions - lag,
+            0,
+        )
+        if lag == 0:
+            regressor_response_products[:, level_column] = level_lag_sums
+        else:
+            moment_matrix[:, level_column, level_column + lag] = moment_matrix[
+                :, level_column + lag, level_column
+            ] = level_lag_sums
+    moment_matrix[:, level_column, level_column] = _window_sums(
+        _window_sum_parts(levels**2, number_of_edge_rows), first_positions, 0
+    )
+
+    if has_constant:
+        difference_sum_parts = _window_sum_parts(differences, number_of_edge_rows)
+        moment_matrix[:, 0, 0] = number_of_differences - first_positions
+        moment_matrix[:, 0, level_column] = moment_matrix[
+            :, level_column, 0
+        ] = _window_sums(
+            _window_sum_parts(levels, number_of_edge_rows), first_positions, 0
+        )
+        regressor_response_products[:, 0] = _window_sums(
+            difference_sum_parts, first_positions, 0
+        )
+        for lag in range(1, number_of_lags + 1):
+            moment_matrix[:, 0, level_column + lag] = moment_matrix[
+                :, level_column + lag, 0
+            ] = _window_sums(difference_sum_parts, first_positions - lag, lag)
+
+    return moment_matrix, regressor_response_products, response_sum_of_squares
+
+
+def _select_lags_by_aic(
+    series_matrix: np.ndarray,
+    maxlag: int,
+    regression: str,
+) -> np.ndarray:
+
+    """adfuller's autolag="aic": every lag length is fitted on the same observations (those available at maxlag) and the smallest AIC wins, ties going to the shorter lag.
+
+    The lag lengths are nested, so the residual sum of squares of every one of them comes out of a single Cholesky factorisation of the full moment matrix.
+    """
+
+    number_of_series = series_matrix.shape[1]
+    number_of_observations = len(series_matrix) - 1 - maxlag
+    number_of_trend_terms = int(regression == "c")
+
+    (
+        moment_matrix,
+        regressor_response_products,
+        response_sum_of_squares,
+    ) = _adf_moment_matrices(
+        series_matrix,
+        np.full(number_of_series, maxlag),
+        maxlag,
+        regression,
+    )
+    cholesky_factors = np.linalg.cholesky(moment_matrix)
+    explained_components = np.linalg.solve(
+        cholesky_factors, regressor_response_products[..., None]
+    )[..., 0]
+    residual_sums_of_squares = (
+        response_sum_of_squares[:, None]
+        - np.cumsum(explained_components**2, axis=1)[:, number_of_trend_terms:]
+    )
+
+    number_of_parameters = number_of_trend_terms + 1 + np.arange(maxlag + 1)
+    information_criteria = (
+        number_of_observations
+        * np.log(residual_sums_of_squares / number_of_observations)
+        + 2 * number_of_parameters
+    )
+
+    return np.argmin(information_criteria, axis=1)
+
+
+def batched_adf_statistics(
+    series_matrix: np.ndarray,
+    regression: str = "c",
+    maxlag: int | None = None,
+    autolag: str | None = "aic",
+) -> tuple[np.ndarray, np.ndarray]:
+
+    """Augmented Dickey-Fuller statistics of every column of series_matrix (equal length, no missing values), matching statsmodels' adfuller with the same regression, maxlag and autolag ("aic" or None for a fixed lag).
+
+    Returns the test statistics and the lag used for each column.
+    """
+
+    if regression not in REGRESSIONS_SUPPORTED:
+        raise ValueError(
+            f"regression must be one of {REGRESSIONS_SUPPORTED}, got {regression}"
+        )
+    if autolag not in ("aic", None):
+        raise ValueError(f"autolag must be 'aic' or None, got {autolag}")
+
+    series_matrix = np.asarray(series_matrix, dtype=float)
+    if maxlag is None:
+        maxlag = default_adf_maxlag(len(series_matrix), regression)
+
+    number_of_series = series_matrix.shape[1]
+    if autolag == "aic":
+        used_lags = _select_lags_by_aic(series_matrix, maxlag, regression)
+    else:
+        used_lags = np.full(number_of_series, maxlag)
+
+    level_column = (
+        LEVEL_COLUMN_WITH_CONSTANT
+        if regression == "c"
+        else LEVEL_COLUMN_WITHOUT_CONSTANT
+    )
+    (
+        moment_matrix,
+        regressor_response_products,
+        response_sum_of_squares,
+    ) = _adf_moment_matrices(series_matrix, used_lags, int(used_lags.max()), regression)
+
+    test_statistics = np.empty(number_of_series)
+    for used_lag in np.unique(used_lags):
+        columns = np.flatnonzero(used_lags == used_lag)
+        number_of_parameters = level_column + 1 + used_lag
+        number_of_observations = len(series_matrix) - 1 - used_lag
+
+        inverse_moment_matrix = np.linalg.inv(
+            moment_matrix[columns][:, :number_of_parameters, :number_of_parameters]
+        )
+        regressor_response = regressor_response_products[columns][
+            :, :number_of_parameters
+        ]
+        coefficients = np.einsum(
+            "pij,pj->pi", inverse_moment_matrix, regressor_response
+        )
+        residual_sum_of_squares = response_sum_of_squares[columns] - np.einsum(
+            "pi,pi->p", coefficients, regressor_response
+        )
+        residual_variance = residual_sum_of_squares / (
+            number_of_observations - number_of_parameters
+        )
+        test_statistics[columns] = coefficients[:, level_column] / np.sqrt(
+            residual_variance * inverse_moment_matrix[:, level_column, level_column]
+        )
+
+    return test_statistics, used_lags
@@ -1,4 +1,5 @@
 from itertools import combinations
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta, date
 from statsmodels.tsa.stattools import coint as coint_engle
@@ -17,10 +18,22 @@ from main.utilities.constants import (
     TRADING_DATE_MID_POINT,
     ENGLE_COINT_P_VALUE_THRESHOLD,
     CORES_TO_USE,
+    COINTEGRATION_BATCH_SIZE,
+    MIN_LENGTH_SERIES_FOR_TESTING,
 )
 
-from main.utilities.constants import (
-    MIN_LENGTH_SERIES_FOR_TESTING,
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+
+from main.utilities.stage_cache import (
+    StageCache,
+)
+
+from main.model_building.scripts.batched_adf import (
+    batched_adf_statistics,
+    mackinnon_p_values,
 )
 
 LEVEL_TO_REJECT_TEST_DUE_SERIES_ONLY_NAN = {"engle_test_training": None}
@@ -31,12 +44,15 @@ NUMBER_TICKERS_TO_COMBINE = 2
 FIRST_PRODUCT_ELEMENT = 0
 SECOND_PRODUCT_ELEMENT = 1
 FIRST_VALUE_ENGLE_DICT = 0
+NUMBER_OF_SERIES_ENGLE_GRANGER = 2
+COLLINEARITY_RSQUARED_TOLERANCE = 100 * np.sqrt(np.finfo(float).eps)
+PAIR_PREFILTER_METHODS = ("correlation", "distance")
 
 
 def _cointegration_tests(
     ticker1: str,
     ticker2: str,
-    df_prices: pd.DataFrame,
+    df_prices: pd.DataFrame | SharedPriceMatrix,
     trading_period_mid_point_date: date,
 ) -> dict | None:
 
@@ -83,7 +99,7 @@ def _cointegration_tests(
 def _calculate_relevant_trading_dates(
     ticker1: str,
     ticker2: str,
-    df_prices: pd.DataFrame,
+    df_prices: pd.DataFrame | SharedPriceMatrix,
 ) -> tuple:
 
     """
@@ -107,7 +123,7 @@ def _calculate_relevant_trading_dates(
 
 def _process_pair(
     product: tuple,
-    prices_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
     trading_period_mid_point_date: pd.Timestamp,
 ) -> pd.DataFrame | None:
 
@@ -138,26 +154,378 @@ def _process_pair(
     return df_temporary
 
 
-def perform_multiple_cointegration_tests(
+def _observed_matrix_products(
+    values: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """The values with missing entries zeroed, the observed mask, and the number of dates each pair of columns is observed together (one matrix multiply)"""
+
+    observed = (~np.isnan(values)).astype(float)
+
+    return np.nan_to_num(values), observed, observed.T @ observed
+
+
+def _return_correlation_scores(
+    training_prices: np.ndarray,
+) -> np.ndarray:
+
+    """Correlation of daily returns of every pair of tickers, each column standardised over its own observed returns so the whole matrix comes out of one product"""
+
+    returns = training_prices[1:] / training_prices[:-1] - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        standardised_returns = (returns - np.nanmean(returns, axis=0)) / np.nanstd(
+            returns, axis=0
+        )
+    standardised_returns, _, joint_observations = _observed_matrix_products(
+        standardised_returns
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (standardised_returns.T @ standardised_returns) / joint_observations
+
+
+def _normalised_price_distance_scores(
+    training_prices: np.ndarray,
+) -> np.ndarray:
+
+    """Negative mean squared distance between prices normalised to their first training value (the distance method of Gatev et al.), over the dates both tickers trade, so closer pairs score higher"""
+
+    first_valid_positions = np.argmax(~np.isnan(training_prices), axis=0)
+    normalised_prices, observed, joint_observations = _observed_matrix_products(
+        training_prices
+        / training_prices[first_valid_positions, np.arange(training_prices.shape[1])]
+    )
+    squared_prices = normalised_prices**2
+    sum_of_squared_distances = (
+        squared_prices.T @ observed
+        + observed.T @ squared_prices
+        - 2 * normalised_prices.T @ normalised_prices
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return -sum_of_squared_distances / joint_observations
+
+
+def prefilter_pairs(
     prices_df: pd.DataFrame,
+    method: str = "correlation",
+    top_k_per_ticker: int | None = None,
+    score_threshold: float | None = None,
+    ticker_sectors: dict | None = None,
     trading_period_mid_point_date: date = TRADING_DATE_MID_POINT,
 ) -> pd.DataFrame:
 
-    ticker_products = list(
-        combinations(
-            prices_df.columns,
-            NUMBER_TICKERS_TO_COMBINE,
+    """Cheap screen of every ticker pair ahead of the Engle-Granger tests, scored on the training window only (up to the mid point) so it sees nothing the tests don't.
+
+    method is "correlation" (daily return correlation) or "distance" (negative mean squared distance of normalised prices), higher is better for both. A pair is kept when its score reaches score_threshold, when it is among the top_k_per_ticker of either of its tickers, and, if ticker_sectors (ticker to sector) is given, when both tickers are in the same sector. Criteria left as None are not applied.
+
+    Returns the kept pairs as first_ticker, second_ticker, prefilter_score, in the order itertools.combinations produces them.
+    """
+
+    if method not in PAIR_PREFILTER_METHODS:
+        raise ValueError(
+            f"method must be one of {PAIR_PREFILTER_METHODS}, got {method}"
         )
+
+    tickers = prices_df.columns
+    training_prices = prices_df.loc[:trading_period_mid_point_date].to_numpy(
+        dtype=float
     )
+    if method == "correlation":
+        scores = _return_correlation_scores(training_prices)
+    else:
+        scores = _normalised_price_distance_scores(training_prices)
+    np.fill_diagonal(scores, np.nan)
+
+    kept = ~np.isnan(scores)
+    if score_threshold is not None:
+        kept &= np.nan_to_num(scores, nan=-np.inf) >= score_threshold
+    if top_k_per_ticker is not None:
+        top_k_positions = np.argsort(-np.nan_to_num(scores, nan=-np.inf), axis=1)[
+            :, :top_k_per_ticker
+        ]
+        in_top_k = np.zeros_like(kept)
+        np.put_along_axis(in_top_k, top_k_positions, True, axis=1)
+        kept &= in_top_k | in_top_k.T
+    if ticker_sectors is not None:
+        sectors = pd.Series(tickers.map(ticker_sectors), index=tickers)
+        kept &= sectors.notna().to_numpy()[:, None] & (
+            sectors.to_numpy()[:, None] == sectors.to_numpy()[None, :]
+        )
+
+    first_ticker_positions, second_ticker_positions = np.triu_indices(len(tickers), k=1)
+    pairs_kept = kept[first_ticker_positions, second_ticker_positions]
+
+    return pd.DataFrame(
+        {
+            "first_ticker": tickers[first_ticker_positions[pairs_kept]],
+            "second_ticker": tickers[second_ticker_positions[pairs_kept]],
+            "prefilter_score": scores[
+                first_ticker_positions[pairs_kept], second_ticker_positions[pairs_kept]
+            ],
+        }
+    )
+
+
+def prefilter_recall_report(
+    unfiltered_results_df: pd.DataFrame,
+    candidate_pairs_df: pd.DataFrame,
+    number_of_tickers: int,
+) -> dict:
+
+    """How much of the unfiltered run a prefilter keeps: the share of pairs passing the full Engle-Granger test that were among the candidates, against the share of all pairs that had to be tested.
+
+    The tests of a candidate are the same with or without the prefilter, so comparing the candidates with the unfiltered results is the same as comparing both runs.
+    """
+
+    def _pair_index(df: pd.DataFrame) -> pd.MultiIndex:
+        return pd.MultiIndex.from_frame(df[["first_ticker", "second_ticker"]])
+
+    cointegrated_pairs = _pair_index(unfiltered_results_df)
+    recovered_pairs = cointegrated_pairs.isin(_pair_index(candidate_pairs_df))
+    number_of_pairs = number_of_tickers * (number_of_tickers - 1) // 2
+
+    return {
+        "pairs_total": number_of_pairs,
+        "pairs_tested": len(candidate_pairs_df),
+        "fraction_pairs_tested": len(candidate_pairs_df) / number_of_pairs,
+        "cointegrated_pairs_unfiltered": len(cointegrated_pairs),
+        "cointegrated_pairs_recovered": int(recovered_pairs.sum()),
+        "recall": recovered_pairs.mean() if len(cointegrated_pairs) else np.nan,
+    }
+
+
+def _engle_granger_statistics_batched(
+    first_prices: np.ndarray,
+    second_prices: np.ndarray,
+) -> np.ndarray:
+
+    """Engle-Granger statistics of every column pair, as statsmodels' coint (constant, autolag AIC) computes them one pair at a time.
+
+    The first stage OLS of first on [second, constant] is solved in closed form for all columns at once, and the residuals go through the batched ADF without constant. Almost perfectly collinear pairs get -inf, as in coint.
+    """
+
+    first_centred = first_prices - first_prices.mean(axis=0)
+    second_centred = second_prices - second_prices.mean(axis=0)
+    hedge_ratios = (first_centred * second_centred).sum(axis=0) / (
+        second_centred**2
+    ).sum(axis=0)
+    residuals = first_centred - hedge_ratios * second_centred
+    rsquared = 1 - (residuals**2).sum(axis=0) / (first_centred**2).sum(axis=0)
+    collinear = rsquared >= 1 - COLLINEARITY_RSQUARED_TOLERANCE
+
+    test_statistics = np.full(first_prices.shape[1], -np.inf)
+    if (~collinear).any():
+        test_statistics[~collinear], _ = batched_adf_statistics(
+            residuals[:, ~collinear],
+            regression="n",
+            autolag="aic",
+        )
+
+    return test_statistics
 
-    list_of_temp_dfs = Parallel(n_jobs=CORES_TO_USE)(
-        delayed(_process_pair)(
-            product,
+
+def _engle_granger_p_values_window(
+    prices_window: np.ndarray,
+    first_ticker_positions: np.ndarray,
+    second_ticker_positions: np.ndarray,
+) -> np.ndarray:
+
+    """P values of the pairs sharing one training window. Pairs with missing or constant prices inside the window, or a batch whose moment matrices are singular, fall back to statsmodels so their results stay what coint returns"""
+
+    first_prices = prices_window[:, first_ticker_positions]
+    second_prices = prices_window[:, second_ticker_positions]
+    regular = (
+        ~np.isnan(first_prices).any(axis=0)
+        & ~np.isnan(second_prices).any(axis=0)
+        & (np.ptp(first_prices, axis=0) > 0)
+        & (np.ptp(second_prices, axis=0) > 0)
+    )
+
+    p_values = np.empty(len(first_ticker_positions))
+    try:
+        p_values[regular] = mackinnon_p_values(
+            _engle_granger_statistics_batched(
+                first_prices[:, regular], second_prices[:, regular]
+            ),
+            regression="c",
+            number_of_series=NUMBER_OF_SERIES_ENGLE_GRANGER,
+        )
+    except np.linalg.LinAlgError:
+        logging.info("singular batch in batched Engle-Granger, using statsmodels")
+        regular[:] = False
+
+    for column in np.flatnonzero(~regular):
+        p_values[column] = coint_engle(
+            first_prices[:, column], second_prices[:, column]
+        )[ELEMENT_OF_ENGLE_TEST_RETURNING_PVALUE]
+
+    return p_values
+
+
+def perform_multiple_cointegration_tests_batched(
+    prices_df: pd.DataFrame,
+    trading_period_mid_point_date: date = TRADING_DATE_MID_POINT,
+    batch_size: int = COINTEGRATION_BATCH_SIZE,
+    candidate_pairs_df: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+
+    """Same results as running _process_pair on every combination of tickers, with the Engle-Granger tests run as matrix operations.
+
+    A pair's training window runs from the later of its two first valid dates to the mid point, so pairs are grouped by that start date and each group is tested batch_size pairs at a time on one slice of the price matrix. candidate_pairs_df (first_ticker, second_ticker, as from prefilter_pairs) restricts the tests to those pairs.
+    """
+
+    tickers = prices_df.columns
+    first_valid_dates = prices_df.apply(pd.Series.first_valid_index)
+    last_valid_dates = prices_df.apply(pd.Series.last_valid_index)
+    listed_tickers = first_valid_dates.notna().to_numpy()
+    first_positions = np.where(
+        listed_tickers,
+        prices_df.index.get_indexer(first_valid_dates.fillna(prices_df.index[0])),
+        -1,
+    )
+    mid_point_position = (
+        prices_df.index.searchsorted(trading_period_mid_point_date, side="right") - 1
+    )
+
+    first_ticker_positions, second_ticker_positions = np.triu_indices(
+        len(tickers), k=1
+    )  # the same order as itertools.combinations
+    pairs_listed = (
+        listed_tickers[first_ticker_positions] & listed_tickers[second_ticker_positions]
+    )
+    if candidate_pairs_df is not None:
+        pairs_listed &= pd.MultiIndex.from_arrays(
+            [tickers[first_ticker_positions], tickers[second_ticker_positions]]
+        ).isin(
+            pd.MultiIndex.from_frame(
+                candidate_pairs_df[["first_ticker", "second_ticker"]]
+            )
+        )
+    first_ticker_positions = first_ticker_positions[pairs_listed]
+    second_ticker_positions = second_ticker_positions[pairs_listed]
+    window_start_positions = np.maximum(
+        first_positions[first_ticker_positions],
+        first_positions[second_ticker_positions],
+    )
+    long_enough = (
+        mid_point_position - window_start_positions + 1 >= MIN_LENGTH_SERIES_FOR_TESTING
+    )
+    first_ticker_positions = first_ticker_positions[long_enough]
+    second_ticker_positions = second_ticker_positions[long_enough]
+    window_start_positions = window_start_positions[long_enough]
+
+    prices_matrix = prices_df.to_numpy(dtype=float)
+    batches = []
+    for window_start_position in np.unique(window_start_positions):
+        pairs_in_window = np.flatnonzero(
+            window_start_positions == window_start_position
+        )
+        for batch_start in range(0, len(pairs_in_window), batch_size):
+            batches.append(
+                (
+                    window_start_position,
+                    pairs_in_window[batch_start : batch_start + batch_size],
+                )
+            )
+
+    p_values_list = Parallel(n_jobs=CORES_TO_USE)(
+        delayed(_engle_granger_p_values_window)(
+            prices_matrix[window_start_position : mid_point_position + 1],
+            first_ticker_positions[pairs_in_batch],
+            second_ticker_positions[pairs_in_batch],
+        )
+        for window_start_position, pairs_in_batch in batches
+    )
+
+    p_values = np.empty(len(first_ticker_positions))
+    for (_, pairs_in_batch), batch_p_values in zip(batches, p_values_list):
+        p_values[pairs_in_batch] = batch_p_values
+
+    retained = ~(p_values > ENGLE_COINT_P_VALUE_THRESHOLD)
+    first_tickers = tickers[first_ticker_positions[retained]]
+    second_tickers = tickers[second_ticker_positions[retained]]
+    pair_start_dates = np.maximum(
+        first_valid_dates[first_tickers].to_numpy(),
+        first_valid_dates[second_tickers].to_numpy(),
+    )
+    pair_finish_dates = np.minimum(
+        last_valid_dates[first_tickers].to_numpy(),
+        last_valid_dates[second_tickers].to_numpy(),
+    )
+
+    results_df = pd.DataFrame(
+        {
+            "first_ticker": first_tickers,
+            "second_ticker": second_tickers,
+            "engle_test_training": p_values[retained],
+            "pair_start_date": pair_start_dates,
+            "trading_period_mid_point_date": np.full(
+                len(first_tickers),
+                pd.Timestamp(trading_period_mid_point_date).to_datetime64(),
+                dtype="datetime64[ns]",
+            ),
+            "pair_finish_date": pair_finish_dates,
+            "length_of_trading_period_days_calendar": (
+                pd.to_datetime(pair_finish_dates) - pd.to_datetime(pair_start_dates)
+            ).days,
+        }
+    )
+
+    return results_df
+
+
+def perform_multiple_cointegration_tests(
+    prices_df: pd.DataFrame,
+    trading_period_mid_point_date: date = TRADING_DATE_MID_POINT,
+    batched: bool = True,
+    candidate_pairs_df: pd.DataFrame | None = None,
+    stage_cache: StageCache | None = None,
+) -> pd.DataFrame:
+
+    """The cointegration test results of every pair of prices_df (or of candidate_pairs_df). With a stage_cache the results of an earlier run on identical prices, candidates and mid point are loaded rather than recomputed"""
+
+    if stage_cache is not None:
+        return stage_cache.cached_stage(
+            "cointegration_testing",
+            lambda: perform_multiple_cointegration_tests(
+                prices_df,
+                trading_period_mid_point_date,
+                batched,
+                candidate_pairs_df,
+            ),
             prices_df,
             trading_period_mid_point_date,
+            candidate_pairs_df,
+            ENGLE_COINT_P_VALUE_THRESHOLD,
+        )
+
+    if batched:
+        return perform_multiple_cointegration_tests_batched(
+            prices_df,
+            trading_period_mid_point_date,
+            candidate_pairs_df=candidate_pairs_df,
+        )
+
+    if candidate_pairs_df is None:
+        ticker_products = list(
+            combinations(
+                prices_df.columns,
+                NUMBER_TICKERS_TO_COMBINE,
+            )
+        )
+    else:
+        ticker_products = list(
+            zip(candidate_pairs_df["first_ticker"], candidate_pairs_df["second_ticker"])
+        )
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        list_of_temp_dfs = Parallel(n_jobs=CORES_TO_USE)(
+            delayed(_process_pair)(
+                product,
+                shared_prices,
+                trading_period_mid_point_date,
+            )
+            for product in ticker_products
         )
-        for product in ticker_products
-    )
 
     list_of_temp_dfs = [df for df in list_of_temp_dfs if df is not None]
 
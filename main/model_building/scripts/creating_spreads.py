@@ -1,4 +1,3 @@
-import sqlite3
 import pandas as pd
 import logging
 from joblib import Parallel, delayed
@@ -19,12 +18,27 @@ from main.utilities.constants import (
     CORES_TO_USE,
 )
 
-from main.utilities.functions import (
-    custom_create_db_engine,
+from main.utilities.series_store import (
+    get_series_store,
+    HEDGE_RATIO_SERIES_TYPE,
+    SeriesRecord,
 )
 
-DATABASE_NAME_SPREAD = f"sqlite:///{PATHWAY_TO_SQL_DB_SPREADS}"
-DATABASE_NAME_SPREAD_BACKTEST = f"sqlite:///{PATHWAY_TO_SQL_DB_SPREADS_BACKTEST}"
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
+)
+
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    KALMAN_PROCESS_NOISE,
+    KALMAN_MEASUREMENT_NOISE,
+    KALMAN_INITIAL_ERROR_COV,
+)
 
 
 def _retrieve_table_from_sql_rolling_hedge_ratio_df(
@@ -34,31 +48,37 @@ def _retrieve_table_from_sql_rolling_hedge_ratio_df(
     kalman: bool = False,
 ) -> pd.Series:
 
-    hedge_ratio_rolling_table_name = f"{ticker1}_{ticker2}{'_kalman' if kalman else ''}"
-    conn = sqlite3.connect(db_pathway)
-    query = f"SELECT * FROM {hedge_ratio_rolling_table_name}"
-    hedge_ratio_rolling_series = pd.read_sql_query(
-        query,
-        conn,
-        index_col="Date",
-        parse_dates=["Date"],
+    hedge_ratio_rolling_series = get_series_store(db_pathway).read_series(
+        ticker1,
+        ticker2,
+        HEDGE_RATIO_SERIES_TYPE,
+        kalman=kalman,
     )
-    conn.close()
     return hedge_ratio_rolling_series
 
 
-def _save_spread_series_to_database(
-    table_name: str,
-    spread_series: pd.Series,
-    engine: sqlite3.Connection,
-) -> None:
-    spread_series.name = table_name
-    spread_series.to_sql(
-        table_name,
-        engine,
-        if_exists="replace",
-        index=True,
-    )
+def _spread_series_records(
+    row: pd.Series,
+    both_spreads: tuple[pd.Series, pd.Series],
+    kalman: bool = False,
+) -> list[SeriesRecord]:
+    spread_series_from_rolling, spread_series_z_standardised_from_rolling = both_spreads
+    return [
+        SeriesRecord(
+            row["first_ticker"],
+            row["second_ticker"],
+            "regular_spread",
+            spread_series_from_rolling,
+            kalman,
+        ),
+        SeriesRecord(
+            row["first_ticker"],
+            row["second_ticker"],
+            "standardised_spread",
+            spread_series_z_standardised_from_rolling,
+            kalman,
+        ),
+    ]
 
 
 def _create_both_spread_single(
@@ -66,7 +86,7 @@ def _create_both_spread_single(
     ticker2: str,
     pair_start_date: pd.Timestamp,
     pair_end_date: pd.Timestamp,
-    prices_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
     db_pathway: str,
     kalman: bool = False,
 ) -> pd.Series:
@@ -104,18 +124,16 @@ def _create_both_spread_single(
 
 def _process_row_both_spread(
     row: pd.Series,
-    prices_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
     backtest_spread: bool = False,
     kalman: bool = False,
 ) -> tuple | None:
 
     if backtest_spread:
-        engine = custom_create_db_engine(DATABASE_NAME_SPREAD_BACKTEST)
         start_date = row["trading_period_mid_point_date"]
         end_date = row["pair_finish_date"]
         db_pathway = PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST
     else:
-        engine = custom_create_db_engine(DATABASE_NAME_SPREAD)
         start_date = row["pair_start_date"]
         end_date = row["trading_period_mid_point_date"]
         db_pathway = PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS
@@ -138,20 +156,6 @@ def _process_row_both_spread(
         kalman=kalman,
     )
 
-    table_name_regular = f"{row['first_ticker']}_{row['second_ticker']}_regular_spread{'_kalman' if kalman else ''}"
-    table_name_standardised = f"{row['first_ticker']}_{row['second_ticker']}_standardised_spread{'_kalman' if kalman else ''}"
-
-    _save_spread_series_to_database(
-        table_name_regular,
-        spread_series_from_rolling,
-        engine,
-    )
-    _save_spread_series_to_database(
-        table_name_standardised,
-        spread_series_z_standardised_from_rolling,
-        engine,
-    )
-
     return spread_series_from_rolling, spread_series_z_standardised_from_rolling
 
 
@@ -160,17 +164,57 @@ def create_rolling_hedge_ratio_scaled_spread_whole_set(
     prices_df: pd.DataFrame,
     backtest_spread: bool = False,
     kalman: bool = False,
+    stage_cache: StageCache | None = None,
 ) -> None:
 
-    Parallel(n_jobs=CORES_TO_USE)(
-        delayed(_process_row_both_spread)(
-            row,
+    """Workers only compute spreads, this process is the single writer of the spread store and commits them in large batches as they arrive.
+
+    With a stage_cache only pairs whose prices or hedge ratio parameters changed since an earlier run are recomputed, the hedge ratios in the store being a function of those. Cached spreads are still written to the store.
+    """
+
+    series_store = get_series_store(
+        PATHWAY_TO_SQL_DB_SPREADS_BACKTEST
+        if backtest_spread
+        else PATHWAY_TO_SQL_DB_SPREADS
+    )
+    with shared_price_matrix(prices_df) as shared_prices:
+        both_spreads_list = cached_pair_outputs(
+            stage_cache,
+            "spreads",
+            results_df,
             prices_df,
+            lambda pairs_df: Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
+                delayed(_process_row_both_spread)(
+                    row,
+                    shared_prices,
+                    backtest_spread,
+                    kalman,
+                )
+                for _, row in pairs_df.iterrows()
+            ),
             backtest_spread,
             kalman,
+            LENGTH_OF_ROLLING_HEDGE_RATIO,
+            (
+                (
+                    KALMAN_PROCESS_NOISE,
+                    KALMAN_MEASUREMENT_NOISE,
+                    KALMAN_INITIAL_ERROR_COV,
+                )
+                if kalman
+                else None
+            ),
         )
-        for _, row in results_df.iterrows()
-    )
+
+        number_written = series_store.write_series_many(
+            series_record
+            for (_, row), both_spreads in zip(results_df.iterrows(), both_spreads_list)
+            if both_spreads is not None
+            for series_record in _spread_series_records(
+                row, both_spreads, kalman=kalman
+            )
+        )
+    logging.info(f"saved {number_written} spreads in series store")
 
 
 if __name__ == "__main__":
@@ -25,11 +25,13 @@ LOG_ARG_HL = 2
 
 def perform_half_life_ornstein_single(
     row: pd.Series,
+    spread_series_from_rolling: pd.DataFrame | None = None,
 ) -> float:
 
-    spread_series_from_rolling = retrieve_spread_table_from_sql_df(
-        row,
-    )
+    if spread_series_from_rolling is None:
+        spread_series_from_rolling = retrieve_spread_table_from_sql_df(
+            row,
+        )
 
     spread_series_from_rolling_lagged = spread_series_from_rolling.shift(1).dropna()
     delta_spread = (
@@ -44,6 +46,33 @@ def perform_half_life_ornstein_single(
     return half_life
 
 
+def batched_half_life_ornstein(
+    spread_matrix: np.ndarray,
+) -> np.ndarray:
+
+    """perform_half_life_ornstein_single for every column of a (dates x pairs) spread matrix at once. The slope of the spread change on the lagged spread (with a constant) comes from centred sums and cross products over the days where both the spread and its lag are present, so ragged columns padded with NaN need no alignment"""
+
+    spread_matrix = np.asarray(spread_matrix, dtype=float)
+    lagged_spreads = spread_matrix[:-1]
+    delta_spreads = spread_matrix[1:] - lagged_spreads
+    observed = ~np.isnan(delta_spreads)
+    number_of_observations = observed.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centred_lagged_spreads = np.where(
+            observed,
+            lagged_spreads
+            - np.where(observed, lagged_spreads, 0.0).sum(axis=0)
+            / number_of_observations,
+            0.0,
+        )
+        slopes = (centred_lagged_spreads * np.where(observed, delta_spreads, 0.0)).sum(
+            axis=0
+        ) / (centred_lagged_spreads**2).sum(axis=0)
+
+        return -np.log(LOG_ARG_HL) / slopes
+
+
 def half_life_ornstein_whole_set(
     results_df: pd.DataFrame,
 ) -> list[float]:
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
+from typing import Iterable
 from pandas.tseries.offsets import BDay
-from statsmodels.regression.rolling import RollingOLS
 from joblib import Parallel, delayed
 from datetime import timedelta
 import logging
@@ -18,19 +18,75 @@ from main.utilities.paths import (
 from main.utilities.constants import (
     CORES_TO_USE,
     LENGTH_OF_ROLLING_HEDGE_RATIO,
+    ROLLING_HEDGE_RATIO_BATCH_SIZE,
 )
 
-from main.utilities.functions import (
-    custom_create_db_engine,
+from main.utilities.series_store import (
+    get_series_store,
+    HEDGE_RATIO_SERIES_TYPE,
+    SeriesRecord,
+    SeriesStore,
 )
 
-DATABASE_NAME_ROLLING_HEDGE = f"sqlite:///{PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS}"
-DATABASE_NAME_ROLLING_HEDGE_BACKTEST = (
-    f"sqlite:///{PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST}"
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
 )
 
 ADDITIONAL_DAYS_TO_MAKE_ROLLING_WINDOW = 150
 TIME_WINDOW_TO_LOOK_BACK_TRAINING_PERIOD_MAKE_ROLLING_OLS_WORK = 1000
+MIN_OBSERVATIONS_IN_WINDOW = 1
+
+
+def _rolling_window_sums(
+    values: np.ndarray,
+    window: int,
+) -> np.ndarray:
+
+    """Sums of the last window rows at every row (along axis 0), from one cumulative sum"""
+
+    rolling_sums = np.cumsum(values, axis=0)
+    rolling_sums[window:] = rolling_sums[window:] - rolling_sums[:-window]
+
+    return rolling_sums
+
+
+def rolling_beta_without_constant(
+    endog: np.ndarray,
+    exog: np.ndarray,
+    window: int = LENGTH_OF_ROLLING_HEDGE_RATIO,
+) -> np.ndarray:
+
+    """Slope of endog on exog (no constant) over a rolling window, for one series or for every column of two (dates x pairs) arrays at once.
+
+    Follows statsmodels' RollingOLS(endog, exog, window).fit().params: each window is the last window rows, rows where either value is missing are dropped from it, and the first window - 1 rows, windows left with no observations and windows where exog is all zero are NaN. The slope is the ratio of the rolling sums of endog * exog and exog ** 2.
+    """
+
+    endog = np.asarray(endog, dtype=float)
+    exog = np.asarray(exog, dtype=float)
+    observed = ~(np.isnan(endog) | np.isnan(exog))
+
+    cross_product_sums = _rolling_window_sums(
+        np.where(observed, endog * exog, 0.0), window
+    )
+    exog_square_sums = _rolling_window_sums(np.where(observed, exog**2, 0.0), window)
+    number_of_observations = _rolling_window_sums(observed.astype(np.int64), window)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_betas = np.where(
+            (number_of_observations >= MIN_OBSERVATIONS_IN_WINDOW)
+            & (exog_square_sums > 0),
+            cross_product_sums / exog_square_sums,
+            np.nan,
+        )
+    rolling_betas[: window - 1] = np.nan
+
+    return rolling_betas
 
 
 def _calculate_single_rolling_hedge_ratio_ols(
@@ -38,7 +94,7 @@ def _calculate_single_rolling_hedge_ratio_ols(
     ticker2: str,
     start_date: pd.Timestamp,
     end_date: pd.Timestamp,
-    prices_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
 ) -> pd.Series:
 
     ticker1_series_training = pd.Series(
@@ -65,13 +121,16 @@ def _calculate_single_rolling_hedge_ratio_ols(
     ):  # This will only return None when the training period does not have enough instances to support inclusion, and by virtue of us making this decision based on the training period, no lookahead bias will be committed.
         return None
 
-    ols_model = RollingOLS(
-        ticker1_series_training,
-        ticker2_series_training,
-        window=LENGTH_OF_ROLLING_HEDGE_RATIO,
+    hedge_ratio_series = pd.DataFrame(
+        {
+            ticker2_series_training.name: rolling_beta_without_constant(
+                ticker1_series_training.to_numpy(),
+                ticker2_series_training.to_numpy(),
+                window=LENGTH_OF_ROLLING_HEDGE_RATIO,
+            )
+        },
+        index=ticker1_series_training.index,
     )
-    ols_model = ols_model.fit()
-    hedge_ratio_series = ols_model.params
     hedge_ratio_series = hedge_ratio_series.loc[start_date:]
     hedge_ratio_series.bfill(
         inplace=True
@@ -80,25 +139,51 @@ def _calculate_single_rolling_hedge_ratio_ols(
     return hedge_ratio_series
 
 
-def _save_to_database(hedge_ratio_series, table_name, engine):
+def _hedge_ratio_series_record(
+    hedge_ratio_series: pd.Series | pd.DataFrame,
+    row: pd.Series,
+    kalman: bool = False,
+) -> SeriesRecord:
+    if isinstance(hedge_ratio_series, pd.DataFrame):
+        hedge_ratio_series = hedge_ratio_series.squeeze(axis=1)
     hedge_ratio_series.index = hedge_ratio_series.index.astype("datetime64[ns]")
-    hedge_ratio_series.name = f"{table_name}"
-    hedge_ratio_series.to_sql(table_name, engine, if_exists="replace", index=True)
-    logging.info(f"saved {table_name} in sql db")
+    return SeriesRecord(
+        row["first_ticker"],
+        row["second_ticker"],
+        HEDGE_RATIO_SERIES_TYPE,
+        hedge_ratio_series,
+        kalman,
+    )
 
 
-def _process_row_rolling_hedge_ratio(
+def write_hedge_ratios_from_workers(
+    results_df: pd.DataFrame,
+    hedge_ratio_series_list: Iterable[pd.Series | pd.DataFrame | None],
+    series_store: SeriesStore,
+    kalman: bool = False,
+) -> None:
+
+    """Workers only compute hedge ratios, this process is the single writer of the store and commits them in large batches as they arrive"""
+
+    number_written = series_store.write_series_many(
+        _hedge_ratio_series_record(hedge_ratio_series, row, kalman=kalman)
+        for (_, row), hedge_ratio_series in zip(
+            results_df.iterrows(), hedge_ratio_series_list
+        )
+        if hedge_ratio_series is not None
+    )
+    logging.info(f"saved {number_written} hedge ratios in series store")
+
+
+def _rolling_hedge_ratio_dates(
     row: pd.Series,
-    prices_df: pd.DataFrame,
     backtest_spread: bool = False,
-) -> None:
+) -> tuple[pd.Timestamp, pd.Timestamp] | None:
 
     if backtest_spread:
-        engine = custom_create_db_engine(DATABASE_NAME_ROLLING_HEDGE_BACKTEST)
         start_date = row["trading_period_mid_point_date"]
         end_date = row["pair_finish_date"]
     else:
-        engine = custom_create_db_engine(DATABASE_NAME_ROLLING_HEDGE)
         start_date = row["pair_start_date"]
         end_date = row["trading_period_mid_point_date"]
 
@@ -118,6 +203,20 @@ def _process_row_rolling_hedge_ratio(
         return None
         # Trade has less than 500 days history, does not qualify. No look forward bias committed as during testing phase
 
+    return start_date, end_date
+
+
+def _process_row_rolling_hedge_ratio(
+    row: pd.Series,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    backtest_spread: bool = False,
+) -> None:
+
+    hedge_ratio_dates = _rolling_hedge_ratio_dates(row, backtest_spread)
+    if hedge_ratio_dates is None:
+        return None
+    start_date, end_date = hedge_ratio_dates
+
     hedge_ratio_series = _calculate_single_rolling_hedge_ratio_ols(
         row["first_ticker"],
         row["second_ticker"],
@@ -129,22 +228,154 @@ def _process_row_rolling_hedge_ratio(
     if hedge_ratio_series is None:
         return None
 
-    table_name = f'{row["first_ticker"]}_{row["second_ticker"]}'
-    _save_to_database(hedge_ratio_series.squeeze(), table_name, engine)
-    logging.info(f"creating table for {table_name}")
+    logging.info(
+        f'calculated hedge ratio for {row["first_ticker"]}_{row["second_ticker"]}'
+    )
     return hedge_ratio_series
 
 
+def calculate_rolling_hedge_ratios_batched(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    backtest_spread: bool = False,
+) -> list[pd.DataFrame | None]:
+
+    """The hedge ratio _process_row_rolling_hedge_ratio returns for every row of results_df (None where it returns None), with the rolling betas of all pairs computed together as columns of one array.
+
+    A pair's series starts TIME_WINDOW_TO_LOOK_BACK_TRAINING_PERIOD_MAKE_ROLLING_OLS_WORK days before its start date, and a beta is only kept once a full window fits inside the series, so betas computed over the whole date axis are the ones the per pair regression gives.
+    """
+
+    dates = prices_df.index
+    prices_matrix = prices_df.to_numpy(dtype=float)
+    hedge_ratio_series_list = [None] * len(results_df)
+
+    pair_rows = []
+    for row_number, (_, row) in enumerate(results_df.iterrows()):
+        hedge_ratio_dates = _rolling_hedge_ratio_dates(row, backtest_spread)
+        if hedge_ratio_dates is None:
+            continue
+        start_date, end_date = hedge_ratio_dates
+        series_first_position = dates.searchsorted(
+            start_date
+            - timedelta(
+                days=TIME_WINDOW_TO_LOOK_BACK_TRAINING_PERIOD_MAKE_ROLLING_OLS_WORK
+            ),
+            side="left",
+        )
+        series_last_position = dates.searchsorted(end_date, side="right") - 1
+        if (
+            series_last_position - series_first_position + 1
+            < LENGTH_OF_ROLLING_HEDGE_RATIO
+        ):
+            continue
+        pair_rows.append(
+            (
+                row_number,
+                prices_df.columns.get_loc(row["first_ticker"]),
+                prices_df.columns.get_loc(row["second_ticker"]),
+                series_first_position,
+                dates.searchsorted(start_date, side="left"),
+                series_last_position,
+            )
+        )
+
+    for batch_start in range(0, len(pair_rows), ROLLING_HEDGE_RATIO_BATCH_SIZE):
+        batch_rows = pair_rows[
+            batch_start : batch_start + ROLLING_HEDGE_RATIO_BATCH_SIZE
+        ]
+        (
+            row_numbers,
+            first_ticker_positions,
+            second_ticker_positions,
+            series_first_positions,
+            hedge_ratio_first_positions,
+            series_last_positions,
+        ) = map(np.array, zip(*batch_rows))
+        batch_first_position = series_first_positions.min()
+        batch_last_position = series_last_positions.max()
+
+        rolling_betas = rolling_beta_without_constant(
+            prices_matrix[
+                batch_first_position : batch_last_position + 1, first_ticker_positions
+            ],
+            prices_matrix[
+                batch_first_position : batch_last_position + 1, second_ticker_positions
+            ],
+            window=LENGTH_OF_ROLLING_HEDGE_RATIO,
+        )
+
+        for column, row_number in enumerate(row_numbers):
+            first_full_window_position = (
+                series_first_positions[column] + LENGTH_OF_ROLLING_HEDGE_RATIO - 1
+            )
+            hedge_ratio_first_position = hedge_ratio_first_positions[column]
+            hedge_ratios = rolling_betas[
+                hedge_ratio_first_position
+                - batch_first_position : series_last_positions[column]
+                - batch_first_position
+                + 1,
+                column,
+            ].copy()
+            hedge_ratios[
+                : max(first_full_window_position - hedge_ratio_first_position, 0)
+            ] = np.nan
+            hedge_ratio_series_list[row_number] = pd.DataFrame(
+                {prices_df.columns[second_ticker_positions[column]]: hedge_ratios},
+                index=dates[
+                    hedge_ratio_first_position : series_last_positions[column] + 1
+                ],
+            ).bfill()  # In rare instances, this will cause look ahead bias by filling in regression values based on future information
+
+    return hedge_ratio_series_list
+
+
 def calculate_rolling_hedge_ratio_whole_set(
     results_df: pd.DataFrame,
     prices_df: pd.DataFrame,
     backtest_spread: bool = False,
+    batched: bool = True,
+    stage_cache: StageCache | None = None,
 ):
 
-    Parallel(n_jobs=CORES_TO_USE)(
-        delayed(_process_row_rolling_hedge_ratio)(row, prices_df, backtest_spread)
-        for _, row in results_df.iterrows()
-    )
+    if batched:
+        write_hedge_ratios_from_workers(
+            results_df,
+            cached_pair_outputs(
+                stage_cache,
+                "rolling_hedge_ratio_ols",
+                results_df,
+                prices_df,
+                lambda pairs_df: calculate_rolling_hedge_ratios_batched(
+                    pairs_df, prices_df, backtest_spread
+                ),
+                backtest_spread,
+                LENGTH_OF_ROLLING_HEDGE_RATIO,
+            ),
+            get_series_store(
+                PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST
+                if backtest_spread
+                else PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS
+            ),
+        )
+        return
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        hedge_ratio_series_list = Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
+            delayed(_process_row_rolling_hedge_ratio)(
+                row, shared_prices, backtest_spread
+            )
+            for _, row in results_df.iterrows()
+        )
+
+        write_hedge_ratios_from_workers(
+            results_df,
+            hedge_ratio_series_list,
+            get_series_store(
+                PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST
+                if backtest_spread
+                else PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS
+            ),
+        )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 from joblib import Parallel, delayed
+import numpy as np
 import pandas as pd
 import logging
 
@@ -12,21 +13,31 @@ from main.utilities.paths import (
 
 from main.utilities.constants import (
     CORES_TO_USE,
+    ROLLING_HEDGE_RATIO_BATCH_SIZE,
 )
 
-from main.utilities.functions import (
-    custom_create_db_engine,
+from main.utilities.series_store import (
+    get_series_store,
 )
 
-from main.model_building.scripts.hedge_ratio_calculations import (
-    _save_to_database,
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
 )
 
-DATABASE_NAME_ROLLING_HEDGE_BACKTEST = (
-    f"sqlite:///{PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST}"
+from main.model_building.scripts.hedge_ratio_calculations import (
+    write_hedge_ratios_from_workers,
 )
+
 ADDITIONAL_DAYS_TO_MAKE_ROLLING_WINDOW = 35
-FIRST_ELEMENT_PRICE_SERIES = 0
+KALMAN_PROCESS_NOISE = 0.0001
+KALMAN_MEASUREMENT_NOISE = 1.99
+KALMAN_INITIAL_ERROR_COV = 1.0
 
 
 def _calculate_single_rolling_hedge_ratio_kalman(
@@ -34,19 +45,16 @@ def _calculate_single_rolling_hedge_ratio_kalman(
     ticker2: str,
     start_date: pd.Timestamp,
     end_date: pd.Timestamp,
-    prices_df: pd.DataFrame,
-    process_noise: float = 0.0001,
-    measurement_noise: float = 1.99,
-    error_cov: float = 1.0,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
+    process_noise: float = KALMAN_PROCESS_NOISE,
+    measurement_noise: float = KALMAN_MEASUREMENT_NOISE,
+    error_cov: float = KALMAN_INITIAL_ERROR_COV,
 ) -> pd.Series:
 
     ticker1_series_training = prices_df[ticker1].loc[start_date:end_date]
     ticker2_series_training = prices_df[ticker2].loc[start_date:end_date]
 
-    hedge_ratio = (
-        ticker1_series_training.iloc[FIRST_ELEMENT_PRICE_SERIES]
-        / ticker2_series_training.iloc[FIRST_ELEMENT_PRICE_SERIES]
-    )
+    hedge_ratio = np.nan
 
     rolling_hedge_ratio = []
 
@@ -54,6 +62,13 @@ def _calculate_single_rolling_hedge_ratio_kalman(
 
     for observation in observations:
 
+        # a day missing either price leaves the filter as it is, its hedge ratio is missing
+        if np.isnan(observation):
+            rolling_hedge_ratio.append(np.nan)
+            continue
+        if np.isnan(hedge_ratio):
+            hedge_ratio = observation
+
         error_cov += process_noise
         kalman_gain = error_cov / (error_cov + measurement_noise)
         hedge_ratio += kalman_gain * (observation - hedge_ratio)
@@ -68,12 +83,158 @@ def _calculate_single_rolling_hedge_ratio_kalman(
     return pd.Series(rolling_hedge_ratio, index=ticker1_series_training.index)
 
 
+def kalman_gain_sequence(
+    number_of_steps: int,
+    process_noise: float | np.ndarray = KALMAN_PROCESS_NOISE,
+    measurement_noise: float | np.ndarray = KALMAN_MEASUREMENT_NOISE,
+    error_cov: float | np.ndarray = KALMAN_INITIAL_ERROR_COV,
+) -> np.ndarray:
+
+    """The gain of the scalar filter at every step. It only depends on the noise parameters, not on the observations, so it is the same for every pair sharing them. Array noise parameters (one per pair) give one column of gains per pair"""
+
+    error_cov = np.array(error_cov, dtype=float)
+    kalman_gains = np.empty((number_of_steps,) + error_cov.shape)
+    for step in range(number_of_steps):
+        error_cov = error_cov + process_noise
+        kalman_gains[step] = error_cov / (error_cov + measurement_noise)
+        error_cov = error_cov * (1 - kalman_gains[step])
+
+    return kalman_gains
+
+
+def kalman_error_covariance(
+    number_of_steps: np.ndarray,
+    process_noise: float = KALMAN_PROCESS_NOISE,
+    measurement_noise: float = KALMAN_MEASUREMENT_NOISE,
+    error_cov: float = KALMAN_INITIAL_ERROR_COV,
+) -> np.ndarray:
+
+    """The error covariance of the scalar filter after each of number_of_steps steps, which with the last hedge ratio is all that is needed to carry a filter on from where it stopped"""
+
+    number_of_steps = np.asarray(number_of_steps, dtype=np.int64)
+    error_covs = np.empty(number_of_steps.max(initial=0) + 1)
+    error_covs[0] = error_cov
+    for step in range(1, len(error_covs)):
+        error_cov += process_noise
+        kalman_gain = error_cov / (error_cov + measurement_noise)
+        error_cov *= 1 - kalman_gain
+        error_covs[step] = error_cov
+
+    return error_covs[number_of_steps]
+
+
+def batched_kalman_hedge_ratios(
+    ticker1_prices: np.ndarray,
+    ticker2_prices: np.ndarray,
+    process_noise: float | np.ndarray = KALMAN_PROCESS_NOISE,
+    measurement_noise: float | np.ndarray = KALMAN_MEASUREMENT_NOISE,
+    error_cov: float | np.ndarray = KALMAN_INITIAL_ERROR_COV,
+) -> np.ndarray:
+
+    """_calculate_single_rolling_hedge_ratio_kalman for every column of two (steps x pairs) price arrays, each column holding one pair's prices from its own start date. The gains are computed once and each step updates all pairs' hedge ratios as one array, with the same floating point operations as the scalar loop so the results are identical.
+
+    Like the scalar loop a pair's filter only steps on the days both its prices are observed, so its n-th observed day takes the n-th gain, and its hedge ratio is missing on the other days.
+    """
+
+    observations = ticker1_prices / ticker2_prices
+    observed = ~np.isnan(observations)
+    kalman_gains = kalman_gain_sequence(
+        len(observations), process_noise, measurement_noise, error_cov
+    )
+    observed_step_gains = np.take_along_axis(
+        np.broadcast_to(
+            kalman_gains.reshape(len(observations), -1), observations.shape
+        ),
+        np.maximum(np.cumsum(observed, axis=0) - 1, 0),
+        axis=0,
+    )
+
+    hedge_ratio = observations[
+        observed.argmax(axis=0), np.arange(observations.shape[1])
+    ]  # each pair's first observed ratio
+    rolling_hedge_ratios = np.full_like(observations, np.nan)
+    for step in range(len(observations)):
+        hedge_ratio = np.where(
+            observed[step],
+            hedge_ratio
+            + observed_step_gains[step] * (observations[step] - hedge_ratio),
+            hedge_ratio,
+        )
+        rolling_hedge_ratios[step, observed[step]] = hedge_ratio[observed[step]]
+
+    return rolling_hedge_ratios
+
+
+def calculate_rolling_hedge_ratios_kalman_batched(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    process_noise: float | np.ndarray = KALMAN_PROCESS_NOISE,
+    measurement_noise: float | np.ndarray = KALMAN_MEASUREMENT_NOISE,
+    error_cov: float | np.ndarray = KALMAN_INITIAL_ERROR_COV,
+) -> list[pd.Series | None]:
+
+    """The kalman hedge ratio of every row of results_df, from its mid point to its finish date, as _process_row_rolling_hedge_ratio_kalman returns it. Noise parameters may be given per row as arrays. Rows whose period holds no prices give None"""
+
+    dates = prices_df.index
+    prices_matrix = prices_df.to_numpy(dtype=float)
+    first_positions = dates.searchsorted(
+        results_df["trading_period_mid_point_date"].to_numpy(dtype="datetime64[ns]"),
+        side="left",
+    )
+    last_positions = (
+        dates.searchsorted(
+            results_df["pair_finish_date"].to_numpy(dtype="datetime64[ns]"),
+            side="right",
+        )
+        - 1
+    )
+    first_ticker_positions = prices_df.columns.get_indexer(results_df["first_ticker"])
+    second_ticker_positions = prices_df.columns.get_indexer(results_df["second_ticker"])
+    noise_parameters = [
+        np.broadcast_to(np.asarray(noise_parameter, dtype=float), len(results_df))
+        for noise_parameter in (process_noise, measurement_noise, error_cov)
+    ]
+
+    hedge_ratio_series_list = [None] * len(results_df)
+    row_numbers = np.flatnonzero(last_positions >= first_positions)
+    for batch_start in range(0, len(row_numbers), ROLLING_HEDGE_RATIO_BATCH_SIZE):
+        batch_row_numbers = row_numbers[
+            batch_start : batch_start + ROLLING_HEDGE_RATIO_BATCH_SIZE
+        ]
+        series_lengths = (
+            last_positions[batch_row_numbers] - first_positions[batch_row_numbers] + 1
+        )
+        date_positions = np.minimum(
+            first_positions[batch_row_numbers]
+            + np.arange(series_lengths.max())[:, None],
+            len(dates) - 1,
+        )  # steps past a pair's finish date are computed on repeated prices and dropped
+
+        rolling_hedge_ratios = batched_kalman_hedge_ratios(
+            prices_matrix[date_positions, first_ticker_positions[batch_row_numbers]],
+            prices_matrix[date_positions, second_ticker_positions[batch_row_numbers]],
+            *(
+                noise_parameter[batch_row_numbers]
+                for noise_parameter in noise_parameters
+            ),
+        )
+
+        for column, row_number in enumerate(batch_row_numbers):
+            hedge_ratio_series_list[row_number] = pd.Series(
+                rolling_hedge_ratios[: series_lengths[column], column],
+                index=dates[
+                    first_positions[row_number] : last_positions[row_number] + 1
+                ],
+            )
+
+    return hedge_ratio_series_list
+
+
 def _process_row_rolling_hedge_ratio_kalman(
     row: pd.Series,
-    prices_df: pd.DataFrame,
+    prices_df: pd.DataFrame | SharedPriceMatrix,
 ) -> None:
 
-    engine = custom_create_db_engine(DATABASE_NAME_ROLLING_HEDGE_BACKTEST)
     start_date = row["trading_period_mid_point_date"]
     end_date = row["pair_finish_date"]
 
@@ -85,28 +246,54 @@ def _process_row_rolling_hedge_ratio_kalman(
         prices_df=prices_df,
     )
 
-    table_name = f'{row["first_ticker"]}_{row["second_ticker"]}_kalman'
-    _save_to_database(
-        hedge_ratio_series_kalman,
-        table_name,
-        engine,
+    logging.info(
+        f'calculated kalman hedge ratio for {row["first_ticker"]}_{row["second_ticker"]}'
     )
-    logging.info(f"creating table for {table_name}")
     return hedge_ratio_series_kalman
 
 
 def calculate_rolling_hedge_ratio_whole_set_kalman(
     results_df: pd.DataFrame,
     prices_df: pd.DataFrame,
+    batched: bool = True,
+    stage_cache: StageCache | None = None,
 ):
 
-    Parallel(n_jobs=CORES_TO_USE)(
-        delayed(_process_row_rolling_hedge_ratio_kalman)(
-            row,
-            prices_df,
+    if batched:
+        write_hedge_ratios_from_workers(
+            results_df,
+            cached_pair_outputs(
+                stage_cache,
+                "rolling_hedge_ratio_kalman",
+                results_df,
+                prices_df,
+                lambda pairs_df: calculate_rolling_hedge_ratios_kalman_batched(
+                    pairs_df, prices_df
+                ),
+                KALMAN_PROCESS_NOISE,
+                KALMAN_MEASUREMENT_NOISE,
+                KALMAN_INITIAL_ERROR_COV,
+            ),
+            get_series_store(PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST),
+            kalman=True,
+        )
+        return
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        hedge_ratio_series_list = Parallel(n_jobs=CORES_TO_USE, return_as="generator")(
+            delayed(_process_row_rolling_hedge_ratio_kalman)(
+                row,
+                shared_prices,
+            )
+            for _, row in results_df.iterrows()
+        )
+
+        write_hedge_ratios_from_workers(
+            results_df,
+            hedge_ratio_series_list,
+            get_series_store(PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST),
+            kalman=True,
         )
-        for _, row in results_df.iterrows()
-    )
 
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ from main.utilities.constants import (
 
 from main.utilities.functions import (
     retrieve_spread_table_from_sql_df,
+    left_align_spread_columns,
 )
 
 MAX_LAGS_FOR_HURST_EXPONENT = 120
@@ -25,11 +26,13 @@ SECOND_LAG_HE_RANGE = 2
 def perform_hurst_exponent_single(
     row: pd.Series,
     max_lag: int = MAX_LAGS_FOR_HURST_EXPONENT,
+    spread_series_from_rolling: pd.DataFrame | None = None,
 ) -> float:
 
-    spread_series_from_rolling = retrieve_spread_table_from_sql_df(
-        row,
-    )
+    if spread_series_from_rolling is None:
+        spread_series_from_rolling = retrieve_spread_table_from_sql_df(
+            row,
+        )
 
     lags = range(SECOND_LAG_HE_RANGE, max_lag)
     tau = [
@@ -46,6 +49,66 @@ def perform_hurst_exponent_single(
     return hurst
 
 
+def batched_hurst_exponents(
+    spread_matrix: np.ndarray,
+    max_lag: int = MAX_LAGS_FOR_HURST_EXPONENT,
+) -> np.ndarray:
+
+    """perform_hurst_exponent_single for every column of a (dates x pairs) spread matrix, each column running from its first to its last value (columns with gaps inside that span give NaN).
+
+    The standard deviation of the lagged differences at every lag comes from prefix sums of the spreads and their squares plus one lagged cross product per lag, all columns at once, and the log-log slope is solved in closed form.
+    """
+
+    aligned_spreads, series_lengths, has_gaps = left_align_spread_columns(
+        np.asarray(spread_matrix, dtype=float)
+    )
+    inside_series = np.arange(len(aligned_spreads))[:, None] < series_lengths
+    with np.errstate(invalid="ignore", divide="ignore"):
+        aligned_spreads = np.where(
+            inside_series,
+            aligned_spreads - aligned_spreads.sum(axis=0) / series_lengths,
+            0.0,
+        )  # centring does not change the differences, it keeps the sums of squares small
+
+    zero_row = np.zeros((1, aligned_spreads.shape[1]))
+    prefix_sums = np.concatenate([zero_row, np.cumsum(aligned_spreads, axis=0)])
+    prefix_square_sums = np.concatenate(
+        [zero_row, np.cumsum(aligned_spreads**2, axis=0)]
+    )
+    columns = np.arange(aligned_spreads.shape[1])
+    total_sums = prefix_sums[series_lengths, columns]
+    total_square_sums = prefix_square_sums[series_lengths, columns]
+
+    lags = np.arange(SECOND_LAG_HE_RANGE, max_lag)
+    log_tau = np.full((len(lags), aligned_spreads.shape[1]), np.nan)
+    for lag_number, lag in enumerate(lags):
+        number_of_differences = series_lengths - lag
+        head_positions = np.clip(number_of_differences, 0, None)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_difference = (
+                total_sums - prefix_sums[lag] - prefix_sums[head_positions, columns]
+            ) / number_of_differences
+            mean_square_difference = (
+                total_square_sums
+                - prefix_square_sums[lag]
+                + prefix_square_sums[head_positions, columns]
+                - 2 * (aligned_spreads[lag:] * aligned_spreads[:-lag]).sum(axis=0)
+            ) / number_of_differences
+            log_tau[lag_number] = np.where(
+                number_of_differences > 0,
+                0.5
+                * np.log(
+                    np.maximum(mean_square_difference - mean_difference**2, 0.0)
+                ),
+                np.nan,
+            )
+
+    centred_log_lags = np.log(lags) - np.log(lags).mean()
+    hurst_exponents = (centred_log_lags @ log_tau) / (centred_log_lags**2).sum()
+
+    return np.where(has_gaps | (series_lengths <= 0), np.nan, hurst_exponents)
+
+
 def hurst_exponent_whole_set(
     results_df: pd.DataFrame,
 ) -> None:
@@ -0,0 +1,631 @@
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+from main.utilities.paths import (
+    PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
+    PATHWAY_TO_INCREMENTAL_STATE_DF,
+    PATHWAY_TO_PRICE_DF,
+    PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST,
+    PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+)
+
+from main.utilities.constants import (
+    BACKTEST_BATCH_SIZE,
+    BACKTEST_PARAMETER_COLUMNS,
+    LENGTH_OF_ROLLING_HEDGE_RATIO,
+)
+
+from main.utilities.functions import (
+    retrieve_spread_tables_from_sql_df,
+)
+from main.utilities.series_store import (
+    get_series_store,
+    split_series_suffix,
+    SeriesRecord,
+)
+
+from main.model_building.scripts.hedge_ratio_calculations import (
+    MIN_OBSERVATIONS_IN_WINDOW,
+)
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    KALMAN_MEASUREMENT_NOISE,
+    KALMAN_PROCESS_NOISE,
+    kalman_error_covariance,
+)
+
+from main.model_building.backtesting.backtest_batch import (
+    backtest_pairs_batch,
+)
+from main.model_building.backtesting.backtest_execution import (
+    backtest_series_records,
+)
+from main.model_building.backtesting.backtest_vectorised import (
+    build_trade_history_frame,
+    build_valuation_ledger_frame,
+    run_vectorised_backtest,
+    select_column_trades,
+)
+from main.model_building.backtesting.database_utils import (
+    TradeHistorySaver,
+    RegularSpreadSaver,
+)
+
+BACKTEST_STATE_PREFIX = "backtest_"
+SPREAD_SUFFIXES = ["", "_kalman"]
+HEDGE_RATIO_SERIES_KEYS = ["hedge_ratio", "hedge_ratio_kalman"]
+SPREAD_SERIES_KEYS = [
+    "regular_spread",
+    "standardised_spread",
+    "regular_spread_kalman",
+    "standardised_spread_kalman",
+]
+
+
+def append_new_prices(
+    new_prices_df: pd.DataFrame,
+    pathway: str = PATHWAY_TO_PRICE_DF,
+) -> tuple[pd.DataFrame, int]:
+
+    """Adds the rows of new_prices_df dated after the last stored date to the price parquet, keeping its tickers. Returns the extended prices and the position of the first new row"""
+
+    prices_df = pd.read_parquet(pathway)
+    new_prices_df = new_prices_df.loc[new_prices_df.index > prices_df.index[-1]]
+    first_new_position = len(prices_df)
+    if new_prices_df.empty:
+        return prices_df, first_new_position
+
+    prices_df = pd.concat([prices_df, new_prices_df.reindex(columns=prices_df.columns)])
+    prices_df.to_parquet(pathway)
+    logging.info(f"appended {len(new_prices_df)} new price rows")
+
+    return prices_df, first_new_position
+
+
+def _spread_moments(
+    spread_values: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """Count, mean and sum of squared deviations of every column's non missing values, the starting point of the running standardisation"""
+
+    observed = ~np.isnan(spread_values)
+    count = observed.sum(axis=0)
+    mean = np.nansum(spread_values, axis=0) / count
+    squared_deviations_sum = np.nansum((spread_values - mean) ** 2, axis=0)
+
+    return count, mean, squared_deviations_sum
+
+
+def _update_spread_moments(
+    count: np.ndarray,
+    mean: np.ndarray,
+    squared_deviations_sum: np.ndarray,
+    spread: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+
+    """Welford's update with one new value per column (missing values leave a column unchanged), returning the new moments and the value standardised by them"""
+
+    observed = ~np.isnan(spread)
+    count = count + observed
+    delta = np.where(observed, spread - mean, 0.0)
+    mean = mean + delta / np.maximum(count, 1)
+    squared_deviations_sum = squared_deviations_sum + delta * np.where(
+        observed, spread - mean, 0.0
+    )
+    standardised_spread = (spread - mean) / np.sqrt(
+        squared_deviations_sum / (count - 1)
+    )
+
+    return count, mean, squared_deviations_sum, standardised_spread
+
+
+def _ols_window_sums(
+    ticker1_prices: np.ndarray,
+    ticker2_prices: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """The sums rolling_beta_without_constant keeps over a window of (dates x pairs) prices"""
+
+    observed = ~(np.isnan(ticker1_prices) | np.isnan(ticker2_prices))
+
+    return (
+        np.where(observed, ticker1_prices * ticker2_prices, 0.0).sum(axis=0),
+        np.where(observed, ticker2_prices**2, 0.0).sum(axis=0),
+        observed.sum(axis=0),
+    )
+
+
+def build_incremental_state(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    standardised_spread_df: pd.DataFrame,
+    regular_spread_df: pd.DataFrame,
+    kalman_regular_spread_df: pd.DataFrame,
+    kalman_hedge_ratio_df: pd.DataFrame,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+) -> tuple[pd.DataFrame, dict]:
+
+    """One row per pair still trading on the last date of prices_df, holding everything a daily update needs to carry its series on: the rolling OLS window sums, the kalman hedge ratio and error covariance, the running moments of both regular spreads and the backtest state.
+
+    The pairs are backtested again without the delisting exit BackTest makes on a series' last date, the results are returned with the state so the stored backtest outputs can be rewritten to match.
+    """
+
+    last_date = prices_df.index[-1]
+    pairs = [
+        (first_ticker, second_ticker)
+        for first_ticker, second_ticker, pair_finish_date in zip(
+            results_df["first_ticker"],
+            results_df["second_ticker"],
+            results_df["pair_finish_date"],
+        )
+        if pair_finish_date == last_date
+        and all(
+            f"{first_ticker}_{second_ticker}" in series_df.columns
+            for series_df in (
+                standardised_spread_df,
+                regular_spread_df,
+                kalman_regular_spread_df,
+                kalman_hedge_ratio_df,
+            )
+        )
+    ]
+    if not pairs:
+        return pd.DataFrame(), {}
+    column_names = [
+        f"{first_ticker}_{second_ticker}" for first_ticker, second_ticker in pairs
+    ]
+
+    backtest_results = backtest_pairs_batch(
+        prices_df=prices_df,
+        standardised_spread_df=standardised_spread_df,
+        pairs=pairs,
+        spread_to_trigger_trade_entry=spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit=spread_to_trigger_trade_exit,
+        spread_to_abandon_trade=spread_to_abandon_trade,
+        live_pairs=np.ones(len(pairs), dtype=bool),
+    )
+    backtest_state = dict(backtest_results["state"])
+    backtest_state["trade_opening_position"] = prices_df.index.get_indexer(
+        backtest_results["dates"]
+    )[backtest_state["trade_opening_position"]]
+
+    window_prices_df = prices_df.iloc[-LENGTH_OF_ROLLING_HEDGE_RATIO:]
+    ols_sums = _ols_window_sums(
+        window_prices_df[[pair[0] for pair in pairs]].to_numpy(dtype=float),
+        window_prices_df[[pair[1] for pair in pairs]].to_numpy(dtype=float),
+    )
+
+    # the filter skips days missing a price, so it carries on from its last hedge ratio with the covariance of its number of observed days
+    kalman_hedge_ratio_df = kalman_hedge_ratio_df[column_names]
+    state_df = pd.DataFrame(
+        {
+            "first_ticker": [pair[0] for pair in pairs],
+            "second_ticker": [pair[1] for pair in pairs],
+            "ols_cross_product_sum": ols_sums[0],
+            "ols_exog_square_sum": ols_sums[1],
+            "ols_number_of_observations": ols_sums[2],
+            "kalman_hedge_ratio": kalman_hedge_ratio_df.ffill()
+            .iloc[-1]
+            .to_numpy(dtype=float),
+            "kalman_error_cov": kalman_error_covariance(
+                kalman_hedge_ratio_df.notna().sum().to_numpy()
+            ),
+        }
+    )
+    for suffix, spread_df in zip(
+        SPREAD_SUFFIXES, (regular_spread_df, kalman_regular_spread_df)
+    ):
+        (
+            state_df[f"spread_count{suffix}"],
+            state_df[f"spread_mean{suffix}"],
+            state_df[f"spread_squared_deviations_sum{suffix}"],
+        ) = _spread_moments(spread_df[column_names].to_numpy(dtype=float))
+    for state_name, state_values in backtest_state.items():
+        state_df[f"{BACKTEST_STATE_PREFIX}{state_name}"] = state_values
+    state_df[BACKTEST_PARAMETER_COLUMNS] = [
+        spread_to_trigger_trade_entry,
+        spread_to_trigger_trade_exit,
+        spread_to_abandon_trade,
+    ]
+    state_df["last_update_date"] = last_date
+
+    return state_df, backtest_results
+
+
+def advance_incremental_state(
+    state_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    first_new_position: int,
+) -> tuple[pd.DataFrame, dict[str, pd.DataFrame], dict]:
+
+    """Carries every pair in state_df through the rows of prices_df from first_new_position on, touching only those rows and the ones leaving the OLS window, so a day costs O(pairs).
+
+    Each day the OLS window sums slide one row, the kalman filter takes one step, both spreads are standardised by their running moments and the backtest resumes from the saved state. Returns the new state, the new rows of every hedge ratio and spread series (as one wide frame per series, keyed like the store's series types) and the backtest results of the new rows, whose trade positions index prices_df.
+    """
+
+    assert (
+        state_df["last_update_date"] == prices_df.index[first_new_position - 1]
+    ).all(), "the incremental state is not at the last date before the new rows"
+
+    state_df = state_df.copy()
+    new_dates = prices_df.index[first_new_position:]
+    column_names = (state_df["first_ticker"] + "_" + state_df["second_ticker"]).tolist()
+    # only the rows leaving the OLS window and the new rows are converted, rows count from window_start
+    window_start = max(first_new_position - LENGTH_OF_ROLLING_HEDGE_RATIO, 0)
+    first_new_row = first_new_position - window_start
+    prices_matrix = prices_df.iloc[window_start:].to_numpy(dtype=float)
+    first_ticker_positions = prices_df.columns.get_indexer(state_df["first_ticker"])
+    second_ticker_positions = prices_df.columns.get_indexer(state_df["second_ticker"])
+
+    cross_product_sum = state_df["ols_cross_product_sum"].to_numpy(dtype=float)
+    exog_square_sum = state_df["ols_exog_square_sum"].to_numpy(dtype=float)
+    number_of_observations = state_df["ols_number_of_observations"].to_numpy()
+    hedge_ratio_kalman = state_df["kalman_hedge_ratio"].to_numpy(dtype=float)
+    error_cov = state_df["kalman_error_cov"].to_numpy(dtype=float)
+    spread_moments = {
+        suffix: tuple(
+            state_df[f"{moment}{suffix}"].to_numpy()
+            for moment in (
+                "spread_count",
+                "spread_mean",
+                "spread_squared_deviations_sum",
+            )
+        )
+        for suffix in SPREAD_SUFFIXES
+    }
+    new_values = {
+        series_key: np.full((len(new_dates), len(state_df)), np.nan)
+        for series_key in HEDGE_RATIO_SERIES_KEYS + SPREAD_SERIES_KEYS
+    }
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for row, position in enumerate(range(first_new_row, len(prices_matrix))):
+            ticker1_price = prices_matrix[position, first_ticker_positions]
+            ticker2_price = prices_matrix[position, second_ticker_positions]
+            observed = ~(np.isnan(ticker1_price) | np.isnan(ticker2_price))
+
+            leaving_position = position - LENGTH_OF_ROLLING_HEDGE_RATIO
+            if leaving_position >= 0:
+                leaving_sums = _ols_window_sums(
+                    prices_matrix[leaving_position, first_ticker_positions][None],
+                    prices_matrix[leaving_position, second_ticker_positions][None],
+                )
+                cross_product_sum = cross_product_sum - leaving_sums[0]
+                exog_square_sum = exog_square_sum - leaving_sums[1]
+                number_of_observations = number_of_observations - leaving_sums[2]
+            cross_product_sum = cross_product_sum + np.where(
+                observed, ticker1_price * ticker2_price, 0.0
+            )
+            exog_square_sum = exog_square_sum + np.where(
+                observed, ticker2_price**2, 0.0
+            )
+            number_of_observations = number_of_observations + observed
+            hedge_ratio = np.where(
+                (number_of_observations >= MIN_OBSERVATIONS_IN_WINDOW)
+                & (exog_square_sum > 0),
+                cross_product_sum / exog_square_sum,
+                np.nan,
+            )
+
+            # the same operations as the kalman loop, only stepped on observed days
+            hedge_ratio_kalman = np.where(
+                observed & np.isnan(hedge_ratio_kalman),
+                ticker1_price / ticker2_price,
+                hedge_ratio_kalman,
+            )
+            error_cov = np.where(observed, error_cov + KALMAN_PROCESS_NOISE, error_cov)
+            kalman_gain = error_cov / (error_cov + KALMAN_MEASUREMENT_NOISE)
+            hedge_ratio_kalman = np.where(
+                observed,
+                hedge_ratio_kalman
+                + kalman_gain * (ticker1_price / ticker2_price - hedge_ratio_kalman),
+                hedge_ratio_kalman,
+            )
+            error_cov = np.where(observed, error_cov * (1 - kalman_gain), error_cov)
+
+            new_values["hedge_ratio"][row] = hedge_ratio
+            new_values["hedge_ratio_kalman"][row] = np.where(
+                observed, hedge_ratio_kalman, np.nan
+            )
+            for suffix, spread in zip(
+                SPREAD_SUFFIXES,
+                (
+                    ticker1_price - ticker2_price * hedge_ratio,
+                    ticker1_price - ticker2_price * hedge_ratio_kalman,
+                ),
+            ):
+                *moments, standardised_spread = _update_spread_moments(
+                    *spread_moments[suffix], spread
+                )
+                spread_moments[suffix] = tuple(moments)
+                new_values[f"regular_spread{suffix}"][row] = spread
+                new_values[f"standardised_spread{suffix}"][row] = standardised_spread
+
+    backtest_state = {
+        state_column[len(BACKTEST_STATE_PREFIX) :]: state_df[state_column].to_numpy(
+            copy=True
+        )
+        for state_column in state_df.columns
+        if state_column.startswith(BACKTEST_STATE_PREFIX)
+    }
+    backtest_state["trade_opening_position"] -= first_new_position
+    backtest_results = run_vectorised_backtest(
+        standardised_spread=new_values["standardised_spread"],
+        ticker1_prices=prices_matrix[first_new_row:, first_ticker_positions],
+        ticker2_prices=prices_matrix[first_new_row:, second_ticker_positions],
+        dates=new_dates.to_numpy(dtype="datetime64[ns]"),
+        spread_to_trigger_trade_entry=state_df[BACKTEST_PARAMETER_COLUMNS[0]],
+        spread_to_trigger_trade_exit=state_df[BACKTEST_PARAMETER_COLUMNS[1]],
+        spread_to_abandon_trade=state_df[BACKTEST_PARAMETER_COLUMNS[2]],
+        last_positions=np.full(len(state_df), len(new_dates)),
+        state=backtest_state,
+    )  # last positions past the new rows, pairs still trading are not exited as delisted
+    backtest_results["state"]["trade_opening_position"] += first_new_position
+    for position_field in ("opening_position", "closing_position"):
+        backtest_results["trades"][position_field] = (
+            backtest_results["trades"][position_field] + first_new_position
+        )
+    backtest_results.update(
+        {
+            "pairs": list(zip(state_df["first_ticker"], state_df["second_ticker"])),
+            "column_names": column_names,
+            "dates": new_dates,
+        }
+    )
+
+    state_df["ols_cross_product_sum"] = cross_product_sum
+    state_df["ols_exog_square_sum"] = exog_square_sum
+    state_df["ols_number_of_observations"] = number_of_observations
+    state_df["kalman_hedge_ratio"] = hedge_ratio_kalman
+    state_df["kalman_error_cov"] = error_cov
+    for suffix in SPREAD_SUFFIXES:
+        (
+            state_df[f"spread_count{suffix}"],
+            state_df[f"spread_mean{suffix}"],
+            state_df[f"spread_squared_deviations_sum{suffix}"],
+        ) = spread_moments[suffix]
+    for state_name, state_values in backtest_results["state"].items():
+        state_df[f"{BACKTEST_STATE_PREFIX}{state_name}"] = state_values
+    state_df["last_update_date"] = new_dates[-1]
+
+    new_series = {
+        series_key: pd.DataFrame(values, index=new_dates, columns=column_names)
+        for series_key, values in new_values.items()
+    }
+
+    return state_df, new_series, backtest_results
+
+
+def _new_series_records(
+    state_df: pd.DataFrame,
+    new_series: dict[str, pd.DataFrame],
+    series_keys: list[str],
+) -> list[SeriesRecord]:
+    return [
+        SeriesRecord(
+            first_ticker,
+            second_ticker,
+            series_type,
+            new_series[series_key][f"{first_ticker}_{second_ticker}"].dropna(),
+            kalman,
+        )
+        for series_key in series_keys
+        for series_type, kalman in [split_series_suffix(series_key)]
+        for first_ticker, second_ticker in zip(
+            state_df["first_ticker"], state_df["second_ticker"]
+        )
+    ]
+
+
+def write_incremental_series(
+    state_df: pd.DataFrame,
+    new_series: dict[str, pd.DataFrame],
+    backtest_results: dict,
+    prices_df: pd.DataFrame,
+) -> None:
+
+    """Appends the new rows of the hedge ratios, spreads and valuation ledgers, and the trades closed on them, to the stores the full pipeline writes (both kalman flags of the backtest outputs, which share the standardised OLS spread)"""
+
+    hedge_ratio_store = get_series_store(
+        PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST
+    )
+    hedge_ratio_store.append_series_many(
+        _new_series_records(state_df, new_series, HEDGE_RATIO_SERIES_KEYS)
+    )
+
+    spread_records = _new_series_records(state_df, new_series, SPREAD_SERIES_KEYS)
+    trade_history_records = []
+    for column, (first_ticker, second_ticker, *backtest_thresholds) in enumerate(
+        zip(
+            state_df["first_ticker"],
+            state_df["second_ticker"],
+            *(state_df[column_name] for column_name in BACKTEST_PARAMETER_COLUMNS),
+        )
+    ):  # zipped columns keep integer thresholds (part of the stored series type) as ints
+        pair_name = f"{first_ticker}_{second_ticker}"
+        valuation_ledger = build_valuation_ledger_frame(
+            backtest_results, column, backtest_results["dates"]
+        )
+        trades = select_column_trades(backtest_results["trades"], column)
+        for suffix, kalman_spread in zip(SPREAD_SUFFIXES, (False, True)):
+            spread_records.append(
+                RegularSpreadSaver(
+                    first_ticker,
+                    second_ticker,
+                    *backtest_thresholds,
+                    kalman_spread,
+                    new_series[f"regular_spread{suffix}"][[pair_name]]
+                    .set_axis([f"{pair_name}_regular_spread{suffix}"], axis=1)
+                    .join(valuation_ledger),
+                ).regular_spread_series_record()
+            )
+            if len(trades["column"]):
+                trade_history_records.append(
+                    TradeHistorySaver(
+                        first_ticker,
+                        second_ticker,
+                        *backtest_thresholds,
+                        kalman_spread,
+                        build_trade_history_frame(
+                            trades,
+                            prices_df.index,
+                            first_ticker,
+                            second_ticker,
+                        ),
+                    ).trade_history_series_record()
+                )
+
+    get_series_store(PATHWAY_TO_SQL_DB_SPREADS_BACKTEST).append_series_many(
+        spread_records
+    )
+    get_series_store(
+        TradeHistorySaver.PATHWAY_TO_BACKTEST_TRADEFRAMES
+    ).append_series_many(trade_history_records)
+    logging.info(f"appended new rows for {len(state_df)} pairs")
+
+
+def initialise_incremental_state_whole_set(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+    batch_size: int = BACKTEST_BATCH_SIZE,
+) -> pd.DataFrame:
+
+    """Builds the incremental state from the stores of a full pipeline run, once. The backtest outputs of the pairs still trading are rewritten without the delisting exit on their last date, as the daily updates carry their open trades on"""
+
+    state_df_list = []
+    for batch_start in range(0, len(results_df), batch_size):
+        batch_results_df = results_df.iloc[batch_start : batch_start + batch_size]
+        batch_results_df = batch_results_df[
+            batch_results_df["pair_finish_date"] == prices_df.index[-1]
+        ]
+        if batch_results_df.empty:
+            continue
+
+        regular_spread_dfs = {
+            suffix: retrieve_spread_tables_from_sql_df(
+                batch_results_df,
+                pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+                spread_type=f"_regular_spread{suffix}",
+            )
+            for suffix in SPREAD_SUFFIXES
+        }
+        state_df, backtest_results = build_incremental_state(
+            batch_results_df,
+            prices_df,
+            retrieve_spread_tables_from_sql_df(
+                batch_results_df,
+                pathway=PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
+                spread_type="_standardised_spread",
+            ),
+            regular_spread_dfs[""],
+            regular_spread_dfs["_kalman"],
+            retrieve_spread_tables_from_sql_df(
+                batch_results_df,
+                pathway=PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST,
+                spread_type="_kalman",
+            ),
+            spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit,
+            spread_to_abandon_trade,
+        )
+        if state_df.empty:
+            continue
+
+        for suffix, kalman_spread in zip(SPREAD_SUFFIXES, (False, True)):
+            trade_history_records, regular_spread_records = backtest_series_records(
+                backtest_results,
+                regular_spread_dfs[suffix],
+                spread_to_trigger_trade_entry,
+                spread_to_trigger_trade_exit,
+                spread_to_abandon_trade,
+                kalman_spread,
+            )
+            get_series_store(
+                TradeHistorySaver.PATHWAY_TO_BACKTEST_TRADEFRAMES
+            ).write_series_many(trade_history_records)
+            get_series_store(
+                RegularSpreadSaver.PATHWAY_TO_SPREAD_BACKTEST
+            ).write_series_many(regular_spread_records)
+        state_df_list.append(state_df)
+
+    if not state_df_list:
+        return pd.DataFrame()
+
+    state_df = pd.concat(state_df_list, ignore_index=True)
+    logging.info(f"initialised incremental state for {len(state_df)} pairs")
+
+    return state_df
+
+
+def run_incremental_daily_update(
+    new_prices_df: pd.DataFrame,
+    results_df: pd.DataFrame,
+    state_df: pd.DataFrame,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    """Appends the new prices, carries every live pair's series and backtest on over them and saves the new state. The pair finish dates of results_df move to each pair's last new spread value"""
+
+    prices_df, first_new_position = append_new_prices(new_prices_df)
+    if first_new_position == len(prices_df):
+        logging.info("no new price rows, incremental state unchanged")
+        return results_df, state_df
+
+    state_df, new_series, backtest_results = advance_incremental_state(
+        state_df, prices_df, first_new_position
+    )
+    write_incremental_series(state_df, new_series, backtest_results, prices_df)
+
+    last_spread_dates = new_series["regular_spread"].apply(pd.Series.last_valid_index)
+    results_df = results_df.copy()
+    results_df["pair_finish_date"] = (
+        (results_df["first_ticker"] + "_" + results_df["second_ticker"])
+        .map(last_spread_dates)
+        .fillna(results_df["pair_finish_date"])
+    )
+    state_df.to_parquet(PATHWAY_TO_INCREMENTAL_STATE_DF)
+
+    return results_df, state_df
+
+
+if __name__ == "__main__":
+
+    from main.data_collection.scripts.yfinance_data_pull import (
+        retrieve_new_price_rows,
+    )
+
+    results_df = pd.read_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
+
+    # NOTE TO USER: these 3 numeric configs must match the full backtest's ones
+    spread_to_trigger_trade_entry = 2
+    spread_to_trigger_trade_exit = 0.5
+    spread_to_abandon_trade = 6
+
+    if not os.path.exists(PATHWAY_TO_INCREMENTAL_STATE_DF):
+        initialise_incremental_state_whole_set(
+            results_df,
+            pd.read_parquet(PATHWAY_TO_PRICE_DF),
+            spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit,
+            spread_to_abandon_trade,
+        ).to_parquet(PATHWAY_TO_INCREMENTAL_STATE_DF)
+
+    state_df = pd.read_parquet(PATHWAY_TO_INCREMENTAL_STATE_DF)
+    results_df, state_df = run_incremental_daily_update(
+        retrieve_new_price_rows(
+            ticker_list=pd.read_parquet(PATHWAY_TO_PRICE_DF).columns,
+            start_date=state_df["last_update_date"].max() + pd.Timedelta(days=1),
+        ),
+        results_df,
+        state_df,
+    )
+    results_df.to_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
+
+    logging.info("Incremental daily update complete")
@@ -24,11 +24,17 @@ def concatenate_sectors_in_column(
     return results_df
 
 
+def ticker_sector_map(
+    sector_df: pd.DataFrame,
+) -> dict:
+    return dict(zip(sector_df["Instrument"], sector_df["sector"]))
+
+
 def sector_mapper(
     sector_df: pd.DataFrame,
     results_df: pd.DataFrame,
 ) -> pd.DataFrame:
-    sector_map = dict(zip(sector_df["Instrument"], sector_df["sector"]))
+    sector_map = ticker_sector_map(sector_df)
 
     results_df["first_ticker_sector"] = results_df["first_ticker"].map(sector_map)
     results_df["second_ticker_sector"] = results_df["second_ticker"].map(sector_map)
@@ -0,0 +1,253 @@
+from typing import Callable
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+from main.utilities.paths import (
+    PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
+)
+from main.utilities.constants import (
+    CORES_TO_USE,
+    ENGLE_COINT_P_VALUE_THRESHOLD,
+    LENGTH_OF_ROLLING_HEDGE_RATIO,
+    SPREAD_DIAGNOSTICS_BATCH_SIZE,
+)
+
+from main.utilities.functions import (
+    retrieve_spread_table_from_sql_df,
+    retrieve_spread_tables_from_sql_df,
+)
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
+)
+
+from main.model_building.scripts.adf_testing import (
+    perform_adf_single,
+    batched_adf_p_values,
+)
+from main.model_building.scripts.hurst_exponent import (
+    perform_hurst_exponent_single,
+    batched_hurst_exponents,
+)
+from main.model_building.scripts.half_life import (
+    perform_half_life_ornstein_single,
+    batched_half_life_ornstein,
+)
+
+SpreadDiagnostic = Callable[..., float]
+BatchedSpreadDiagnostic = Callable[[np.ndarray, pd.DataFrame], np.ndarray]
+
+SPREAD_DIAGNOSTICS: dict[str, SpreadDiagnostic] = {
+    "adf_result": perform_adf_single,
+    "hurst_exponent_results": perform_hurst_exponent_single,
+    "half_life_results": perform_half_life_ornstein_single,
+}  # results_df column: diagnostic, each called as diagnostic(row, spread_series_from_rolling=spread)
+
+
+def _adf_batched(
+    spread_matrix: np.ndarray,
+    results_df: pd.DataFrame,
+) -> np.ndarray:
+
+    """Like perform_adf_single, pairs that failed the Engle-Granger test are not tested and get NaN"""
+
+    cointegrated = (
+        results_df["engle_test_training"] < ENGLE_COINT_P_VALUE_THRESHOLD
+    ).to_numpy()
+    adf_results = np.full(len(results_df), np.nan)
+    if cointegrated.any():
+        adf_results[cointegrated] = batched_adf_p_values(spread_matrix[:, cointegrated])
+
+    return adf_results
+
+
+def _hurst_exponents_batched(
+    spread_matrix: np.ndarray,
+    results_df: pd.DataFrame,
+) -> np.ndarray:
+    return batched_hurst_exponents(spread_matrix)
+
+
+def _half_life_ornstein_batched(
+    spread_matrix: np.ndarray,
+    results_df: pd.DataFrame,
+) -> np.ndarray:
+    return batched_half_life_ornstein(spread_matrix)
+
+
+BATCHED_SPREAD_DIAGNOSTICS: dict[str, BatchedSpreadDiagnostic] = {
+    "adf_result": _adf_batched,
+    "hurst_exponent_results": _hurst_exponents_batched,
+    "half_life_results": _half_life_ornstein_batched,
+}  # results_df column: diagnostic(spread_matrix, results_df) over a (dates x pairs) matrix, one value per pair, used in place of the per row diagnostic when batched
+
+
+def register_spread_diagnostic(
+    column_name: str,
+    diagnostic: SpreadDiagnostic,
+    batched_diagnostic: BatchedSpreadDiagnostic | None = None,
+) -> SpreadDiagnostic:
+
+    """Adds a statistic to the spread diagnostics stage, computed into column_name. The diagnostic must be a module level function (the workers import it) taking the results_df row and the already loaded spread as spread_series_from_rolling. An optional batched_diagnostic computing the same statistic for a whole matrix of spreads is used in batched mode"""
+
+    SPREAD_DIAGNOSTICS[column_name] = diagnostic
+    if batched_diagnostic is not None:
+        BATCHED_SPREAD_DIAGNOSTICS[column_name] = batched_diagnostic
+    else:
+        BATCHED_SPREAD_DIAGNOSTICS.pop(column_name, None)
+
+    return diagnostic
+
+
+def _diagnose_spread_single(
+    row: pd.Series,
+    diagnostics: dict[str, SpreadDiagnostic],
+) -> dict[str, float]:
+
+    spread_series_from_rolling = retrieve_spread_table_from_sql_df(row)
+
+    return {
+        column_name: diagnostic(
+            row, spread_series_from_rolling=spread_series_from_rolling
+        )
+        for column_name, diagnostic in diagnostics.items()
+    }
+
+
+def _diagnose_spread_batch(
+    results_df: pd.DataFrame,
+    diagnostics: dict[str, SpreadDiagnostic],
+    batched_diagnostics: dict[str, BatchedSpreadDiagnostic],
+) -> pd.DataFrame:
+
+    """Reads the spreads of a batch of pairs in one pass, runs the batched diagnostics on the (dates x pairs) matrix and the rest row by row on each spread from its first to its last value. Pairs without a spread get NaN"""
+
+    diagnostics_df = pd.DataFrame(
+        np.nan, index=results_df.index, columns=list(diagnostics)
+    )
+    spread_df = retrieve_spread_tables_from_sql_df(results_df)
+    pair_names = results_df["first_ticker"] + "_" + results_df["second_ticker"]
+    has_spread = pair_names.isin(spread_df.columns).to_numpy()
+    if not has_spread.any():
+        return diagnostics_df
+
+    results_df_with_spreads = results_df[has_spread]
+    spread_df = spread_df[pair_names[has_spread].tolist()]
+    spread_matrix = spread_df.to_numpy(dtype=float)
+
+    for column_name, diagnostic in diagnostics.items():
+        if column_name in batched_diagnostics:
+            diagnostics_df.loc[has_spread, column_name] = batched_diagnostics[
+                column_name
+            ](spread_matrix, results_df_with_spreads)
+            continue
+        diagnostics_df.loc[has_spread, column_name] = [
+            diagnostic(
+                row,
+                spread_series_from_rolling=spread_df[[pair_name]].loc[
+                    spread_df[pair_name]
+                    .first_valid_index() : spread_df[pair_name]
+                    .last_valid_index()
+                ],
+            )
+            for (_, row), pair_name in zip(
+                results_df_with_spreads.iterrows(), pair_names[has_spread]
+            )
+        ]
+
+    return diagnostics_df
+
+
+def spread_diagnostics_whole_set(
+    results_df: pd.DataFrame,
+    column_names: list[str] | None = None,
+    batched: bool = True,
+    stage_cache: StageCache | None = None,
+    prices_df: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+
+    """Every registered diagnostic (or those in column_names) for every pair, each spread read from the store once. Returns one column per diagnostic, indexed like results_df.
+
+    With batched the spreads are read and diagnosed SPREAD_DIAGNOSTICS_BATCH_SIZE pairs at a time, diagnostics with a batched version running over the whole matrix at once, otherwise each pair is read and diagnosed on its own.
+
+    With a stage_cache, which keys each pair by its prices and so needs prices_df, only pairs whose spread inputs changed since an earlier run are diagnosed.
+    """
+
+    if stage_cache is not None:
+        assert prices_df is not None, "the stage cache keys pairs by prices_df"
+        diagnostics_list = list(
+            cached_pair_outputs(
+                stage_cache,
+                "spread_diagnostics",
+                results_df,
+                prices_df,
+                lambda pairs_df: spread_diagnostics_whole_set(
+                    pairs_df, column_names, batched
+                ).to_dict(orient="records"),
+                column_names,
+                ENGLE_COINT_P_VALUE_THRESHOLD,
+                LENGTH_OF_ROLLING_HEDGE_RATIO,
+                key_columns=["engle_test_training"],
+            )
+        )
+        return pd.DataFrame(
+            diagnostics_list,
+            index=results_df.index,
+            columns=list(column_names or SPREAD_DIAGNOSTICS),
+            dtype=float,
+        )
+
+    diagnostics = {
+        column_name: SPREAD_DIAGNOSTICS[column_name]
+        for column_name in (column_names or SPREAD_DIAGNOSTICS)
+    }
+
+    if batched:
+        batched_diagnostics = {
+            column_name: BATCHED_SPREAD_DIAGNOSTICS[column_name]
+            for column_name in diagnostics
+            if column_name in BATCHED_SPREAD_DIAGNOSTICS
+        }
+        diagnostics_df_list = Parallel(n_jobs=CORES_TO_USE)(
+            delayed(_diagnose_spread_batch)(
+                results_df.iloc[
+                    batch_start : batch_start + SPREAD_DIAGNOSTICS_BATCH_SIZE
+                ],
+                diagnostics,
+                batched_diagnostics,
+            )
+            for batch_start in range(0, len(results_df), SPREAD_DIAGNOSTICS_BATCH_SIZE)
+        )
+        if not diagnostics_df_list:
+            return pd.DataFrame(
+                index=results_df.index, columns=list(diagnostics), dtype=float
+            )
+
+        diagnostics_df = pd.concat(diagnostics_df_list)
+        assert len(diagnostics_df) == len(results_df)
+        logging.info("batched spread diagnostics complete and same length")
+        return diagnostics_df
+
+    diagnostics_list = Parallel(n_jobs=CORES_TO_USE)(
+        delayed(_diagnose_spread_single)(row, diagnostics)
+        for _, row in results_df.iterrows()
+    )
+
+    assert len(diagnostics_list) == len(results_df)
+    logging.info("spread diagnostics complete and same length")
+    return pd.DataFrame(
+        diagnostics_list, index=results_df.index, columns=list(diagnostics)
+    )
+
+
+if __name__ == "__main__":
+
+    results_df = pd.read_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
+    diagnostics_df = spread_diagnostics_whole_set(results_df)
+    results_df[diagnostics_df.columns] = diagnostics_df
+    results_df.to_parquet(PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF)
+    logging.info("spread diagnostics complete for whole set")
@@ -7,13 +7,42 @@ ANNUAL_RISK_FREE_RATE = 0.02
 LENGTH_OF_ROLLING_HEDGE_RATIO = 500
 TRADING_DATE_MID_POINT = pd.Timestamp(year=2013, month=6, day=1)
 MIN_LENGTH_SERIES_FOR_TESTING = 500
-FIRST_BACKTEST_PARAMETERS = "_2_05_6"  # These parameters are in order: entry, exit, abandon (thresholds). Decimals are removed so preceding zeros (eg 05) indicate it was previously a 0.5. This must be imported into the config file, and manually updated in the back-test execution file
+FIRST_BACKTEST_PARAMETERS = (
+    2,
+    0.5,
+    6,
+)  # These parameters are in order: entry, exit, abandon (thresholds), the values of BACKTEST_PARAMETER_COLUMNS. This must be imported into the config file, and manually updated in the back-test execution file
+BACKTEST_PARAMETER_COLUMNS = [
+    "spread_to_trigger_trade_entry",
+    "spread_to_trigger_trade_exit",
+    "spread_to_abandon_trade",
+]
 STRATEGY_START_DATE = "2003-06-01"
 STRATEGY_END_DATE = "2023-06-01"
 NUMBER_DAYS_TRADING_YEAR = 252
 NEVER_TRADED_STRING = "never_traded"
 QUALIFYING_TRADE_COL_NAME = "qualifying_trade"
 TRADE_STARTED_ABANDONED_STRING = "trade_opened_abandoned"
+LAST_LISTING_STRING = "last_listing"
+BACKTEST_BATCH_SIZE = (
+    1_000  # number of pairs laid out as columns in a single vectorised backtest sweep
+)
+COINTEGRATION_BATCH_SIZE = (
+    2_000  # pairs tested together in one batched Engle-Granger computation
+)
+ROLLING_HEDGE_RATIO_BATCH_SIZE = 1_000  # pairs whose rolling OLS or kalman hedge ratios are computed together as columns of one array
+SPREAD_DIAGNOSTICS_BATCH_SIZE = (
+    1_000  # spreads read from the store and diagnosed together as columns of one matrix
+)
+SERIES_STORE_WRITE_BATCH_SIZE = (
+    500  # series committed per transaction by the single writer of a store
+)
+SERIES_STORE_BACKEND = "parquet"  # "parquet" for the partitioned columnar store, "sqlite" for the original one table per pair databases
+STAGE_CACHE_MAX_BYTES = (
+    20 * 1024**3
+)  # size the on disk stage output cache is trimmed back to, least recently used entries first
+RESULTS_SINK_ROW_GROUP_SIZE = 10_000  # per pair result rows buffered before they are flushed to the results sink as one row group
+EQUITY_CURVE_BATCH_SIZE = 500  # pairs whose filled valuations a worker sums before its total is added to the equity curve
 
 # This is the list of constituents of the sp500 at June 1 2013, with expired tickers
 SP_500_CONSTITUENTS_2013_WEXP = [
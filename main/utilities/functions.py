@@ -8,6 +8,14 @@ from main.utilities.constants import (
     FIRST_BACKTEST_PARAMETERS,
 )
 
+from main.utilities.series_store import (
+    backtest_parameters_series_type,
+    get_series_store,
+    split_series_suffix,
+    PAIR_COLUMN,
+    SINGLE_VALUE_COLUMN,
+)
+
 import pandas as pd
 import sqlite3
 import numpy as np
@@ -25,37 +33,101 @@ def retrieve_spread_table_from_sql_df(
     spread_type: str = "_regular_spread",
 ) -> pd.DataFrame:
 
-    table_name = f"{row['first_ticker']}_{row['second_ticker']}{spread_type}"
-    conn = sqlite3.connect(pathway)
-    query = f"SELECT * FROM {table_name}"
-    spread_series = pd.read_sql_query(
-        query, conn, index_col="Date", parse_dates=["Date"]
+    series_type, kalman = split_series_suffix(spread_type)
+    spread_series = get_series_store(pathway).read_series(
+        row["first_ticker"],
+        row["second_ticker"],
+        series_type,
+        kalman=kalman,
     )
-    conn.close()
 
     return spread_series
 
 
+def retrieve_spread_tables_from_sql_df(
+    results_df: pd.DataFrame,
+    pathway: str = PATHWAY_TO_SQL_DB_SPREADS,
+    spread_type: str = "_regular_spread",
+) -> pd.DataFrame:
+
+    """Reads the spread of every pair in results_df in one pass over the store. Pairs are returned as columns named first_ticker_second_ticker on the union of their dates, pairs without a spread are skipped"""
+
+    series_type, kalman = split_series_suffix(spread_type)
+    pairs = list(zip(results_df["first_ticker"], results_df["second_ticker"]))
+    spread_series_long = get_series_store(pathway).read_series_many(
+        pairs,
+        series_type,
+        kalman=kalman,
+    )
+
+    if spread_series_long.empty:
+        return pd.DataFrame()
+
+    spread_series_wide = spread_series_long.pivot(
+        columns=PAIR_COLUMN,
+        values=SINGLE_VALUE_COLUMN,
+    )
+    spread_series_wide.columns.name = None
+
+    return spread_series_wide[
+        [
+            f"{first_ticker}_{second_ticker}"
+            for first_ticker, second_ticker in pairs
+            if f"{first_ticker}_{second_ticker}" in spread_series_wide.columns
+        ]
+    ].sort_index()
+
+
+def left_align_spread_columns(
+    spread_matrix: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """Moves each column of a (dates x pairs) spread matrix up so it starts at row 0, padding with zeros after its last value, which lets sums over every column's own span run over whole columns.
+
+    Returns the aligned matrix, each column's length (first to last non missing value) and whether a column has missing values inside that span.
+    """
+
+    observed = ~np.isnan(spread_matrix)
+    has_values = observed.any(axis=0)
+    first_positions = np.where(has_values, observed.argmax(axis=0), 0)
+    last_positions = np.where(
+        has_values, len(spread_matrix) - 1 - observed[::-1].argmax(axis=0), -1
+    )
+    series_lengths = last_positions - first_positions + 1
+
+    row_positions = np.arange(max(series_lengths.max(initial=0), 1))[:, None]
+    inside_series = row_positions < series_lengths
+    aligned_spreads = np.where(
+        inside_series,
+        spread_matrix[
+            np.minimum(first_positions + row_positions, len(spread_matrix) - 1),
+            np.arange(spread_matrix.shape[1]),
+        ],
+        0.0,
+    )
+    has_gaps = (np.isnan(aligned_spreads) & inside_series).any(axis=0)
+
+    return np.nan_to_num(aligned_spreads), series_lengths, has_gaps
+
+
 def retrieve_backtest_equity_curve_spread_table_from_sql_df(
     row: pd.Series,
     pathway: str = PATHWAY_TO_SQL_DB_SPREADS_BACKTEST,
-    backtest_params: str = FIRST_BACKTEST_PARAMETERS,
+    backtest_parameters: tuple[float, float, float] = FIRST_BACKTEST_PARAMETERS,
     kalman: bool = False,
 ) -> pd.Series:
 
-    table_name = f"{row['first_ticker']}_{row['second_ticker']}{backtest_params}{'_kalman' if kalman else ''}"
-    conn = sqlite3.connect(pathway)
-    query = f"SELECT * FROM {table_name}"
+    """The valuation column of a pair's backtest ledger as float64, read on its own from the columnar store"""
 
-    spread_series = pd.read_sql_query(
-        query,
-        conn,
-        index_col="Date",
-        parse_dates=["Date"],
+    spread_series = get_series_store(pathway).read_series(
+        row["first_ticker"],
+        row["second_ticker"],
+        backtest_parameters_series_type(*backtest_parameters),
+        kalman=kalman,
+        columns=["valuation"],
     )
-    conn.close()
 
-    return spread_series["valuation"]
+    return spread_series["valuation"].astype(np.float64)
 
 
 def custom_create_db_engine(
@@ -188,12 +260,16 @@ def get_db_number_tables_and_some_dimensions(
 def get_table_from_backtest_results_dfs(
     table_name: str,
     db_path: str = PATHWAY_TO_SQL_DB_OF_BACKTEST_RESULT_DFS,
-    backtest_params: str | None = "_2_05_6",
+    backtest_parameters: tuple[float, float, float] = FIRST_BACKTEST_PARAMETERS,
     kalman: bool = False,
 ) -> pd.DataFrame:
-    with sqlite3.connect(db_path) as conn:
-        backtest_results_df = pd.read_sql(
-            f"SELECT * FROM {table_name}{backtest_params}{'_kalman' if kalman else ''}",
-            conn,
-        )
-    return backtest_results_df
+
+    first_ticker, second_ticker = table_name.split("_", 1)
+    backtest_results_df = get_series_store(db_path).read_series(
+        first_ticker,
+        second_ticker,
+        backtest_parameters_series_type(*backtest_parameters),
+        kalman=kalman,
+    )
+
+    return backtest_results_df.reset_index()
@@ -35,3 +35,16 @@ PATHWAY_TO_SECTORS_SUBSECTORS_DF = os.path.join(
 PATHWAY_TO_SQL_DB_OF_ROLLING_HEDGE_RATIOS_BACKTEST_KALMAN = os.path.join(
     ROOT_DIR, "main/databases/rolling_hedge_ratio_database_backtest_kalman.db"
 )
+PATHWAY_TO_BACKTEST_PARAMETER_SWEEP_DF = os.path.join(
+    ROOT_DIR, "main/data_collection/data/processed/backtest_parameter_sweep_df.parquet"
+)
+PATHWAY_TO_INCREMENTAL_STATE_DF = os.path.join(
+    ROOT_DIR, "main/data_collection/data/processed/incremental_state_df.parquet"
+)
+PATHWAY_TO_STAGE_CACHE = os.path.join(ROOT_DIR, "main/databases/stage_cache")
+PATHWAY_TO_RESULTS_SINK = os.path.join(
+    ROOT_DIR, "main/data_collection/data/processed/results_sink"
+)
+PATHWAY_TO_GROUPED_EQUITY_CURVES = os.path.join(
+    ROOT_DIR, "main/data_collection/data/processed/grouped_equity_curves.parquet"
+)
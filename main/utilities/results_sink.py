@@ -0,0 +1,168 @@
+from __future__ import annotations
+import os
+import shutil
+import uuid
+from typing import Iterable
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+from main.utilities.constants import (
+    RESULTS_SINK_ROW_GROUP_SIZE,
+)
+
+PARQUET_FILE_EXTENSION = ".parquet"
+PART_FILE_PREFIX = "part-"
+COMPACTED_FILE_NAME = f"compacted{PARQUET_FILE_EXTENSION}"
+PAIR_KEY_COLUMNS = ["first_ticker", "second_ticker"]
+
+
+class ResultsSink:
+
+    """Per pair results appended to a Parquet dataset partitioned as root/<name>=<value>/..., while a run progresses rather than once it ends.
+
+    Rows are buffered and flushed as a new part file of one row group every row_group_size rows, each written through a temporary file and an atomic rename, so a crash loses at most the unflushed rows. With resume the parts of an earlier run are kept and written_keys tells the caller which pairs to skip, otherwise the partition starts empty. compact rewrites the parts as a single file.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        partition: dict[str, object] | None = None,
+        resume: bool = False,
+        key_columns: list[str] = PAIR_KEY_COLUMNS,
+        row_group_size: int = RESULTS_SINK_ROW_GROUP_SIZE,
+    ) -> None:
+
+        self.directory = os.path.join(
+            root,
+            *(
+                f"{partition_name}={partition_value}"
+                for partition_name, partition_value in (partition or {}).items()
+            ),
+        )
+        self.key_columns = key_columns
+        self.row_group_size = row_group_size
+        self._buffered_rows = []
+
+        if not resume:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __enter__(
+        self,
+    ) -> ResultsSink:
+        return self
+
+    def __exit__(
+        self,
+        *exc_info,
+    ) -> None:
+        self.flush()
+
+    def _file_pathways(
+        self,
+    ) -> list[str]:
+        return sorted(
+            os.path.join(self.directory, file_name)
+            for file_name in os.listdir(self.directory)
+            if file_name.endswith(PARQUET_FILE_EXTENSION)
+            and not file_name.startswith(".")
+        )
+
+    def _write_table(
+        self,
+        table: pa.Table,
+        file_name: str,
+    ) -> None:
+
+        """pyarrow skips files starting with a dot, so a partial write is never read"""
+
+        temporary_pathway = os.path.join(
+            self.directory, f".{file_name}.{uuid.uuid4().hex}"
+        )
+        pq.write_table(table, temporary_pathway, row_group_size=self.row_group_size)
+        os.replace(temporary_pathway, os.path.join(self.directory, file_name))
+
+    def append(
+        self,
+        rows: Iterable[dict],
+    ) -> None:
+
+        """Buffers rows, flushing once row_group_size rows are buffered. The rows of one call always land in the same part, so a call holding all of a key's rows is never half written"""
+
+        self._buffered_rows.extend(rows)
+        if len(self._buffered_rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(
+        self,
+    ) -> None:
+
+        if not self._buffered_rows:
+            return
+
+        self._write_table(
+            pa.Table.from_pandas(
+                pd.DataFrame(self._buffered_rows), preserve_index=False
+            ),
+            f"{PART_FILE_PREFIX}{uuid.uuid4().hex}{PARQUET_FILE_EXTENSION}",
+        )
+        logging.info(f"flushed {len(self._buffered_rows)} rows to {self.directory}")
+        self._buffered_rows = []
+
+    def written_keys(
+        self,
+    ) -> set[tuple]:
+
+        """The key of every row already flushed, read from the key columns only"""
+
+        written_keys = set()
+        for file_pathway in self._file_pathways():
+            key_frame = pq.read_table(
+                file_pathway, columns=self.key_columns
+            ).to_pandas()
+            written_keys.update(key_frame.itertuples(index=False, name=None))
+
+        return written_keys
+
+    def read(
+        self,
+    ) -> pd.DataFrame:
+
+        """Every flushed row. A row written again on a resumed run, or both before and after an interrupted compaction, is kept once"""
+
+        file_pathways = self._file_pathways()
+        if not file_pathways:
+            return pd.DataFrame(columns=self.key_columns)
+
+        return (
+            pd.concat(
+                [pd.read_parquet(file_pathway) for file_pathway in file_pathways],
+                ignore_index=True,
+            )
+            .drop_duplicates(subset=self.key_columns, keep="last")
+            .reset_index(drop=True)
+        )
+
+    def compact(
+        self,
+    ) -> None:
+
+        """Rewrites every part as one file of row_group_size row groups, replacing the old parts once it is in place"""
+
+        self.flush()
+        file_pathways = self._file_pathways()
+        if len(file_pathways) <= 1:
+            return
+
+        self._write_table(
+            pa.Table.from_pandas(self.read(), preserve_index=False),
+            COMPACTED_FILE_NAME,
+        )
+        for file_pathway in file_pathways:
+            if os.path.basename(file_pathway) != COMPACTED_FILE_NAME:
+                os.remove(file_pathway)
+        logging.info(f"compacted {len(file_pathways)} files in {self.directory}")
@@ -0,0 +1,507 @@
+import os
+import uuid
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from itertools import islice
+from typing import Iterable, NamedTuple
+import pandas as pd
+from sqlalchemy import create_engine, event
+
+from main.utilities.constants import (
+    SERIES_STORE_BACKEND,
+    SERIES_STORE_WRITE_BATCH_SIZE,
+)
+
+HEDGE_RATIO_SERIES_TYPE = "hedge_ratio"
+KALMAN_SUFFIX = "_kalman"
+PAIR_COLUMN = "pair"
+SINGLE_VALUE_COLUMN = "value"
+DATE_INDEX_NAME = "Date"
+PARQUET_FILE_EXTENSION = ".parquet"
+NUMBER_OF_TICKERS_IN_TABLE_NAME = 2
+
+
+class SeriesNotFoundError(LookupError):
+
+    """Raised when a store holds no series for the requested pair, series type and kalman flag"""
+
+
+def split_series_suffix(
+    series_suffix: str,
+) -> tuple[str, bool]:
+
+    """Translates the table name suffixes used throughout the repo (eg "_regular_spread_kalman", "_2_0p5_6", "_kalman" or "") into a series type and kalman flag. An empty suffix is the hedge ratio"""
+
+    kalman = series_suffix.endswith(KALMAN_SUFFIX)
+    if kalman:
+        series_suffix = series_suffix[: -len(KALMAN_SUFFIX)]
+    series_type = series_suffix.lstrip("_") or HEDGE_RATIO_SERIES_TYPE
+
+    return series_type, kalman
+
+
+def backtest_parameters_series_type(
+    spread_to_trigger_trade_entry: int | float,
+    spread_to_trigger_trade_exit: int | float,
+    spread_to_abandon_trade: int | float,
+) -> str:
+
+    """Backtest outputs are stored under their thresholds written the same way whether given as ints or floats, with the decimal point as p, eg 2_0p5_6 for (2, 0.5, 6)"""
+
+    return "_".join(
+        f"{float(threshold):g}".replace(".", "p")
+        for threshold in (
+            spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit,
+            spread_to_abandon_trade,
+        )
+    )
+
+
+def series_table_name(
+    first_ticker: str,
+    second_ticker: str,
+    series_type: str,
+    kalman: bool = False,
+) -> str:
+
+    """The name the series had as a table in the SQLite databases, which is also the name single value series are returned under"""
+
+    series_suffix = "" if series_type == HEDGE_RATIO_SERIES_TYPE else f"_{series_type}"
+
+    return f"{first_ticker}_{second_ticker}{series_suffix}{KALMAN_SUFFIX if kalman else ''}"
+
+
+class SeriesRecord(NamedTuple):
+
+    """One series returned by a worker for the writer to store"""
+
+    first_ticker: str
+    second_ticker: str
+    series_type: str
+    pandas_object: pd.Series | pd.DataFrame
+    kalman: bool = False
+
+
+class SeriesStore(ABC):
+
+    """Storage for the per pair series of the pipeline (hedge ratios, spreads, backtest ledgers and trade histories), keyed by pair, series type and kalman flag.
+
+    Single column series are returned as a one column frame named after their former SQLite table, frames with several columns are returned as written.
+    """
+
+    @abstractmethod
+    def write_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        pandas_object: pd.Series | pd.DataFrame,
+        kalman: bool = False,
+    ) -> None:
+        pass
+
+    def write_series_many(
+        self,
+        series_records: Iterable[SeriesRecord],
+        batch_size: int = SERIES_STORE_WRITE_BATCH_SIZE,
+    ) -> int:
+
+        """Writes series as they arrive from workers (eg a joblib generator), from the single process that owns the store. Returns the number of series written"""
+
+        number_written = 0
+        for series_record in series_records:
+            self.write_series(*series_record)
+            number_written += 1
+
+        return number_written
+
+    def append_series_many(
+        self,
+        series_records: Iterable[SeriesRecord],
+        batch_size: int = SERIES_STORE_WRITE_BATCH_SIZE,
+    ) -> int:
+
+        """Extends stored series with new rows (eg the observations of a new day), dropping rows not after a series' last stored row. Series not in the store yet are written as they are. Returns the number of series written"""
+
+        return self.write_series_many(
+            (
+                series_record._replace(
+                    pandas_object=self._extended_series(*series_record)
+                )
+                for series_record in series_records
+            ),
+            batch_size=batch_size,
+        )
+
+    def _extended_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        pandas_object: pd.Series | pd.DataFrame,
+        kalman: bool = False,
+    ) -> pd.Series | pd.DataFrame:
+
+        try:
+            stored_series = self.read_series(
+                first_ticker, second_ticker, series_type, kalman
+            )
+        except SeriesNotFoundError:
+            return pandas_object
+
+        if isinstance(pandas_object, pd.Series):
+            pandas_object = pandas_object.to_frame()
+        if len(pandas_object.columns) == 1 and len(stored_series.columns) == 1:
+            pandas_object = pandas_object.set_axis(stored_series.columns, axis=1)
+        if len(stored_series):
+            pandas_object = pandas_object[
+                pandas_object.index > stored_series.index.max()
+            ]
+
+        return pd.concat([stored_series, pandas_object])
+
+    @abstractmethod
+    def read_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        kalman: bool = False,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+
+        """The stored frame of one series, only its columns (eg ["valuation"] of a backtest ledger) if given"""
+
+    def read_series_many(
+        self,
+        pairs: list[tuple[str, str]],
+        series_type: str,
+        kalman: bool = False,
+    ) -> pd.DataFrame:
+
+        """Long format frame of a single value series type for every pair that has one, with columns pair and value on a Date index"""
+
+        series_frames = []
+        for first_ticker, second_ticker in pairs:
+            try:
+                series_frame = self.read_series(
+                    first_ticker, second_ticker, series_type, kalman
+                )
+            except SeriesNotFoundError:
+                logging.info(
+                    f"no {series_table_name(first_ticker, second_ticker, series_type, kalman)} in store, skipping"
+                )
+                continue
+            series_frames.append(
+                pd.DataFrame(
+                    {
+                        PAIR_COLUMN: f"{first_ticker}_{second_ticker}",
+                        SINGLE_VALUE_COLUMN: series_frame.squeeze(axis=1),
+                    },
+                    index=series_frame.index,
+                )
+            )
+
+        if not series_frames:
+            return pd.DataFrame(columns=[PAIR_COLUMN, SINGLE_VALUE_COLUMN])
+
+        return pd.concat(series_frames)
+
+
+class SQLiteSeriesStore(SeriesStore):
+
+    """One table per series inside a single SQLite database, the original layout of the pipeline"""
+
+    def __init__(
+        self,
+        pathway: str,
+    ) -> None:
+        self.pathway = pathway
+
+    def write_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        pandas_object: pd.Series | pd.DataFrame,
+        kalman: bool = False,
+    ) -> None:
+        self.write_series_many(
+            [
+                SeriesRecord(
+                    first_ticker, second_ticker, series_type, pandas_object, kalman
+                )
+            ]
+        )
+
+    def write_series_many(
+        self,
+        series_records: Iterable[SeriesRecord],
+        batch_size: int = SERIES_STORE_WRITE_BATCH_SIZE,
+    ) -> int:
+
+        """Writes series over one connection in WAL mode, committing every batch_size series in a single transaction rather than one per table"""
+
+        engine = _create_write_ahead_log_engine(self.pathway)
+        series_records = iter(series_records)
+        number_written = 0
+        while series_record_batch := list(islice(series_records, batch_size)):
+            with engine.begin() as connection:
+                for series_record in series_record_batch:
+                    table_name = series_table_name(
+                        series_record.first_ticker,
+                        series_record.second_ticker,
+                        series_record.series_type,
+                        series_record.kalman,
+                    )
+                    pandas_object = series_record.pandas_object
+                    if isinstance(pandas_object, pd.Series):
+                        pandas_object = pandas_object.rename(table_name)
+                    pandas_object.to_sql(
+                        table_name,
+                        connection,
+                        if_exists="replace",
+                        index=True,
+                    )
+            number_written += len(series_record_batch)
+            logging.info(f"committed {number_written} series to {self.pathway}")
+        engine.dispose()
+
+        return number_written
+
+    def read_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        kalman: bool = False,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+
+        table_name = series_table_name(first_ticker, second_ticker, series_type, kalman)
+        conn = sqlite3.connect(self.pathway)
+        try:
+            series_frame = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
+        except pd.errors.DatabaseError as error:
+            raise SeriesNotFoundError(table_name) from error
+        finally:
+            conn.close()
+
+        series_frame = series_frame.set_index(series_frame.columns[0])
+        if series_frame.index.name == DATE_INDEX_NAME:
+            series_frame.index = pd.to_datetime(series_frame.index)
+        if columns is not None:
+            series_frame = series_frame[columns]
+
+        return series_frame
+
+
+def _create_write_ahead_log_engine(
+    pathway: str,
+):
+
+    """Engine whose connections use WAL journaling, so readers are not blocked while the writer commits"""
+
+    engine = create_engine(f"sqlite:///{pathway}")
+
+    @event.listens_for(engine, "connect")
+    def _set_write_ahead_log_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    return engine
+
+
+class ParquetSeriesStore(SeriesStore):
+
+    """Long format Parquet partitioned as root/series_type=<type>/kalman=<flag>/<pair>.parquet.
+
+    Every pair is written to its own file through a temporary file and an atomic rename, so parallel writers never share a file or a lock. Single value series are stored under a value column next to a pair column, which lets a whole partition be read as one long table.
+    """
+
+    def __init__(
+        self,
+        root: str,
+    ) -> None:
+        self.root = root
+
+    def _partition_directory(
+        self,
+        series_type: str,
+        kalman: bool,
+    ) -> str:
+        return os.path.join(self.root, f"series_type={series_type}", f"kalman={kalman}")
+
+    def _series_pathway(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        kalman: bool,
+    ) -> str:
+        return os.path.join(
+            self._partition_directory(series_type, kalman),
+            f"{first_ticker}_{second_ticker}{PARQUET_FILE_EXTENSION}",
+        )
+
+    def write_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        pandas_object: pd.Series | pd.DataFrame,
+        kalman: bool = False,
+    ) -> None:
+
+        if isinstance(pandas_object, pd.Series):
+            pandas_object = pandas_object.to_frame()
+        if len(pandas_object.columns) == 1:
+            pandas_object = pandas_object.set_axis([SINGLE_VALUE_COLUMN], axis=1)
+        pandas_object = _make_mixed_object_columns_strings(pandas_object).assign(
+            **{PAIR_COLUMN: f"{first_ticker}_{second_ticker}"}
+        )
+
+        series_pathway = self._series_pathway(
+            first_ticker, second_ticker, series_type, kalman
+        )
+        os.makedirs(os.path.dirname(series_pathway), exist_ok=True)
+        temporary_pathway = os.path.join(
+            os.path.dirname(series_pathway),
+            f".{os.path.basename(series_pathway)}.{uuid.uuid4().hex}",
+        )  # pyarrow skips files starting with a dot, so partial writes are never read
+        pandas_object.to_parquet(temporary_pathway, index=True)
+        os.replace(temporary_pathway, series_pathway)
+
+    def read_series(
+        self,
+        first_ticker: str,
+        second_ticker: str,
+        series_type: str,
+        kalman: bool = False,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+
+        series_pathway = self._series_pathway(
+            first_ticker, second_ticker, series_type, kalman
+        )
+        if not os.path.exists(series_pathway):
+            raise SeriesNotFoundError(series_pathway)
+
+        if columns is not None:
+            return pd.read_parquet(series_pathway, columns=columns)
+
+        series_frame = pd.read_parquet(series_pathway).drop(columns=PAIR_COLUMN)
+        if list(series_frame.columns) == [SINGLE_VALUE_COLUMN]:
+            series_frame.columns = [
+                series_table_name(first_ticker, second_ticker, series_type, kalman)
+            ]
+
+        return series_frame
+
+    def read_series_many(
+        self,
+        pairs: list[tuple[str, str]],
+        series_type: str,
+        kalman: bool = False,
+    ) -> pd.DataFrame:
+
+        series_pathways = [
+            self._series_pathway(first_ticker, second_ticker, series_type, kalman)
+            for first_ticker, second_ticker in pairs
+        ]
+        existing_series_pathways = [
+            series_pathway
+            for series_pathway in series_pathways
+            if os.path.exists(series_pathway)
+        ]
+        if len(existing_series_pathways) < len(series_pathways):
+            logging.info(
+                f"{len(series_pathways) - len(existing_series_pathways)} pairs have no {series_type} series in {self.root}, skipping"
+            )
+        if not existing_series_pathways:
+            return pd.DataFrame(columns=[PAIR_COLUMN, SINGLE_VALUE_COLUMN])
+
+        return pd.read_parquet(existing_series_pathways)
+
+
+def _make_mixed_object_columns_strings(
+    frame: pd.DataFrame,
+) -> pd.DataFrame:
+
+    """Parquet columns hold a single type, so object columns mixing strings and numbers (eg closing_capital in trade histories saved before opened_abandoned had its own column) are stored as strings"""
+
+    mixed_columns = [
+        column
+        for column in frame.columns
+        if frame[column].dtype == object
+        and pd.api.types.infer_dtype(frame[column], skipna=True) == "mixed"
+    ]
+    if not mixed_columns:
+        return frame
+
+    return frame.astype({column: str for column in mixed_columns})
+
+
+SERIES_STORE_BACKENDS = {
+    "sqlite": SQLiteSeriesStore,
+    "parquet": ParquetSeriesStore,
+}
+
+
+def get_series_store(
+    pathway: str,
+    backend: str = SERIES_STORE_BACKEND,
+) -> SeriesStore:
+
+    """The store behind one of the database pathways in the paths file. The Parquet store lives in a directory named after the database file without its extension"""
+
+    if backend not in SERIES_STORE_BACKENDS:
+        raise ValueError(
+            f"unknown series store backend {backend}, choose from {list(SERIES_STORE_BACKENDS)}"
+        )
+    if backend == "parquet":
+        pathway = os.path.splitext(pathway)[0]
+
+    return SERIES_STORE_BACKENDS[backend](pathway)
+
+
+def migrate_sqlite_database_to_series_store(
+    pathway: str,
+    backend: str = SERIES_STORE_BACKEND,
+) -> None:
+
+    """Copies every table of one of the existing SQLite databases into the configured store, parsing table names back into pair, series type and kalman flag"""
+
+    sqlite_series_store = SQLiteSeriesStore(pathway)
+    series_store = get_series_store(pathway, backend=backend)
+
+    with sqlite3.connect(pathway) as conn:
+        table_names = [
+            table[0]
+            for table in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table';"
+            ).fetchall()
+        ]
+
+    for table_name in table_names:
+        first_ticker, second_ticker, *series_suffix = table_name.split(
+            "_", NUMBER_OF_TICKERS_IN_TABLE_NAME
+        )
+        series_type, kalman = split_series_suffix(
+            f"_{series_suffix[0]}" if series_suffix else ""
+        )
+        series_store.write_series(
+            first_ticker,
+            second_ticker,
+            series_type,
+            sqlite_series_store.read_series(
+                first_ticker, second_ticker, series_type, kalman
+            ),
+            kalman=kalman,
+        )
+
+    logging.info(f"migrated {len(table_names)} tables from {pathway}")
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+import numpy as np
+import pandas as pd
+
+PRICE_VALUES_FILE_NAME = "price_values.npy"
+PRICE_DATES_FILE_NAME = "price_dates.npy"
+SHARED_PRICES_DIRECTORY_PREFIX = "shared_prices_"
+
+_attached_price_matrix = (
+    {}
+)  # the one matrix this process has mapped, keyed by its directory
+
+
+class SharedPriceMatrix:
+
+    """A prices_df written once to memory mapped .npy files, ticker major so each ticker's prices are contiguous.
+
+    Pickling it only carries the directory and the tickers, so it can be handed to every joblib task in place of prices_df. Workers map the files on first use and prices[ticker] returns a read only pd.Series over the mapping, the same as prices_df[ticker] without a copy.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        tickers: list[str],
+        index_name: str | None = None,
+        owns_directory: bool = False,
+    ):
+        self.directory = directory
+        self.columns = pd.Index(tickers)
+        self.index_name = index_name
+        self.owns_directory = owns_directory
+        self._ticker_positions = {
+            ticker: position for position, ticker in enumerate(tickers)
+        }
+
+    @classmethod
+    def from_prices_df(
+        cls,
+        prices_df: pd.DataFrame,
+        directory: str | None = None,
+    ) -> SharedPriceMatrix:
+
+        """Writes prices_df into directory, or into a new temporary directory that close removes"""
+
+        owns_directory = directory is None
+        if owns_directory:
+            directory = tempfile.mkdtemp(prefix=SHARED_PRICES_DIRECTORY_PREFIX)
+        np.save(
+            os.path.join(directory, PRICE_VALUES_FILE_NAME),
+            np.ascontiguousarray(prices_df.to_numpy(dtype=float).T),
+        )
+        np.save(
+            os.path.join(directory, PRICE_DATES_FILE_NAME),
+            prices_df.index.to_numpy(dtype="datetime64[ns]"),
+        )
+
+        return cls(
+            directory, list(prices_df.columns), prices_df.index.name, owns_directory
+        )
+
+    def _attach(self) -> tuple[np.ndarray, pd.DatetimeIndex]:
+        if self.directory not in _attached_price_matrix:
+            _attached_price_matrix.clear()
+            _attached_price_matrix[self.directory] = (
+                np.load(
+                    os.path.join(self.directory, PRICE_VALUES_FILE_NAME), mmap_mode="r"
+                ),
+                pd.DatetimeIndex(
+                    np.load(os.path.join(self.directory, PRICE_DATES_FILE_NAME)),
+                    name=self.index_name,
+                ),
+            )
+        return _attached_price_matrix[self.directory]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return self._attach()[1]
+
+    def __getitem__(
+        self,
+        ticker: str,
+    ) -> pd.Series:
+        values, index = self._attach()
+        return pd.Series(
+            values[self._ticker_positions[ticker]],
+            index=index,
+            name=ticker,
+            copy=False,
+        )
+
+    def close(self) -> None:
+
+        """Unmaps the files and deletes them, along with the directory if from_prices_df created it"""
+
+        _attached_price_matrix.pop(self.directory, None)
+        if self.owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            return
+        for file_name in (PRICE_VALUES_FILE_NAME, PRICE_DATES_FILE_NAME):
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def shared_price_matrix(
+    prices_df: pd.DataFrame,
+) -> Iterator[SharedPriceMatrix]:
+
+    """Shares prices_df with the workers of a Parallel call for the duration of the block, the files are removed afterwards"""
+
+    shared_prices = SharedPriceMatrix.from_prices_df(prices_df)
+    try:
+        yield shared_prices
+    finally:
+        shared_prices.close()
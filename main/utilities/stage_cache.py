@@ -0,0 +1,307 @@
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Iterator
+import numpy as np
+import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+from main.utilities.paths import (
+    PATHWAY_TO_STAGE_CACHE,
+)
+from main.utilities.constants import (
+    STAGE_CACHE_MAX_BYTES,
+)
+
+CACHE_ENTRY_SUFFIX = ".pkl"
+PIPELINE_CODE_DIRECTORY = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)  # the main package, whose modules every stage runs
+TIME_WINDOW_TO_LOOK_BACK_FOR_PAIR_INPUTS = pd.Timedelta(
+    days=2_000
+)  # covers the rolling OLS lookback before the earliest date any hedge ratio of the pair starts on
+
+
+def _update_fingerprint(
+    fingerprint: hashlib._Hash,
+    pipeline_input: Any,
+) -> None:
+
+    if isinstance(pipeline_input, (pd.DataFrame, pd.Series)):
+        fingerprint.update(type(pipeline_input).__name__.encode())
+        fingerprint.update(
+            pd.util.hash_pandas_object(pipeline_input, index=True).to_numpy().tobytes()
+        )
+        if isinstance(pipeline_input, pd.DataFrame):
+            _update_fingerprint(fingerprint, list(pipeline_input.columns))
+    elif isinstance(pipeline_input, np.ndarray):
+        fingerprint.update(f"{pipeline_input.dtype}{pipeline_input.shape}".encode())
+        fingerprint.update(np.ascontiguousarray(pipeline_input).tobytes())
+    elif isinstance(pipeline_input, (list, tuple)):
+        fingerprint.update(
+            f"{type(pipeline_input).__name__}{len(pipeline_input)}".encode()
+        )
+        for element in pipeline_input:
+            _update_fingerprint(fingerprint, element)
+    elif isinstance(pipeline_input, dict):
+        _update_fingerprint(fingerprint, sorted(pipeline_input.items(), key=repr))
+    else:
+        fingerprint.update(repr(pipeline_input).encode())
+    fingerprint.update(b"|")
+
+
+@lru_cache(maxsize=None)
+def pipeline_code_fingerprint(
+    directory: str = PIPELINE_CODE_DIRECTORY,
+) -> str:
+
+    """A hash of the source of every module under directory, read once per process. It is part of every stage cache key, so editing a stage or any code it calls invalidates the outputs cached by the old code"""
+
+    fingerprint = hashlib.sha256()
+    for directory_path, directory_names, file_names in os.walk(directory):
+        directory_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith(".py"):
+                file_path = os.path.join(directory_path, file_name)
+                fingerprint.update(os.path.relpath(file_path, directory).encode())
+                with open(file_path, "rb") as source_file:
+                    fingerprint.update(source_file.read())
+
+    return fingerprint.hexdigest()
+
+
+def input_fingerprint(
+    *pipeline_inputs: Any,
+) -> str:
+
+    """A content hash of the inputs of a piece of work: frames and arrays by their values, index and columns, everything else by repr. Equal inputs always give the same key"""
+
+    fingerprint = hashlib.sha256()
+    for pipeline_input in pipeline_inputs:
+        _update_fingerprint(fingerprint, pipeline_input)
+
+    return fingerprint.hexdigest()
+
+
+def pair_input_fingerprints(
+    stage_name: str,
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    *stage_parameters: Any,
+    key_columns: Iterable[str] = (),
+) -> list[str]:
+
+    """One cache key per row of results_df for a per pair stage. It covers the pair, its start, mid point and finish dates, any other key_columns of the row the stage reads, both tickers' prices from TIME_WINDOW_TO_LOOK_BACK_FOR_PAIR_INPUTS before its start date to its finish date (every window any stage reads), the stage's parameters and the pipeline's code"""
+
+    code_fingerprint = pipeline_code_fingerprint()
+    dates = prices_df.index
+    prices_matrix = prices_df.to_numpy(dtype=float)
+    dates_ns = dates.to_numpy(dtype="datetime64[ns]")
+    first_positions = dates.searchsorted(
+        pd.to_datetime(results_df["pair_start_date"])
+        - TIME_WINDOW_TO_LOOK_BACK_FOR_PAIR_INPUTS,
+        side="left",
+    )
+    last_positions = dates.searchsorted(
+        pd.to_datetime(results_df["pair_finish_date"]), side="right"
+    )
+    first_ticker_positions = prices_df.columns.get_indexer(results_df["first_ticker"])
+    second_ticker_positions = prices_df.columns.get_indexer(results_df["second_ticker"])
+
+    return [
+        input_fingerprint(
+            stage_name,
+            code_fingerprint,
+            row["first_ticker"],
+            row["second_ticker"],
+            row["pair_start_date"],
+            row["trading_period_mid_point_date"],
+            row["pair_finish_date"],
+            [row[key_column] for key_column in key_columns],
+            dates_ns[first_position:last_position],
+            prices_matrix[
+                first_position:last_position,
+                [first_ticker_position, second_ticker_position],
+            ],
+            stage_parameters,
+        )
+        for (
+            _,
+            row,
+        ), first_position, last_position, first_ticker_position, second_ticker_position in zip(
+            results_df.iterrows(),
+            first_positions,
+            last_positions,
+            first_ticker_positions,
+            second_ticker_positions,
+        )
+    ]
+
+
+class StageCache:
+
+    """A content addressed cache of pipeline stage outputs on disk, one pickle per key (see input_fingerprint), so work whose inputs are unchanged since an earlier run is loaded rather than recomputed.
+
+    Entries are evicted least recently used first once the cache holds more than max_bytes, a hit counts as a use. Only the parent process reads and writes the cache, workers are only handed the work that missed.
+    """
+
+    def __init__(
+        self,
+        directory: str = PATHWAY_TO_STAGE_CACHE,
+        max_bytes: int = STAGE_CACHE_MAX_BYTES,
+    ) -> None:
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _entry_path(
+        self,
+        key: str,
+    ) -> str:
+        return os.path.join(self.directory, f"{key}{CACHE_ENTRY_SUFFIX}")
+
+    def __contains__(
+        self,
+        key: str,
+    ) -> bool:
+        return os.path.exists(self._entry_path(key))
+
+    def load(
+        self,
+        key: str,
+    ) -> Any:
+
+        """The value stored under key, raising KeyError when there is none"""
+
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "rb") as entry_file:
+                value = pickle.load(entry_file)
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        os.utime(entry_path)
+
+        return value
+
+    def store(
+        self,
+        key: str,
+        value: Any,
+    ) -> None:
+
+        """Writes value under key, through a temporary file so an interrupted write never leaves a partial entry"""
+
+        file_descriptor, temporary_path = tempfile.mkstemp(
+            dir=self.directory, suffix=".tmp"
+        )
+        with os.fdopen(file_descriptor, "wb") as entry_file:
+            pickle.dump(value, entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self._entry_path(key))
+
+    def evict(
+        self,
+    ) -> int:
+
+        """Removes the least recently used entries until the cache fits in max_bytes. Returns the number removed"""
+
+        entries = []
+        for directory_entry in os.scandir(self.directory):
+            if directory_entry.name.endswith(CACHE_ENTRY_SUFFIX):
+                entry_stat = directory_entry.stat()
+                entries.append(
+                    (entry_stat.st_mtime_ns, entry_stat.st_size, directory_entry.path)
+                )
+
+        total_bytes = sum(entry_size for _, entry_size, _ in entries)
+        number_evicted = 0
+        for _, entry_size, entry_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(entry_path)
+            total_bytes -= entry_size
+            number_evicted += 1
+
+        if number_evicted:
+            logging.info(f"evicted {number_evicted} stage cache entries")
+        return number_evicted
+
+    def cached_stage(
+        self,
+        stage_name: str,
+        compute_stage: Callable[[], Any],
+        *stage_inputs: Any,
+    ) -> Any:
+
+        """compute_stage() for a whole stage, or its cached output when the same pipeline code last ran it on identical stage_inputs"""
+
+        key = input_fingerprint(stage_name, pipeline_code_fingerprint(), *stage_inputs)
+        try:
+            value = self.load(key)
+            logging.info(f"{stage_name} inputs unchanged, loaded from the stage cache")
+            return value
+        except KeyError:
+            pass
+
+        value = compute_stage()
+        self.store(key, value)
+        self.evict()
+
+        return value
+
+    def cached_rows(
+        self,
+        keys: list[str],
+        compute_rows: Callable[[list[int]], Iterable[Any]],
+    ) -> Iterator[Any]:
+
+        """The output of every row of a per row stage, in row order. Rows whose key is cached are loaded, the others are handed to compute_rows in one call (as row numbers, it returns their outputs in the same order) and cached as they arrive"""
+
+        missing_row_numbers = [
+            row_number for row_number, key in enumerate(keys) if key not in self
+        ]
+        logging.info(
+            f"stage cache holds {len(keys) - len(missing_row_numbers)} of {len(keys)} rows"
+        )
+        missing_rows = set(missing_row_numbers)
+        computed_values = iter(
+            compute_rows(missing_row_numbers) if missing_row_numbers else []
+        )
+
+        for row_number, key in enumerate(keys):
+            if row_number in missing_rows:
+                value = next(computed_values)
+                self.store(key, value)
+            else:
+                value = self.load(key)
+            yield value
+
+        self.evict()
+
+
+def cached_pair_outputs(
+    stage_cache: StageCache | None,
+    stage_name: str,
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+    compute_pairs: Callable[[pd.DataFrame], Iterable[Any]],
+    *stage_parameters: Any,
+    key_columns: Iterable[str] = (),
+) -> Iterable[Any]:
+
+    """The output of a per pair stage for every row of results_df, in row order, where compute_pairs(results_df) returns one output per row. With a stage_cache only the rows whose key (see pair_input_fingerprints) is not cached are passed to compute_pairs"""
+
+    if stage_cache is None:
+        return compute_pairs(results_df)
+
+    keys = pair_input_fingerprints(
+        stage_name, results_df, prices_df, *stage_parameters, key_columns=key_columns
+    )
+    return stage_cache.cached_rows(
+        keys, lambda row_numbers: compute_pairs(results_df.iloc[row_numbers])
+    )
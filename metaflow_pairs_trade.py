@@ -1,26 +1,36 @@
 import logging
 import pandas as pd
-from joblib import Parallel, delayed
 
 from metaflow import (
     FlowSpec,
     step,
     Parameter,
+    JSONType,
 )
 
 from main.utilities.paths import (
     PATHWAY_TO_PRICE_DF,
     PATHWAY_TO_SECTORS_SUBSECTORS_DF,
     PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
+    PATHWAY_TO_BACKTEST_PARAMETER_SWEEP_DF,
+    PATHWAY_TO_RESULTS_SINK,
 )
 
 from main.utilities.constants import (
-    CORES_TO_USE,
+    BACKTEST_PARAMETER_COLUMNS,
+)
+from main.utilities.stage_cache import (
+    StageCache,
+)
+from main.utilities.results_sink import (
+    ResultsSink,
+    PAIR_KEY_COLUMNS,
 )
-
 
 from main.model_building.scripts.cointegration_testing import (
     perform_multiple_cointegration_tests,
+    prefilter_pairs,
+    prefilter_recall_report,
 )
 from main.model_building.scripts.hedge_ratio_calculations import (
     calculate_rolling_hedge_ratio_whole_set,
@@ -31,16 +41,21 @@ from main.model_building.scripts.hedge_ratio_calculations_kalman import (
 from main.model_building.scripts.creating_spreads import (
     create_rolling_hedge_ratio_scaled_spread_whole_set,
 )
-from main.model_building.scripts.adf_testing import perform_adf_whole_set
-from main.model_building.scripts.hurst_exponent import hurst_exponent_whole_set
-from main.model_building.scripts.half_life import half_life_ornstein_whole_set
+from main.model_building.scripts.spread_diagnostics import (
+    spread_diagnostics_whole_set,
+)
 from main.model_building.scripts.modify_results_df import (
     concatenate_sectors_in_column,
     sector_mapper,
+    ticker_sector_map,
+)
+from main.model_building.backtesting.backtest_execution import (
+    execute_trade_whole_set_batched,
+    execute_parameter_sweep_whole_set,
 )
-from main.model_building.backtesting.backtest_execution import execute_trade
 from main.model_building.backtesting_analysis.performance_measures import (
     calculate_various_performance_metrics_whole_set,
+    PERFORMANCE_METRIC_COLUMNS,
 )
 
 
@@ -69,6 +84,49 @@ class StatArbFlow(FlowSpec):
         help="Spread to abandon trade, a kind of stop loss",
     )
 
+    backtest_parameter_grid = Parameter(
+        name="backtest_parameter_grid",
+        type=JSONType,
+        default="[]",
+        help="List of [entry, exit, abandon] thresholds to sweep over every pair, e.g. [[2, 0.5, 6], [1.5, 0.5, 4]]. Empty skips the sweep",
+    )
+
+    pair_prefilter = Parameter(
+        name="pair_prefilter",
+        default="none",
+        help="Cheap screen ahead of cointegration testing: none, correlation or distance",
+    )
+
+    prefilter_top_k_per_ticker = Parameter(
+        name="prefilter_top_k_per_ticker",
+        default=20,
+        help="Pairs kept per ticker by the prefilter, ranked by its score",
+    )
+
+    prefilter_same_sector = Parameter(
+        name="prefilter_same_sector",
+        default=False,
+        help="Only test pairs whose tickers share a sector",
+    )
+
+    prefilter_recall_report = Parameter(
+        name="prefilter_recall_report",
+        default=False,
+        help="Also run the unfiltered cointegration tests and log the prefilter's recall against them",
+    )
+
+    use_stage_cache = Parameter(
+        name="use_stage_cache",
+        default=True,
+        help="Load the outputs of pairs whose inputs and pipeline code are unchanged since an earlier run from the stage cache instead of recomputing them",
+    )
+
+    resume_results = Parameter(
+        name="resume_results",
+        default=False,
+        help="Keep the per pair performance measures and sweep results an interrupted run already wrote to the results sink and only compute the missing pairs. The sink is cleared otherwise",
+    )
+
     testing = Parameter(
         name="testing",
         default=True,
@@ -81,6 +139,9 @@ class StatArbFlow(FlowSpec):
         help="Length of the testing dataset",
     )
 
+    def _stage_cache(self) -> StageCache | None:
+        return StageCache() if self.use_stage_cache else None
+
     @step
     def start(self):
 
@@ -88,13 +149,11 @@ class StatArbFlow(FlowSpec):
 
         self.prices_df = pd.read_parquet(PATHWAY_TO_PRICE_DF)
         self.sectors_subsectors_df = pd.read_parquet(PATHWAY_TO_SECTORS_SUBSECTORS_DF)
-        self.present_backtest_params = (
-            str(self.spread_to_trigger_trade_entry)
-            + "_"
-            + str(self.spread_to_trigger_trade_exit)
-            + "_"
-            + str(self.spread_to_abandon_trade)
-        ).replace(".", "")
+        self.backtest_parameters = (
+            self.spread_to_trigger_trade_entry,
+            self.spread_to_trigger_trade_exit,
+            self.spread_to_abandon_trade,
+        )
 
         if self.testing:
             self.prices_df = self.prices_df.iloc[:, : self.testing_df_length]
@@ -108,10 +167,44 @@ class StatArbFlow(FlowSpec):
 
         logging.info("Running cointegration testing")
 
+        self.candidate_pairs_df = None
+        if self.pair_prefilter != "none" or self.prefilter_same_sector:
+            self.candidate_pairs_df = prefilter_pairs(
+                prices_df=self.prices_df,
+                method=(
+                    "correlation"
+                    if self.pair_prefilter == "none"
+                    else self.pair_prefilter
+                ),
+                top_k_per_ticker=(
+                    None
+                    if self.pair_prefilter == "none"
+                    else self.prefilter_top_k_per_ticker
+                ),
+                ticker_sectors=(
+                    ticker_sector_map(self.sectors_subsectors_df)
+                    if self.prefilter_same_sector
+                    else None
+                ),
+            )
+            logging.info(f"Prefilter kept {len(self.candidate_pairs_df)} pairs")
+
         self.results_df = perform_multiple_cointegration_tests(
             prices_df=self.prices_df,
+            candidate_pairs_df=self.candidate_pairs_df,
+            stage_cache=self._stage_cache(),
         )
 
+        if self.candidate_pairs_df is not None and self.prefilter_recall_report:
+            self.prefilter_recall = prefilter_recall_report(
+                unfiltered_results_df=perform_multiple_cointegration_tests(
+                    prices_df=self.prices_df,
+                ),
+                candidate_pairs_df=self.candidate_pairs_df,
+                number_of_tickers=len(self.prices_df.columns),
+            )
+            logging.info(f"Prefilter recall report: {self.prefilter_recall}")
+
         logging.info("Finished sp_500 cointegration tests")
 
         self.next(self.hedge_ratio_calculations_ols)
@@ -125,12 +218,14 @@ class StatArbFlow(FlowSpec):
             results_df=self.results_df,
             prices_df=self.prices_df,
             backtest_spread=False,
+            stage_cache=self._stage_cache(),
         )
 
         calculate_rolling_hedge_ratio_whole_set(
             results_df=self.results_df,
             prices_df=self.prices_df,
             backtest_spread=True,
+            stage_cache=self._stage_cache(),
         )
 
         logging.info("Calculated rolling hedge ratios OLS for dataset")
@@ -145,6 +240,7 @@ class StatArbFlow(FlowSpec):
         calculate_rolling_hedge_ratio_whole_set_kalman(
             prices_df=self.prices_df,
             results_df=self.results_df,
+            stage_cache=self._stage_cache(),
         )
 
         logging.info("Kalman filter hedge ratios complete")
@@ -160,12 +256,14 @@ class StatArbFlow(FlowSpec):
             results_df=self.results_df,
             prices_df=self.prices_df,
             backtest_spread=False,
+            stage_cache=self._stage_cache(),
         )
 
         create_rolling_hedge_ratio_scaled_spread_whole_set(
             results_df=self.results_df,
             prices_df=self.prices_df,
             backtest_spread=True,
+            stage_cache=self._stage_cache(),
         )
 
         create_rolling_hedge_ratio_scaled_spread_whole_set(
@@ -173,6 +271,7 @@ class StatArbFlow(FlowSpec):
             prices_df=self.prices_df,
             backtest_spread=False,
             kalman=True,
+            stage_cache=self._stage_cache(),
         )
 
         create_rolling_hedge_ratio_scaled_spread_whole_set(
@@ -180,51 +279,26 @@ class StatArbFlow(FlowSpec):
             prices_df=self.prices_df,
             backtest_spread=True,
             kalman=True,
+            stage_cache=self._stage_cache(),
         )
 
         logging.info("Finished creating spreads")
 
-        self.next(self.adf_testing)
-
-    @step
-    def adf_testing(self):
-
-        logging.info("Running ADF tests")
-
-        adf_results_list = perform_adf_whole_set(
-            results_df=self.results_df,
-        )
-        self.results_df["adf_result"] = adf_results_list
-
-        logging.info("ADF tests complete")
-
-        self.next(self.calculate_hurst_exponent)
+        self.next(self.spread_diagnostics)
 
     @step
-    def calculate_hurst_exponent(self):
+    def spread_diagnostics(self):
 
-        logging.info("Calculating Hurst Exponent")
+        logging.info("Running spread diagnostics (ADF, Hurst exponent, half life)")
 
-        hurst_exponent_results = hurst_exponent_whole_set(
-            results_df=self.results_df,
-        )
-        self.results_df["hurst_exponent_results"] = hurst_exponent_results
-
-        logging.info("Hurst Exponent complete")
-
-        self.next(self.calculate_half_life)
-
-    @step
-    def calculate_half_life(self):
-
-        logging.info("Calculating half life")
-
-        half_life_results = half_life_ornstein_whole_set(
+        diagnostics_df = spread_diagnostics_whole_set(
             results_df=self.results_df,
+            stage_cache=self._stage_cache(),
+            prices_df=self.prices_df,
         )
-        self.results_df["half_life_results"] = half_life_results
+        self.results_df[diagnostics_df.columns] = diagnostics_df
 
-        logging.info("Half life complete")
+        logging.info("Spread diagnostics complete")
 
         self.next(self.sector_mapping)
 
@@ -254,15 +328,14 @@ class StatArbFlow(FlowSpec):
         logging.info("Starting backtesting ols")
 
         # First backtest with Kalman set to false
-        Parallel(n_jobs=CORES_TO_USE)(
-            delayed(execute_trade)(
-                row=row,
-                spread_to_trigger_trade_entry=self.spread_to_trigger_trade_entry,
-                spread_to_trigger_trade_exit=self.spread_to_trigger_trade_exit,
-                spread_to_abandon_trade=self.spread_to_abandon_trade,
-                kalman_spread=False,
-            )
-            for _, row in self.results_df.iterrows()
+        execute_trade_whole_set_batched(
+            results_df=self.results_df,
+            prices_df=self.prices_df,
+            spread_to_trigger_trade_entry=self.spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit=self.spread_to_trigger_trade_exit,
+            spread_to_abandon_trade=self.spread_to_abandon_trade,
+            kalman_spread=False,
+            stage_cache=self._stage_cache(),
         )
 
         logging.info("Backtesting complete ols")
@@ -275,15 +348,14 @@ class StatArbFlow(FlowSpec):
         logging.info("Starting backtesting kalman")
 
         # Second backtest with Kalman set to True
-        Parallel(n_jobs=CORES_TO_USE)(
-            delayed(execute_trade)(
-                row=row,
-                spread_to_trigger_trade_entry=self.spread_to_trigger_trade_entry,
-                spread_to_trigger_trade_exit=self.spread_to_trigger_trade_exit,
-                spread_to_abandon_trade=self.spread_to_abandon_trade,
-                kalman_spread=True,
-            )
-            for _, row in self.results_df.iterrows()
+        execute_trade_whole_set_batched(
+            results_df=self.results_df,
+            prices_df=self.prices_df,
+            spread_to_trigger_trade_entry=self.spread_to_trigger_trade_entry,
+            spread_to_trigger_trade_exit=self.spread_to_trigger_trade_exit,
+            spread_to_abandon_trade=self.spread_to_abandon_trade,
+            kalman_spread=True,
+            stage_cache=self._stage_cache(),
         )
 
         logging.info("Backtesting complete kalman")
@@ -295,36 +367,72 @@ class StatArbFlow(FlowSpec):
 
         logging.info("Calculating performance measures")
 
+        self.results_df[BACKTEST_PARAMETER_COLUMNS] = self.backtest_parameters
+
         valuation_metrics = calculate_various_performance_metrics_whole_set(
-            backtest_params=self.present_backtest_params,
+            results_df=self.results_df,
+            backtest_parameters=self.backtest_parameters,
             kalman=False,
+            results_sink=ResultsSink(
+                PATHWAY_TO_RESULTS_SINK,
+                partition={
+                    "stage": "performance_measures",
+                    **dict(zip(BACKTEST_PARAMETER_COLUMNS, self.backtest_parameters)),
+                    "kalman": False,
+                },
+                resume=self.resume_results,
+            ),
         )
 
-        self.results_df[
-            [
-                f"sharpe_ratio_{self.present_backtest_params}",
-                f"no_profitable_trades_{self.present_backtest_params}",
-                f"fraction_profitable_trades_{self.present_backtest_params}",
-            ]
-        ] = valuation_metrics
+        self.results_df[PERFORMANCE_METRIC_COLUMNS] = valuation_metrics
 
         logging.info("completed NON KALMAN performance measures")
 
         valuation_metrics_kalman = calculate_various_performance_metrics_whole_set(
-            backtest_params=self.present_backtest_params,
+            results_df=self.results_df,
+            backtest_parameters=self.backtest_parameters,
             kalman=True,
+            results_sink=ResultsSink(
+                PATHWAY_TO_RESULTS_SINK,
+                partition={
+                    "stage": "performance_measures",
+                    **dict(zip(BACKTEST_PARAMETER_COLUMNS, self.backtest_parameters)),
+                    "kalman": True,
+                },
+                resume=self.resume_results,
+            ),
         )
 
         self.results_df[
-            [
-                f"sharpe_ratio_{self.present_backtest_params}_kalman",
-                f"no_profitable_trades_{self.present_backtest_params}_kalman",
-                f"fraction_profitable_trades_{self.present_backtest_params}_kalman",
-            ]
+            [f"{metric_column}_kalman" for metric_column in PERFORMANCE_METRIC_COLUMNS]
         ] = valuation_metrics_kalman
 
         logging.info("Performance measures complete")
 
+        self.next(self.backtest_parameter_sweep)
+
+    @step
+    def backtest_parameter_sweep(self):
+
+        if self.backtest_parameter_grid:
+
+            logging.info("Sweeping backtest parameter grid")
+
+            self.parameter_sweep_df = execute_parameter_sweep_whole_set(
+                results_df=self.results_df,
+                prices_df=self.prices_df,
+                parameter_grid=self.backtest_parameter_grid,
+                results_sink=ResultsSink(
+                    PATHWAY_TO_RESULTS_SINK,
+                    partition={"stage": "backtest_parameter_sweep"},
+                    resume=self.resume_results,
+                    key_columns=PAIR_KEY_COLUMNS + BACKTEST_PARAMETER_COLUMNS,
+                ),
+            )
+            self.parameter_sweep_df.to_parquet(PATHWAY_TO_BACKTEST_PARAMETER_SWEEP_DF)
+
+            logging.info("Backtest parameter sweep complete")
+
         self.next(self.end)
 
     @step
@@ -0,0 +1,172 @@
+"""Micro-benchmarks of a single pair's BackTest.trade() on synthetic series, run with python -m tests.benchmarks.benchmark_backtest.
+
+The per bar cost should stay flat as the series grows, a per bar cost rising with the number of days is a sign of work on the whole series inside the daily loop.
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import logging
+
+from main.utilities.functions import (
+    generate_random_walk_series_for_random_backtest,
+)
+from main.model_building.backtesting.backtest import (
+    BackTest,
+    BackTestState,
+)
+
+BENCHMARK_START_DATE = "2000-01-01"
+BENCHMARK_YEARS = [1, 2, 4, 8]
+BENCHMARK_REPEATS = 3
+BENCHMARK_THRESHOLDS = (1, 0.2, 3)
+BENCHMARK_SPREAD_SCENARIOS = ("random_walk", "hop_heavy")
+
+
+def generate_benchmark_inputs(
+    number_of_years: int,
+    scenario: str,
+    seed: int = 19,
+) -> dict[str, pd.Series]:
+
+    """Prices and a standardised spread from generate_random_walk_series_for_random_backtest. random_walk standardises its spread. hop_heavy flips the sign every day on a magnitude of 1 to 1.9 taken from the spread's daily changes, so with the benchmark thresholds a trade opens and hops the spread on alternate days without ever being abandoned"""
+
+    np.random.seed(seed)
+    test_inputs = generate_random_walk_series_for_random_backtest(
+        start_date=BENCHMARK_START_DATE,
+        end_date=pd.Timestamp(BENCHMARK_START_DATE)
+        + pd.DateOffset(years=number_of_years),
+        std_dev=1,
+    )
+    spread_series = test_inputs["standardised_spread"]
+    test_inputs["standardised_spread"] = (
+        spread_series - spread_series.mean()
+    ) / spread_series.std()
+    if scenario == "hop_heavy":
+        spread_changes = spread_series.diff().fillna(0).abs()
+        test_inputs["standardised_spread"] = (
+            1 + (spread_changes / spread_changes.max()).clip(upper=0.9)
+        ) * np.where(np.arange(len(spread_series)) % 2, -1.0, 1.0)
+
+    return test_inputs
+
+
+def _backtest_from_inputs(
+    test_inputs: dict[str, pd.Series],
+    thresholds: tuple[float, float, float],
+) -> BackTest:
+
+    """A fresh BackTest on test_inputs without reading the price parquet or the spread stores"""
+
+    backtest = BackTest.from_state(BackTestState("AAA", "BBB", *thresholds))
+    backtest.ticker1_prices = test_inputs["ticker1_prices"].rename("AAA")
+    backtest.ticker2_prices = test_inputs["ticker2_prices"].rename("BBB")
+    backtest.standardised_spread = test_inputs["standardised_spread"]
+    backtest.regular_spread = pd.DataFrame(
+        index=test_inputs["standardised_spread"].index
+    )
+
+    return backtest
+
+
+def benchmark_backtest_trade(
+    years: list[int] = BENCHMARK_YEARS,
+    scenarios: tuple[str, ...] = BENCHMARK_SPREAD_SCENARIOS,
+    repeats: int = BENCHMARK_REPEATS,
+    thresholds: tuple[float, float, float] = BENCHMARK_THRESHOLDS,
+) -> list[dict]:
+
+    """The best of repeats trade() times for one pair at every series length and scenario, with the per bar cost and number of trades"""
+
+    benchmark_results = []
+    for scenario in scenarios:
+        for number_of_years in years:
+            test_inputs = generate_benchmark_inputs(number_of_years, scenario)
+            trade_seconds = []
+            for _ in range(repeats):
+                backtest = _backtest_from_inputs(test_inputs, thresholds)
+                start_time = time.perf_counter()
+                backtest.trade(test_inputs={})
+                trade_seconds.append(time.perf_counter() - start_time)
+
+            number_of_bars = len(test_inputs["standardised_spread"])
+            benchmark_results.append(
+                {
+                    "scenario": scenario,
+                    "number_of_bars": number_of_bars,
+                    "number_of_trades": len(backtest.trade_history_frame),
+                    "trade_seconds": min(trade_seconds),
+                    "microseconds_per_bar": 1e6 * min(trade_seconds) / number_of_bars,
+                }
+            )
+
+    return benchmark_results
+
+
+def benchmark_price_lookups(
+    years: list[int] = BENCHMARK_YEARS,
+    repeats: int = BENCHMARK_REPEATS,
+) -> list[dict]:
+
+    """The per bar cost of reading both tickers' prices by date label on the series, as the daily loop once did, against by position on the aligned arrays trade now reads"""
+
+    benchmark_results = []
+    for number_of_years in years:
+        test_inputs = generate_benchmark_inputs(number_of_years, "random_walk")
+        backtest = _backtest_from_inputs(test_inputs, BENCHMARK_THRESHOLDS)
+        backtest._align_price_arrays()
+        dates = backtest.standardised_spread.index
+
+        def _label_lookups():
+            for date in dates:
+                backtest.ticker1_prices[date], backtest.ticker2_prices[date]
+
+        def _positional_lookups():
+            for position in range(len(dates)):
+                (
+                    backtest.ticker1_price_array[position],
+                    backtest.ticker2_price_array[position],
+                )
+
+        for lookup_name, run_lookups in [
+            ("label", _label_lookups),
+            ("positional", _positional_lookups),
+        ]:
+            lookup_seconds = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                run_lookups()
+                lookup_seconds.append(time.perf_counter() - start_time)
+
+            benchmark_results.append(
+                {
+                    "lookup": lookup_name,
+                    "number_of_bars": len(dates),
+                    "lookup_seconds": min(lookup_seconds),
+                    "microseconds_per_bar": 1e6 * min(lookup_seconds) / len(dates),
+                }
+            )
+
+    return benchmark_results
+
+
+if __name__ == "__main__":
+
+    logging.disable(logging.INFO)  # BackTest logs every trade
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, nargs="+", default=BENCHMARK_YEARS)
+    parser.add_argument("--repeats", type=int, default=BENCHMARK_REPEATS)
+    arguments = parser.parse_args()
+
+    print(
+        pd.DataFrame(
+            benchmark_backtest_trade(years=arguments.years, repeats=arguments.repeats)
+        ).to_string(index=False)
+    )
+    print(
+        pd.DataFrame(
+            benchmark_price_lookups(years=arguments.years, repeats=arguments.repeats)
+        ).to_string(index=False)
+    )
@@ -0,0 +1,331 @@
+"""Times every StatArbFlow stage on synthetic cointegrated price panels of several universe sizes, run with python -m tests.benchmarks.benchmark_pipeline.
+
+Each stage's wall time, peak resident memory and pairs per second are appended to a JSON history, one record per universe size and run, so scaling can be tracked across commits. Stages run in this process (CORES_TO_USE set to 1) against series stores in a temporary directory, so the timings measure the work of a stage rather than the worker pool, and nothing is written next to the real databases.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator
+from unittest import mock
+import numpy as np
+import pandas as pd
+import psutil
+import logging
+
+from main.utilities.series_store import (
+    get_series_store,
+)
+from main.model_building.scripts.cointegration_testing import (
+    perform_multiple_cointegration_tests,
+)
+from main.model_building.scripts.hedge_ratio_calculations import (
+    calculate_rolling_hedge_ratio_whole_set,
+)
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    calculate_rolling_hedge_ratio_whole_set_kalman,
+)
+from main.model_building.scripts.creating_spreads import (
+    create_rolling_hedge_ratio_scaled_spread_whole_set,
+)
+from main.model_building.scripts.spread_diagnostics import (
+    spread_diagnostics_whole_set,
+)
+from main.model_building.backtesting.backtest_execution import (
+    execute_trade_whole_set_batched,
+)
+from main.model_building.backtesting_analysis.performance_measures import (
+    calculate_various_performance_metrics_whole_set,
+)
+
+BENCHMARK_UNIVERSE_SIZES = [50, 200, 500]
+BENCHMARK_START_DATE = "2010-01-01"
+BENCHMARK_END_DATE = "2016-12-31"
+BENCHMARK_MID_POINT_DATE = pd.Timestamp(year=2013, month=6, day=1)
+BENCHMARK_TICKERS_PER_FACTOR = (
+    10  # tickers sharing a common random walk, so pairs within a group are cointegrated
+)
+BENCHMARK_MAX_PAIRS = 2_000  # cointegrated pairs carried past cointegration testing, keeps the largest universes to a bounded run
+BENCHMARK_THRESHOLDS = (2, 0.5, 6)
+BENCHMARK_HISTORY_PATHWAY = os.path.join(
+    os.path.dirname(__file__), "pipeline_benchmark_history.json"
+)
+PEAK_RSS_SAMPLING_SECONDS = 0.01
+BYTES_PER_MEGABYTE = 1024**2
+MODULES_RUNNING_STAGES = [
+    "main.model_building.scripts.cointegration_testing",
+    "main.model_building.scripts.hedge_ratio_calculations",
+    "main.model_building.scripts.hedge_ratio_calculations_kalman",
+    "main.model_building.scripts.creating_spreads",
+    "main.model_building.scripts.spread_diagnostics",
+    "main.model_building.backtesting.backtest_execution",
+    "main.model_building.backtesting_analysis.performance_measures",
+]
+MODULES_OPENING_SERIES_STORES = [
+    "main.utilities.functions",
+    "main.model_building.scripts.hedge_ratio_calculations",
+    "main.model_building.scripts.hedge_ratio_calculations_kalman",
+    "main.model_building.scripts.creating_spreads",
+    "main.model_building.backtesting.backtest_execution",
+]
+
+
+def generate_cointegrated_prices_df(
+    number_of_tickers: int,
+    seed: int = 20,
+) -> pd.DataFrame:
+
+    """Business day prices of number_of_tickers tickers, each a loading on its group's common random walk plus its own mean reverting noise"""
+
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(BENCHMARK_START_DATE, BENCHMARK_END_DATE, name="Date")
+    number_of_factors = -(-number_of_tickers // BENCHMARK_TICKERS_PER_FACTOR)
+    common_walks = 100 + np.cumsum(
+        rng.normal(size=(len(dates), number_of_factors)), axis=0
+    )
+    mean_reverting_noise = np.zeros((len(dates), number_of_tickers))
+    innovations = rng.normal(scale=0.5, size=(len(dates), number_of_tickers))
+    for position in range(1, len(dates)):
+        mean_reverting_noise[position] = (
+            0.9 * mean_reverting_noise[position - 1] + innovations[position]
+        )
+    ticker_factors = np.arange(number_of_tickers) // BENCHMARK_TICKERS_PER_FACTOR
+    loadings = rng.uniform(0.5, 2.0, size=number_of_tickers)
+
+    return pd.DataFrame(
+        np.abs(loadings * common_walks[:, ticker_factors] + mean_reverting_noise) + 1,
+        index=dates,
+        columns=[f"T{ticker_number:04d}" for ticker_number in range(number_of_tickers)],
+    )
+
+
+@contextmanager
+def _peak_rss_sampler() -> Iterator[dict]:
+
+    """Samples this process's resident memory on a thread while the block runs, leaving the peak in bytes under peak_rss"""
+
+    process = psutil.Process()
+    sample = {"peak_rss": process.memory_info().rss}
+    stop_sampling = threading.Event()
+
+    def _sample_rss() -> None:
+        while not stop_sampling.wait(PEAK_RSS_SAMPLING_SECONDS):
+            sample["peak_rss"] = max(sample["peak_rss"], process.memory_info().rss)
+
+    sampling_thread = threading.Thread(target=_sample_rss, daemon=True)
+    sampling_thread.start()
+    try:
+        yield sample
+    finally:
+        stop_sampling.set()
+        sampling_thread.join()
+        sample["peak_rss"] = max(sample["peak_rss"], process.memory_info().rss)
+
+
+def _time_stage(
+    stage_name: str,
+    run_stage: Callable[[], object],
+    number_of_pairs: int,
+) -> tuple[dict, object]:
+
+    with _peak_rss_sampler() as sample:
+        start_time = time.perf_counter()
+        stage_output = run_stage()
+        wall_seconds = time.perf_counter() - start_time
+
+    logging.info(f"{stage_name} took {wall_seconds:.2f}s for {number_of_pairs} pairs")
+    return {
+        "stage": stage_name,
+        "wall_seconds": wall_seconds,
+        "peak_rss_mb": sample["peak_rss"] / BYTES_PER_MEGABYTE,
+        "number_of_pairs": number_of_pairs,
+        "pairs_per_second": number_of_pairs / wall_seconds if wall_seconds else None,
+    }, stage_output
+
+
+@contextmanager
+def _benchmark_environment(
+    store_directory: str,
+) -> Iterator[None]:
+
+    """Every stage module on a single core and every series store under store_directory"""
+
+    def _temporary_series_store(pathway, *args, **kwargs):
+        return get_series_store(
+            os.path.join(store_directory, os.path.basename(pathway)), *args, **kwargs
+        )
+
+    with ExitStack() as patches:
+        for module_name in MODULES_RUNNING_STAGES:
+            patches.enter_context(mock.patch(f"{module_name}.CORES_TO_USE", 1))
+        for module_name in MODULES_OPENING_SERIES_STORES:
+            patches.enter_context(
+                mock.patch(
+                    f"{module_name}.get_series_store",
+                    side_effect=_temporary_series_store,
+                )
+            )
+        yield
+
+
+def benchmark_pipeline(
+    number_of_tickers: int,
+    max_pairs: int = BENCHMARK_MAX_PAIRS,
+) -> dict:
+
+    """One run of every stage on a synthetic universe of number_of_tickers tickers. Stages after cointegration testing run on at most max_pairs of the cointegrated pairs"""
+
+    prices_df = generate_cointegrated_prices_df(number_of_tickers)
+    stage_results = []
+
+    with tempfile.TemporaryDirectory() as store_directory, _benchmark_environment(
+        store_directory
+    ):
+        stage_result, results_df = _time_stage(
+            "cointegration",
+            lambda: perform_multiple_cointegration_tests(
+                prices_df, BENCHMARK_MID_POINT_DATE
+            ),
+            number_of_tickers * (number_of_tickers - 1) // 2,
+        )
+        stage_results.append(stage_result)
+        number_cointegrated = len(results_df)
+        results_df = results_df.iloc[:max_pairs]
+        number_of_pairs = len(results_df)
+
+        stages = (
+            [
+                (
+                    "ols",
+                    lambda: [
+                        calculate_rolling_hedge_ratio_whole_set(
+                            results_df, prices_df, backtest_spread=backtest_spread
+                        )
+                        for backtest_spread in (False, True)
+                    ],
+                ),
+                (
+                    "kalman",
+                    lambda: calculate_rolling_hedge_ratio_whole_set_kalman(
+                        results_df, prices_df
+                    ),
+                ),
+                (
+                    "spreads",
+                    lambda: [
+                        create_rolling_hedge_ratio_scaled_spread_whole_set(
+                            results_df,
+                            prices_df,
+                            backtest_spread=backtest_spread,
+                            kalman=kalman,
+                        )
+                        for backtest_spread, kalman in [
+                            (False, False),
+                            (True, False),
+                            (True, True),
+                        ]
+                    ],  # kalman hedge ratios are only computed for the backtest period
+                ),
+            ]
+            + [
+                (
+                    stage_name,
+                    lambda column_name=column_name: spread_diagnostics_whole_set(
+                        results_df, column_names=[column_name]
+                    ),
+                )
+                for stage_name, column_name in [
+                    ("adf", "adf_result"),
+                    ("hurst", "hurst_exponent_results"),
+                    ("half_life", "half_life_results"),
+                ]
+            ]
+            + [
+                (
+                    "backtest",
+                    lambda: execute_trade_whole_set_batched(
+                        results_df,
+                        prices_df,
+                        *BENCHMARK_THRESHOLDS,
+                        kalman_spread=False,
+                    ),
+                ),
+                (
+                    "metrics",
+                    lambda: calculate_various_performance_metrics_whole_set(
+                        results_df, BENCHMARK_THRESHOLDS, kalman=False
+                    ),
+                ),
+            ]
+        )
+        for stage_name, run_stage in stages:
+            stage_result, _ = _time_stage(stage_name, run_stage, number_of_pairs)
+            stage_results.append(stage_result)
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "number_of_tickers": number_of_tickers,
+        "number_of_dates": len(prices_df),
+        "number_cointegrated_pairs": number_cointegrated,
+        "stages": stage_results,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_benchmark_history(
+    benchmark_runs: list[dict],
+    pathway: str = BENCHMARK_HISTORY_PATHWAY,
+) -> None:
+
+    benchmark_history = []
+    if os.path.exists(pathway):
+        with open(pathway) as history_file:
+            benchmark_history = json.load(history_file)
+
+    with open(pathway, "w") as history_file:
+        json.dump(benchmark_history + benchmark_runs, history_file, indent=2)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--universe_sizes", type=int, nargs="+", default=BENCHMARK_UNIVERSE_SIZES
+    )
+    parser.add_argument("--max_pairs", type=int, default=BENCHMARK_MAX_PAIRS)
+    parser.add_argument("--history", default=BENCHMARK_HISTORY_PATHWAY)
+    arguments = parser.parse_args()
+
+    benchmark_runs = []
+    for number_of_tickers in arguments.universe_sizes:
+        logging.disable(logging.INFO)  # stages log every pair
+        benchmark_runs.append(
+            benchmark_pipeline(number_of_tickers, arguments.max_pairs)
+        )
+        logging.disable(logging.NOTSET)
+        print(
+            f"\n{number_of_tickers} tickers, {benchmark_runs[-1]['number_cointegrated_pairs']} cointegrated pairs"
+        )
+        print(pd.DataFrame(benchmark_runs[-1]["stages"]).to_string(index=False))
+
+    append_benchmark_history(benchmark_runs, arguments.history)
@@ -0,0 +1,277 @@
+import numpy as np
+import pandas as pd
+
+from main.utilities.functions import (
+    generate_random_walk_series_for_random_backtest,
+)
+from main.utilities.series_store import (
+    get_series_store,
+)
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+)
+
+from main.model_building.backtesting.backtest import (
+    BackTest,
+)
+from main.model_building.backtesting.backtest_batch import (
+    backtest_pairs_batch,
+    pair_backtest_frames,
+    sweep_backtest_parameter_grid,
+)
+from main.model_building.backtesting.backtest_execution import (
+    execute_parameter_sweep_whole_set,
+    execute_trade_batch,
+)
+
+RANDOM_WALK_START_DATE = "2015-01-01"
+RANDOM_WALK_END_DATE = "2018-12-31"
+TICKERS_TO_TEST_WITH = ["AAA", "BBB", "CCC", "DDD"]
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("AAA", "CCC"), ("DDD", "BBB")]
+PAIR_WINDOWS = [
+    ("2015-01-01", "2018-12-31"),
+    ("2015-06-01", "2018-06-30"),
+    ("2016-01-01", "2018-12-31"),
+]
+BACKTEST_THRESHOLDS_TO_TEST = (1, 0.2, 3)
+BACKTEST_PARAMETER_GRID_TO_TEST = [(1, 0.2, 3), (2, 0.5, 6), (1.5, 0.1, 2.5)]
+
+
+def generate_batch_backtest_inputs() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    np.random.seed(11)
+    prices_df = pd.DataFrame(
+        {
+            ticker: generate_random_walk_series_for_random_backtest(
+                start_date=RANDOM_WALK_START_DATE,
+                end_date=RANDOM_WALK_END_DATE,
+                std_dev=1,
+            )["ticker1_prices"]
+            for ticker in TICKERS_TO_TEST_WITH
+        }
+    )
+
+    spread_series_list = []
+    for (first_ticker, second_ticker), (start_date, end_date) in zip(
+        PAIRS_TO_TEST_WITH, PAIR_WINDOWS
+    ):
+        dates = prices_df.loc[start_date:end_date].index
+        innovations = np.random.normal(0, 0.6, len(dates))
+        spread_values = np.zeros(len(dates))
+        for position in range(1, len(dates)):
+            spread_values[position] = (
+                0.9 * spread_values[position - 1] + innovations[position]
+            )
+        spread_series_list.append(
+            pd.Series(
+                spread_values, index=dates, name=f"{first_ticker}_{second_ticker}"
+            )
+        )
+
+    return prices_df, pd.concat(spread_series_list, axis=1)
+
+
+def run_reference_backtest(
+    mocker,
+    prices_df: pd.DataFrame,
+    standardised_spread: pd.Series,
+    first_ticker: str,
+    second_ticker: str,
+) -> BackTest:
+
+    mocker.patch(
+        "main.model_building.backtesting.backtest.pd.read_parquet",
+        side_effect=lambda pathway, columns: prices_df[columns].copy(),
+    )
+    mocker.patch(
+        "main.model_building.backtesting.backtest.retrieve_spread_table_from_sql_df",
+        side_effect=lambda row, spread_type, pathway: standardised_spread.to_frame(
+            spread_type
+        ),
+    )
+
+    backtest_obj = BackTest(
+        pd.Series({"first_ticker": first_ticker, "second_ticker": second_ticker}),
+        *BACKTEST_THRESHOLDS_TO_TEST,
+    )
+    backtest_obj.trade(test_inputs={})
+
+    return backtest_obj
+
+
+def test_backtest_pairs_batch_matches_backtest(mocker):
+
+    prices_df, standardised_spread_df = generate_batch_backtest_inputs()
+
+    backtest_results = backtest_pairs_batch(
+        prices_df,
+        standardised_spread_df,
+        PAIRS_TO_TEST_WITH,
+        *BACKTEST_THRESHOLDS_TO_TEST,
+    )
+
+    for column, (first_ticker, second_ticker) in enumerate(PAIRS_TO_TEST_WITH):
+        backtest_obj = run_reference_backtest(
+            mocker,
+            prices_df,
+            standardised_spread_df[f"{first_ticker}_{second_ticker}"].dropna(),
+            first_ticker,
+            second_ticker,
+        )
+        trade_history_frame, valuation_ledger = pair_backtest_frames(
+            backtest_results, column
+        )
+
+        assert len(trade_history_frame) > 0
+        assert (
+            trade_history_frame["closing_capital"].tolist()
+            == backtest_obj.trade_history_frame["closing_capital"].tolist()
+        )
+        assert trade_history_frame.astype(object).equals(
+            backtest_obj.trade_history_frame.astype(object)
+        )
+        assert valuation_ledger.index.equals(backtest_obj.regular_spread.index)
+        assert np.array_equal(
+            valuation_ledger["valuation"].to_numpy(),
+            backtest_obj.regular_spread["valuation"].to_numpy(dtype=float),
+        )
+
+
+def test_backtest_pairs_batch_reads_a_shared_price_matrix_like_prices_df():
+
+    prices_df, standardised_spread_df = generate_batch_backtest_inputs()
+    expected_results = backtest_pairs_batch(
+        prices_df,
+        standardised_spread_df,
+        PAIRS_TO_TEST_WITH,
+        *BACKTEST_THRESHOLDS_TO_TEST,
+    )
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        testing_results = backtest_pairs_batch(
+            shared_prices,
+            standardised_spread_df,
+            PAIRS_TO_TEST_WITH,
+            *BACKTEST_THRESHOLDS_TO_TEST,
+        )
+
+    np.testing.assert_array_equal(
+        testing_results["valuation"], expected_results["valuation"]
+    )
+    for field, values in expected_results["trades"].items():
+        np.testing.assert_array_equal(testing_results["trades"][field], values)
+
+
+def test_execute_trade_batch_reads_once_and_returns_records_for_each_pair(
+    mocker,
+    tmp_path,
+):
+
+    prices_df, standardised_spread_df = generate_batch_backtest_inputs()
+    testing_db_pathway = str(tmp_path / "spread_database_backtest.db")
+    series_store = get_series_store(testing_db_pathway)
+    for (first_ticker, second_ticker), pair_name in zip(
+        PAIRS_TO_TEST_WITH, standardised_spread_df.columns
+    ):
+        spread_series = standardised_spread_df[pair_name].dropna().rename_axis("Date")
+        series_store.write_series(
+            first_ticker, second_ticker, "standardised_spread", spread_series
+        )
+        series_store.write_series(
+            first_ticker, second_ticker, "regular_spread", spread_series * 10
+        )
+
+    mocker.patch(
+        "main.model_building.backtesting.backtest_execution.PATHWAY_TO_SQL_DB_SPREADS_BACKTEST",
+        testing_db_pathway,
+    )
+
+    results_df = pd.DataFrame(
+        PAIRS_TO_TEST_WITH + [("AAA", "DDD")],
+        columns=["first_ticker", "second_ticker"],
+    )
+    trade_history_records, regular_spread_records = execute_trade_batch(
+        results_df,
+        prices_df,
+        *BACKTEST_THRESHOLDS_TO_TEST,
+        kalman_spread=False,
+    )
+
+    assert len(trade_history_records) == len(PAIRS_TO_TEST_WITH)
+    assert len(regular_spread_records) == len(PAIRS_TO_TEST_WITH)
+    assert regular_spread_records[0].series_type == "1_0p2_3"
+    assert list(regular_spread_records[0].pandas_object.columns) == [
+        "AAA_BBB_regular_spread",
+        "valuation",
+        "status",
+    ]
+    assert regular_spread_records[0].pandas_object["valuation"].dtype == np.float32
+    assert regular_spread_records[0].pandas_object["status"].dtype == np.int8
+    assert not regular_spread_records[1].pandas_object["valuation"].isna().any()
+
+
+def test_sweep_backtest_parameter_grid_matches_individual_runs():
+
+    prices_df, standardised_spread_df = generate_batch_backtest_inputs()
+
+    sweep_results_df = sweep_backtest_parameter_grid(
+        prices_df,
+        standardised_spread_df,
+        PAIRS_TO_TEST_WITH,
+        BACKTEST_PARAMETER_GRID_TO_TEST,
+    )
+
+    assert len(sweep_results_df) == len(PAIRS_TO_TEST_WITH) * len(
+        BACKTEST_PARAMETER_GRID_TO_TEST
+    )
+    assert list(sweep_results_df.columns[:5]) == [
+        "first_ticker",
+        "second_ticker",
+        "spread_to_trigger_trade_entry",
+        "spread_to_trigger_trade_exit",
+        "spread_to_abandon_trade",
+    ]
+    assert not sweep_results_df.duplicated(list(sweep_results_df.columns[:5])).any()
+
+    for thresholds in BACKTEST_PARAMETER_GRID_TO_TEST:
+        backtest_results = backtest_pairs_batch(
+            prices_df,
+            standardised_spread_df,
+            PAIRS_TO_TEST_WITH,
+            *thresholds,
+        )
+        testing_rows = sweep_results_df[
+            (sweep_results_df["spread_to_trigger_trade_entry"] == thresholds[0])
+            & (sweep_results_df["spread_to_trigger_trade_exit"] == thresholds[1])
+            & (sweep_results_df["spread_to_abandon_trade"] == thresholds[2])
+        ]
+
+        assert testing_rows["closing_capital"].tolist() == list(
+            backtest_results["state"]["capital"]
+        )
+        for row, column in zip(
+            testing_rows.itertuples(), range(len(PAIRS_TO_TEST_WITH))
+        ):
+            trade_history_frame, _ = pair_backtest_frames(backtest_results, column)
+            assert row.number_of_trades == len(trade_history_frame)
+
+
+def test_execute_parameter_sweep_whole_set_without_results_returns_empty_table():
+
+    prices_df, _ = generate_batch_backtest_inputs()
+
+    testing_obj = execute_parameter_sweep_whole_set(
+        pd.DataFrame(columns=["first_ticker", "second_ticker"]),
+        prices_df,
+        BACKTEST_PARAMETER_GRID_TO_TEST,
+    )
+
+    assert testing_obj.empty
+    assert list(testing_obj.columns[:5]) == [
+        "first_ticker",
+        "second_ticker",
+        "spread_to_trigger_trade_entry",
+        "spread_to_trigger_trade_exit",
+        "spread_to_abandon_trade",
+    ]
+    assert "sharpe_ratio" in testing_obj.columns
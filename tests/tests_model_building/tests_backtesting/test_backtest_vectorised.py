@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from main.utilities.functions import (
+    generate_series_for_backtest_testing,
+    generate_random_walk_series_for_random_backtest,
+)
+
+from main.model_building.backtesting.backtest import (
+    BackTest,
+)
+from main.model_building.backtesting.backtest_vectorised import (
+    VectorisedBackTest,
+)
+
+TICKER_1_TO_TEST_WITH = "SYKN"
+TICKER_2_TO_TEST_WITH = "AFLN"
+RANDOM_WALK_START_DATE = "2015-01-01"
+RANDOM_WALK_END_DATE = "2018-12-31"
+RANDOM_WALK_STD_DEV = 1
+SPREAD_AUTOREGRESSIVE_COEFFICIENT = 0.9
+SPREAD_INNOVATION_STD_DEV = 0.6
+BACKTEST_THRESHOLDS_TO_TEST = [
+    (2, 0.5, 6),
+    (1, 0.2, 2.5),
+    (1.5, 0.1, 3),
+]
+RANDOM_SEEDS_TO_TEST = [0, 1, 2, 3]
+
+testing_row = pd.Series(
+    {
+        "first_ticker": TICKER_1_TO_TEST_WITH,
+        "second_ticker": TICKER_2_TO_TEST_WITH,
+    }
+)
+
+
+def generate_autoregressive_backtest_inputs(
+    seed: int,
+) -> dict:
+
+    np.random.seed(seed)
+    test_inputs = generate_random_walk_series_for_random_backtest(
+        start_date=RANDOM_WALK_START_DATE,
+        end_date=RANDOM_WALK_END_DATE,
+        std_dev=RANDOM_WALK_STD_DEV,
+    )
+    innovations = np.random.normal(
+        0, SPREAD_INNOVATION_STD_DEV, len(test_inputs["standardised_spread"])
+    )
+    spread_values = np.zeros(len(innovations))
+    for position in range(1, len(innovations)):
+        spread_values[position] = (
+            SPREAD_AUTOREGRESSIVE_COEFFICIENT * spread_values[position - 1]
+            + innovations[position]
+        )
+    spread_values[::97] = 0
+    test_inputs["standardised_spread"] = pd.Series(
+        spread_values, index=test_inputs["standardised_spread"].index
+    )
+
+    return test_inputs
+
+
+def mock_backtest_data_sources(
+    mocker,
+    test_inputs: dict,
+) -> None:
+
+    prices_df = pd.DataFrame(
+        {
+            TICKER_1_TO_TEST_WITH: test_inputs["ticker1_prices"],
+            TICKER_2_TO_TEST_WITH: test_inputs["ticker2_prices"],
+        }
+    )
+
+    def mocking_read_parquet_return_price_column(pathway, columns):
+        return prices_df[columns].copy()
+
+    def mocking_retrieve_spread_table_return_test_spread(row, spread_type, pathway):
+        if spread_type.startswith("_regular_spread"):
+            return (test_inputs["standardised_spread"] * 10).to_frame(
+                f"{TICKER_1_TO_TEST_WITH}_{TICKER_2_TO_TEST_WITH}{spread_type}"
+            )
+        return test_inputs["standardised_spread"].to_frame("standardised_spread")
+
+    mocker.patch(
+        "main.model_building.backtesting.backtest.pd.read_parquet",
+        side_effect=mocking_read_parquet_return_price_column,
+    )
+    mocker.patch(
+        "main.model_building.backtesting.backtest.retrieve_spread_table_from_sql_df",
+        side_effect=mocking_retrieve_spread_table_return_test_spread,
+    )
+    mocker.patch.object(
+        BackTest,
+        "_save_trade_trade_history_information_to_databases",
+        return_value=None,
+    )
+
+
+def run_both_backtests(
+    thresholds: tuple,
+) -> tuple[BackTest, VectorisedBackTest]:
+
+    backtests = []
+    for backtest_class in (BackTest, VectorisedBackTest):
+        backtest_obj = backtest_class(
+            testing_row,
+            spread_to_trigger_trade_entry=thresholds[0],
+            spread_to_trigger_trade_exit=thresholds[1],
+            spread_to_abandon_trade=thresholds[2],
+        )
+        backtest_obj.trade()
+        backtests.append(backtest_obj)
+
+    return tuple(backtests)
+
+
+def assert_backtests_identical(
+    backtest_obj: BackTest,
+    vectorised_backtest_obj: VectorisedBackTest,
+) -> None:
+
+    expected_frame = backtest_obj.trade_history_frame
+    testing_frame = vectorised_backtest_obj.trade_history_frame
+
+    assert testing_frame.shape == expected_frame.shape
+    assert list(testing_frame.columns) == list(expected_frame.columns)
+    assert testing_frame["closing_capital"].equals(expected_frame["closing_capital"])
+    assert testing_frame.astype(object).equals(expected_frame.astype(object))
+    assert list(vectorised_backtest_obj.regular_spread.columns) == list(
+        backtest_obj.regular_spread.columns
+    )
+    for column in BackTest.SPREAD_SERIES_VALUATION_AND_INFO_COLS:
+        assert np.array_equal(
+            vectorised_backtest_obj.regular_spread[column].to_numpy(dtype=float),
+            backtest_obj.regular_spread[column].to_numpy(dtype=float),
+            equal_nan=True,
+        )
+    assert vectorised_backtest_obj.capital == backtest_obj.capital
+
+
+@pytest.mark.parametrize("seed", RANDOM_SEEDS_TO_TEST)
+@pytest.mark.parametrize("thresholds", BACKTEST_THRESHOLDS_TO_TEST)
+def test_vectorised_backtest_parity_random_series(
+    mocker,
+    seed,
+    thresholds,
+):
+
+    mock_backtest_data_sources(mocker, generate_autoregressive_backtest_inputs(seed))
+
+    backtest_obj, vectorised_backtest_obj = run_both_backtests(thresholds)
+
+    assert len(backtest_obj.trade_history_frame) > 0
+    assert_backtests_identical(backtest_obj, vectorised_backtest_obj)
+
+
+@pytest.mark.parametrize(
+    "date_value_pairs",
+    [
+        (
+            ("2020-01-01", 0),
+            ("2020-01-31", 4),
+            ("2021-01-31", -4),
+            ("2022-01-31", 7),
+        ),
+        (
+            ("2020-01-01", 0),
+            ("2020-01-31", 3),
+            ("2021-01-30", -5),
+            ("2021-01-31", 7),
+            ("2021-03-30", 4.5),
+            ("2021-03-31", -5),
+            ("2021-08-31", 10),
+        ),
+        (
+            ("2020-01-01", 7),
+            ("2020-06-30", 0),
+        ),
+        (
+            ("2020-01-01", 0),
+            ("2020-01-31", -3),
+            ("2020-03-31", -2.5),
+        ),
+    ],
+)
+def test_vectorised_backtest_parity_scripted_series(
+    mocker,
+    date_value_pairs,
+):
+
+    mock_backtest_data_sources(
+        mocker, generate_series_for_backtest_testing(*date_value_pairs)
+    )
+
+    backtest_obj, vectorised_backtest_obj = run_both_backtests(
+        BACKTEST_THRESHOLDS_TO_TEST[0]
+    )
+
+    assert_backtests_identical(backtest_obj, vectorised_backtest_obj)
@@ -1,17 +1,29 @@
+import json
+import numpy as np
 import pandas as pd
+import pytest
 
 from main.utilities.functions import (
     generate_series_for_backtest_testing,
+    generate_random_walk_series_for_random_backtest,
 )
 
 from main.utilities.paths import PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF
 
+from main.model_building.backtesting.database_utils import (
+    compact_valuation_ledger,
+    expand_valuation_ledger,
+)
+
 from main.model_building.backtesting.backtest import (
     BackTest,
+    BackTestState,
+    TradeLog,
 )
 
 TICKER_1_TO_TEST_WITH = "SYKN"
 TICKER_2_TO_TEST_WITH = "AFLN"
+BACKTEST_THRESHOLDS_TO_TEST = [(2, 0.5, 6), (1, 0.2, 2.5)]
 
 
 def test_backtesting_one():
@@ -84,3 +96,161 @@ def test_backtesting_three():
     backtest_obj_three.trade()
     assert backtest_obj_three.trade_history_frame.shape == (2, 13)
     assert round(backtest_obj_three.trade_history_frame.iloc[-1, -2]) == 104077
+
+
+@pytest.mark.parametrize("thresholds", BACKTEST_THRESHOLDS_TO_TEST)
+def test_step_from_saved_state_matches_trade(
+    mocker,
+    thresholds,
+):
+
+    np.random.seed(4)
+    test_inputs = generate_random_walk_series_for_random_backtest(
+        start_date="2015-01-01",
+        end_date="2017-12-31",
+        std_dev=1,
+    )
+    spread_values = np.zeros(len(test_inputs["standardised_spread"]))
+    for position in range(1, len(spread_values)):
+        spread_values[position] = 0.9 * spread_values[position - 1] + np.random.normal(
+            0, 0.6
+        )
+    standardised_spread = pd.Series(
+        spread_values, index=test_inputs["standardised_spread"].index
+    )
+    prices_df = pd.DataFrame(
+        {
+            TICKER_1_TO_TEST_WITH: test_inputs["ticker1_prices"],
+            TICKER_2_TO_TEST_WITH: test_inputs["ticker2_prices"],
+        }
+    )
+    mocker.patch(
+        "main.model_building.backtesting.backtest.pd.read_parquet",
+        side_effect=lambda pathway, columns: prices_df[columns].copy(),
+    )
+    mocker.patch(
+        "main.model_building.backtesting.backtest.retrieve_spread_table_from_sql_df",
+        side_effect=lambda row, spread_type, pathway: standardised_spread.to_frame(
+            spread_type
+        ),
+    )
+    expected_obj = BackTest(
+        pd.Series(
+            {
+                "first_ticker": TICKER_1_TO_TEST_WITH,
+                "second_ticker": TICKER_2_TO_TEST_WITH,
+            }
+        ),
+        *thresholds,
+    )
+    expected_obj.trade(test_inputs={})
+
+    backtest_obj = BackTest.from_state(
+        BackTestState(TICKER_1_TO_TEST_WITH, TICKER_2_TO_TEST_WITH, *thresholds)
+    )
+    valuation_rows = []
+    trade_history_frames = []
+    for position, (date, spread) in enumerate(standardised_spread.items()):
+        if position == len(standardised_spread) // 2:
+            backtest_obj = BackTest.from_state(
+                BackTestState.from_dict(
+                    json.loads(json.dumps(backtest_obj.state().to_dict()))
+                )
+            )
+        valuation_row, trade_history_frame = backtest_obj.step(
+            date,
+            spread,
+            prices_df.loc[date, TICKER_1_TO_TEST_WITH],
+            prices_df.loc[date, TICKER_2_TO_TEST_WITH],
+            last_listing=position == len(standardised_spread) - 1,
+        )
+        valuation_rows.append(valuation_row)
+        trade_history_frames.append(trade_history_frame)
+
+    testing_frame = pd.concat(trade_history_frames)
+    assert len(testing_frame) > 0
+    assert testing_frame.astype(object).equals(
+        expected_obj.trade_history_frame.astype(object)
+    )
+    np.testing.assert_array_equal(
+        pd.DataFrame(valuation_rows)[
+            BackTest.SPREAD_SERIES_VALUATION_AND_INFO_COLS
+        ].to_numpy(dtype=float),
+        expected_obj.regular_spread[
+            BackTest.SPREAD_SERIES_VALUATION_AND_INFO_COLS
+        ].to_numpy(dtype=float),
+    )
+    assert backtest_obj.state() == expected_obj.state()
+
+
+def test_trade_log_grows_past_capacity_and_flags_opened_abandoned():
+
+    trade_log = TradeLog(TICKER_1_TO_TEST_WITH, TICKER_2_TO_TEST_WITH, capacity=1)
+    dates = pd.bdate_range("2020-01-01", periods=4)
+    for trade_counter in range(3):
+        trade_log.append(
+            trade_counter=trade_counter,
+            opening_date=dates[trade_counter],
+            closing_date=dates[trade_counter + 1],
+            position_ticker1=10,
+            opening_price_ticker1=1.5,
+            closing_price_ticker1=2.0,
+            position_ticker2=20,
+            opening_price_ticker2=3.0,
+            closing_price_ticker2=2.5,
+            days_trade_open=1,
+            short_ticker_is_ticker1=trade_counter % 2 == 0,
+            closing_capital=100_000.0 + trade_counter,
+            trade_abandoned=False,
+        )
+
+    testing_frame = trade_log.to_frame()
+
+    assert len(trade_log) == 3
+    assert list(testing_frame.columns) == BackTest.TRADE_DF_RECORD_COLUMNS_LIST
+    assert testing_frame["short_ticker"].tolist() == [
+        TICKER_1_TO_TEST_WITH,
+        TICKER_2_TO_TEST_WITH,
+        TICKER_1_TO_TEST_WITH,
+    ]
+    assert testing_frame["closing_capital"].dtype == np.float64
+    assert testing_frame["closing_date"].tolist() == list(dates[1:])
+
+    trade_log.opened_abandoned = True
+    testing_frame = trade_log.to_frame()
+
+    assert testing_frame.shape == (1, 14)
+    assert np.isnan(testing_frame.loc[0, "closing_capital"])
+    assert testing_frame.loc[0, "trade_abandoned"] == True
+    assert testing_frame.loc[0, "opened_abandoned"] == True
+
+
+def test_compact_valuation_ledger_round_trips_flags_and_last_listing():
+
+    dates = pd.bdate_range("2020-01-01", periods=5)
+    regular_spread = pd.DataFrame(
+        {
+            "AAA_BBB_regular_spread": np.arange(5, dtype=float),
+            "valuation": [np.nan, 100_000.0, 100_012.5, 99_990.25, 100_020.0],
+            "trade_open_bool": [np.nan, 0.0, 1.0, 1.0, 1.0],
+            "trade_abandoned_bool": [np.nan, 0.0, 0.0, 1.0, 0.0],
+        },
+        index=dates,
+    )
+    regular_spread["trade_abandoned"] = pd.Series(np.nan, index=dates, dtype=object)
+    regular_spread.loc[dates[-1], "trade_abandoned"] = "last_listing"
+
+    compacted_obj = compact_valuation_ledger(regular_spread)
+
+    assert list(compacted_obj.columns) == [
+        "AAA_BBB_regular_spread",
+        "valuation",
+        "status",
+    ]
+    assert compacted_obj["valuation"].dtype == np.float32
+    assert compacted_obj["status"].tolist() == [-1, 0, 1, 3, 5]
+
+    testing_obj = expand_valuation_ledger(compacted_obj)
+
+    pd.testing.assert_frame_equal(testing_obj, regular_spread)
+    assert expand_valuation_ledger(regular_spread) is regular_spread
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from main.utilities.paths import (
@@ -6,8 +7,16 @@ from main.utilities.paths import (
 
 from main.model_building.backtesting_analysis.equity_curves import (
     create_eq_curve,
+    create_grouped_eq_curves,
+    read_grouped_eq_curve,
 )
 
+PAIR_DATE_SPANS_TO_TEST_WITH = {
+    ("AAA", "BBB"): (0, 40),
+    ("CCC", "DDD"): (15, 60),
+    ("AAA", "DDD"): (5, 30),
+}
+
 
 def test_create_equity_curve():
 
@@ -21,3 +30,110 @@ def test_create_equity_curve():
 
     assert isinstance(testing_object_eq_curve, pd.Series)
     assert round(testing_object_eq_curve[-1], 0) == 213057
+
+
+def mock_valuation_series(
+    mocker,
+    dates: pd.DatetimeIndex,
+) -> dict[tuple[str, str, bool], pd.Series]:
+
+    rng = np.random.default_rng(24)
+    valuation_series = {}
+    for (first_ticker, second_ticker), (
+        start,
+        finish,
+    ) in PAIR_DATE_SPANS_TO_TEST_WITH.items():
+        for kalman in (False, True):
+            valuation_series[(first_ticker, second_ticker, kalman)] = pd.Series(
+                100_000 + rng.normal(scale=100, size=finish - start).cumsum(),
+                index=dates[start:finish],
+                name="valuation",
+            )
+    valuation_series[("AAA", "DDD", False)].iloc[10] = np.nan
+
+    mocker.patch(
+        "main.model_building.backtesting_analysis.equity_curves.CORES_TO_USE", 1
+    )
+    mocker.patch(
+        "main.model_building.backtesting_analysis.equity_curves.retrieve_backtest_equity_curve_spread_table_from_sql_df",
+        side_effect=lambda row, kalman: valuation_series[
+            (row["first_ticker"], row["second_ticker"], kalman)
+        ],
+    )
+
+    return valuation_series
+
+
+def test_create_equity_curve_matches_outer_concat_and_fill(
+    mocker,
+):
+
+    dates = pd.bdate_range("2020-01-01", periods=80, name="Date")
+    valuation_series = mock_valuation_series(mocker, dates)
+    results_df = pd.DataFrame(
+        list(PAIR_DATE_SPANS_TO_TEST_WITH),
+        columns=["first_ticker", "second_ticker"],
+    )
+
+    expected_obj = (
+        pd.concat(
+            [
+                valuation_series[pair + (False,)]
+                for pair in PAIR_DATE_SPANS_TO_TEST_WITH
+            ],
+            axis=1,
+            join="outer",
+        )
+        .bfill()
+        .ffill()
+        .sum(axis=1)
+    )
+    testing_obj = create_eq_curve(results_df, dates=dates, batch_size=2)
+
+    pd.testing.assert_series_equal(testing_obj, expected_obj, check_freq=False)
+
+
+def test_grouped_equity_curves_match_filtered_equity_curves(
+    mocker,
+    tmp_path,
+):
+
+    dates = pd.bdate_range("2020-01-01", periods=80, name="Date")
+    mock_valuation_series(mocker, dates)
+    results_df = pd.DataFrame(
+        list(PAIR_DATE_SPANS_TO_TEST_WITH),
+        columns=["first_ticker", "second_ticker"],
+    )
+    results_df["first_ticker_sector"] = ["Energy", "Utilities", "Energy"]
+    results_df["second_ticker_sector"] = ["Energy", "Energy", np.nan]
+    results_df["tickers_sectors_concat"] = (
+        results_df["first_ticker_sector"] + "_" + results_df["second_ticker_sector"]
+    )
+    pathway = str(tmp_path / "grouped_equity_curves.parquet")
+
+    create_grouped_eq_curves(results_df, dates=dates, batch_size=2, pathway=pathway)
+
+    for kalman in (False, True):
+        pd.testing.assert_series_equal(
+            read_grouped_eq_curve(kalman=kalman, pathway=pathway),
+            create_eq_curve(results_df, kalman=kalman, dates=dates),
+            check_names=False,
+            check_freq=False,
+        )
+        for sector_filter, grouping, group in [
+            ({"first_ticker_sector": "Energy"}, "first_ticker_sector", "Energy"),
+            ({"second_ticker_sector": "Energy"}, "second_ticker_sector", "Energy"),
+            (
+                {"combined_tickers_sectors": "Utilities_Energy"},
+                "tickers_sectors_concat",
+                "Utilities_Energy",
+            ),
+        ]:
+            pd.testing.assert_series_equal(
+                read_grouped_eq_curve(grouping, group, kalman, pathway=pathway),
+                create_eq_curve(
+                    results_df, kalman=kalman, dates=dates, **sector_filter
+                ),
+                check_names=False,
+                check_freq=False,
+            )
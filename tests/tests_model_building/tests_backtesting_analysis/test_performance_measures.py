@@ -1,4 +1,6 @@
+import numpy as np
 import pandas as pd
+import pytest
 
 from main.utilities.paths import (
     PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
@@ -8,8 +10,13 @@ from main.utilities.config import (
     PRESENT_BACKTEST_PARAMS,
 )
 
+from main.utilities.constants import (
+    TRADE_STARTED_ABANDONED_STRING,
+)
+
 from main.model_building.backtesting_analysis.performance_measures import (
     _calculate_various_performance_metrics_single,
+    _create_trade_pnl_list,
 )
 
 
@@ -25,8 +32,83 @@ def test_calculate_various_performance_metrics():
 
     testing_object_calc_metrics = _calculate_various_performance_metrics_single(
         row=testing_row,
-        backtest_params=PRESENT_BACKTEST_PARAMS,
+        backtest_parameters=PRESENT_BACKTEST_PARAMS,
     )
 
     assert all(item != 0 for item in testing_object_calc_metrics)
     assert round(testing_object_calc_metrics[0], 3) == 0.047
+
+
+@pytest.mark.parametrize(
+    "backtest_result_df, expected",
+    [
+        (
+            pd.DataFrame(
+                {
+                    "closing_capital": [100_500.0, 100_200.0],
+                    "opened_abandoned": [False, False],
+                }
+            ),
+            [500.0, -300.0],
+        ),
+        (
+            pd.DataFrame(
+                {"closing_capital": [np.nan], "opened_abandoned": [True]},
+            ),
+            TRADE_STARTED_ABANDONED_STRING,
+        ),
+        (
+            pd.DataFrame({"closing_capital": [100_500.0, 100_200.0]}),
+            [500.0, -300.0],
+        ),
+        (
+            pd.DataFrame(
+                {"closing_capital": [TRADE_STARTED_ABANDONED_STRING]}, dtype=object
+            ),
+            TRADE_STARTED_ABANDONED_STRING,
+        ),
+    ],
+)
+def test_create_trade_pnl_list_reads_current_and_legacy_histories(
+    mocker,
+    backtest_result_df,
+    expected,
+):
+
+    mocker.patch(
+        "main.model_building.backtesting_analysis.performance_measures.get_table_from_backtest_results_dfs",
+        return_value=backtest_result_df,
+    )
+
+    testing_obj = _create_trade_pnl_list(
+        row=pd.Series({"first_ticker": "AAA", "second_ticker": "BBB"}),
+        backtest_parameters=PRESENT_BACKTEST_PARAMS,
+    )
+
+    if isinstance(expected, str):
+        assert testing_obj == expected
+    else:
+        assert testing_obj.tolist() == expected
+
+
+def test_calculate_various_performance_metrics_reads_the_kalman_ledger_and_history(
+    mocker,
+):
+
+    mocked_equity_curve = mocker.patch(
+        "main.model_building.backtesting_analysis.performance_measures.retrieve_backtest_equity_curve_spread_table_from_sql_df",
+        return_value=pd.Series([100_000.0, 100_500.0, 100_200.0]),
+    )
+    mocked_trade_history = mocker.patch(
+        "main.model_building.backtesting_analysis.performance_measures.get_table_from_backtest_results_dfs",
+        return_value=pd.DataFrame({"closing_capital": [100_500.0, 100_200.0]}),
+    )
+
+    _calculate_various_performance_metrics_single(
+        row=pd.Series({"first_ticker": "AAA", "second_ticker": "BBB"}),
+        backtest_parameters=PRESENT_BACKTEST_PARAMS,
+        kalman=True,
+    )
+
+    assert mocked_equity_curve.call_args.kwargs["kalman"] is True
+    assert mocked_trade_history.call_args.kwargs["kalman"] is True
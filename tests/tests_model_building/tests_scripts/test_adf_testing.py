@@ -1,6 +1,12 @@
+import numpy as np
 import pandas as pd
+import pytest
+from statsmodels.tsa.stattools import adfuller
 
-from main.model_building.scripts.adf_testing import perform_adf_whole_set
+from main.model_building.scripts.adf_testing import (
+    perform_adf_whole_set,
+    batched_adf_p_values,
+)
 
 from main.utilities.paths import (
     PATHWAY_TO_COINTEGRATION_AND_RESULTS_DF,
@@ -8,6 +14,9 @@ from main.utilities.paths import (
 
 FIRST_LIST_ELEMENT_ADF_TESTING = 0
 TICKER_TO_TEST_WITH = "XRXOQ"
+NUMBER_OF_SPREADS = 30
+NUMBER_OF_DATES = 1_200
+LENGTHS_TO_TEST_WITH = [300, 800, 1_200]
 
 
 def test_perform_adf_whole_set():
@@ -17,3 +26,42 @@ def test_perform_adf_whole_set():
 
     testing_obj = perform_adf_whole_set(row)[FIRST_LIST_ELEMENT_ADF_TESTING]
     assert round(testing_obj, 3) == 0.003
+
+
+def generate_testing_spread_matrix() -> np.ndarray:
+
+    rng = np.random.default_rng(14)
+    spread_matrix = np.full((NUMBER_OF_DATES, NUMBER_OF_SPREADS), np.nan)
+    for spread_number in range(NUMBER_OF_SPREADS):
+        length = LENGTHS_TO_TEST_WITH[spread_number % len(LENGTHS_TO_TEST_WITH)]
+        start = int(rng.integers(0, NUMBER_OF_DATES - length + 1))
+        persistence = rng.uniform(0.8, 1.0)
+        spread_values = np.zeros(length)
+        for position in range(1, length):
+            spread_values[position] = (
+                persistence * spread_values[position - 1] + rng.normal()
+            )
+        spread_matrix[start : start + length, spread_number] = spread_values + 5
+    spread_matrix[:, 0] = np.nan
+    spread_matrix[100:400, 0] = rng.normal(size=300)
+    spread_matrix[200, 0] = np.nan
+
+    return spread_matrix
+
+
+@pytest.mark.parametrize("maxlag, autolag", [(None, "aic"), (4, None)])
+def test_batched_adf_p_values_matches_adfuller(maxlag, autolag):
+
+    spread_matrix = generate_testing_spread_matrix()
+
+    testing_obj = batched_adf_p_values(spread_matrix, maxlag=maxlag, autolag=autolag)
+
+    for spread_number in range(1, NUMBER_OF_SPREADS):
+        spread_values = spread_matrix[:, spread_number]
+        expected_obj = adfuller(
+            spread_values[~np.isnan(spread_values)],
+            maxlag=maxlag,
+            autolag="AIC" if autolag == "aic" else autolag,
+        )[1]
+        np.testing.assert_allclose(testing_obj[spread_number], expected_obj, rtol=1e-8)
+    assert np.isnan(testing_obj[0])
@@ -0,0 +1,120 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+from statsmodels.tsa.stattools import adfuller
+from statsmodels.tsa.adfvalues import mackinnonp
+
+from main.model_building.scripts.batched_adf import (
+    batched_adf_statistics,
+    mackinnon_p_values,
+)
+import main.model_building.scripts.cointegration_testing as cointegration_testing
+
+NUMBER_OF_OBSERVATIONS = 600
+NUMBER_OF_SERIES = 12
+NUMBER_OF_TICKERS = 8
+TICKER_FIRST_VALID_POSITIONS = [0, 0, 0, 150, 150, 300, 0, 40]
+TICKER_LAST_VALID_POSITIONS = [None, None, -60, None, None, None, -200, None]
+
+
+def generate_testing_series_matrix() -> np.ndarray:
+
+    rng = np.random.default_rng(3)
+    innovations = rng.normal(size=(NUMBER_OF_OBSERVATIONS, NUMBER_OF_SERIES))
+    series_matrix = np.cumsum(innovations, axis=0)
+    for position in range(1, NUMBER_OF_OBSERVATIONS):
+        series_matrix[position, ::2] = (
+            0.7 * series_matrix[position - 1, ::2] + innovations[position, ::2]
+        )
+
+    return series_matrix
+
+
+def generate_testing_prices_df() -> pd.DataFrame:
+
+    rng = np.random.default_rng(5)
+    dates = pd.bdate_range("2005-01-01", "2016-01-01")
+    common_trend = np.cumsum(rng.normal(size=len(dates)))
+    prices_df = pd.DataFrame(
+        {
+            f"T{ticker_number}": 100
+            + common_trend * rng.uniform(0.5, 2)
+            + np.cumsum(rng.normal(scale=0.3 + ticker_number % 3, size=len(dates)))
+            for ticker_number in range(NUMBER_OF_TICKERS)
+        },
+        index=dates,
+    )
+    for ticker, first_position, last_position in zip(
+        prices_df.columns, TICKER_FIRST_VALID_POSITIONS, TICKER_LAST_VALID_POSITIONS
+    ):
+        prices_df.loc[prices_df.index[:first_position], ticker] = np.nan
+        if last_position is not None:
+            prices_df.loc[prices_df.index[last_position:], ticker] = np.nan
+
+    return prices_df
+
+
+@pytest.mark.parametrize("regression", ["n", "c"])
+@pytest.mark.parametrize("autolag", ["aic", None])
+def test_batched_adf_statistics_matches_adfuller(regression, autolag):
+
+    series_matrix = generate_testing_series_matrix()
+
+    test_statistics, used_lags = batched_adf_statistics(
+        series_matrix, regression=regression, autolag=autolag
+    )
+
+    for column in range(NUMBER_OF_SERIES):
+        adf_results = adfuller(
+            series_matrix[:, column],
+            regression=regression,
+            autolag="AIC" if autolag else None,
+        )
+        assert used_lags[column] == adf_results[2]
+        assert test_statistics[column] == pytest.approx(adf_results[0], rel=1e-9)
+        assert mackinnon_p_values(test_statistics[column], regression) == pytest.approx(
+            adf_results[1], abs=1e-10
+        )
+
+
+def test_mackinnon_p_values_matches_mackinnonp():
+
+    test_statistics = np.array([-30.0, -4.5, -3.2, -2.0, 0.5, 3.0, np.nan])
+
+    testing_obj = mackinnon_p_values(test_statistics, "c", number_of_series=2)
+
+    assert np.isnan(testing_obj[-1])
+    assert testing_obj[:-1] == pytest.approx(
+        [mackinnonp(statistic, "c", N=2) for statistic in test_statistics[:-1]]
+    )
+
+
+def test_perform_multiple_cointegration_tests_batched_matches_per_pair(mocker):
+
+    mocker.patch.object(cointegration_testing, "ENGLE_COINT_P_VALUE_THRESHOLD", 1.0)
+    prices_df = generate_testing_prices_df()
+
+    testing_obj = cointegration_testing.perform_multiple_cointegration_tests(
+        prices_df, batched=True
+    )
+    expected_obj = pd.concat(
+        [
+            cointegration_testing._process_pair(
+                ticker_pair, prices_df, cointegration_testing.TRADING_DATE_MID_POINT
+            )
+            for ticker_pair in combinations(prices_df.columns, 2)
+        ]
+    ).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(
+        testing_obj.drop(columns="engle_test_training"),
+        expected_obj.drop(columns="engle_test_training"),
+    )
+    assert np.allclose(
+        testing_obj["engle_test_training"],
+        expected_obj["engle_test_training"],
+        rtol=0,
+        atol=1e-10,
+    )
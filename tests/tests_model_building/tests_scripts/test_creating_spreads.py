@@ -12,14 +12,6 @@ from main.utilities.paths import (
 TICKER_TO_TEST_WITH = "XRXOQ"
 
 
-def mocking_create_db_engine_to_return_none(args):
-    return None
-
-
-def mocking_save_spread_series_to_database_to_return_none(*args):
-    return None
-
-
 def test_process_row_both_spread(mocker):
 
     testing_prices_df = pd.read_parquet(PATHWAY_TO_PRICE_DF)
@@ -30,16 +22,6 @@ def test_process_row_both_spread(mocker):
         .squeeze()
     )
 
-    mocker.patch(
-        "main.model_building.scripts.creating_spreads._save_spread_series_to_database",
-        side_effect=mocking_save_spread_series_to_database_to_return_none,
-    )
-
-    mocker.patch(
-        "main.model_building.scripts.creating_spreads.custom_create_db_engine",
-        side_effect=mocking_create_db_engine_to_return_none,
-    )
-
     testing_obj = _process_row_both_spread(row, testing_prices_df)
     testing_obj_standardised = testing_obj[1]
 
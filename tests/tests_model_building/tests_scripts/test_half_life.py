@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from main.utilities.paths import (
@@ -5,11 +6,15 @@ from main.utilities.paths import (
 )
 from main.model_building.scripts.half_life import (
     half_life_ornstein_whole_set,
+    perform_half_life_ornstein_single,
+    batched_half_life_ornstein,
 )
 
 TICKER_1_TO_TEST_WITH = "XRXOQ"
 TICKER_2_TO_TEST_WITH = "PBIN"
 XRXOQ_PBIN_HALF_LIFE = 52
+NUMBER_OF_SPREADS = 40
+NUMBER_OF_DATES = 1_500
 
 
 def test_half_life_ornstein_whole_set():
@@ -22,3 +27,33 @@ def test_half_life_ornstein_whole_set():
 
     testing_obj = half_life_ornstein_whole_set(row)
     assert round(testing_obj[0], 0) == XRXOQ_PBIN_HALF_LIFE
+
+
+def test_batched_half_life_ornstein_matches_single():
+
+    rng = np.random.default_rng(13)
+    spread_matrix = np.full((NUMBER_OF_DATES, NUMBER_OF_SPREADS), np.nan)
+    for spread_number in range(NUMBER_OF_SPREADS):
+        length = int(rng.integers(50, NUMBER_OF_DATES))
+        start = int(rng.integers(0, NUMBER_OF_DATES - length + 1))
+        persistence = rng.uniform(0.5, 0.99)
+        spread_values = np.zeros(length)
+        for position in range(1, length):
+            spread_values[position] = (
+                persistence * spread_values[position - 1] + rng.normal()
+            )
+        spread_matrix[
+            start : start + length, spread_number
+        ] = spread_values + rng.uniform(-50, 50)
+
+    testing_obj = batched_half_life_ornstein(spread_matrix)
+
+    for spread_number in range(NUMBER_OF_SPREADS):
+        spread_values = spread_matrix[:, spread_number]
+        expected_obj = perform_half_life_ornstein_single(
+            pd.Series(dtype=object),
+            spread_series_from_rolling=pd.DataFrame(
+                spread_values[~np.isnan(spread_values)]
+            ),
+        )
+        np.testing.assert_allclose(testing_obj[spread_number], expected_obj, rtol=1e-10)
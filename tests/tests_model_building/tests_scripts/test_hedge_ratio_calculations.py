@@ -1,8 +1,14 @@
 import numpy as np
 import pandas as pd
+from statsmodels.regression.rolling import RollingOLS
 
 from main.model_building.scripts.hedge_ratio_calculations import (
     _process_row_rolling_hedge_ratio,
+    calculate_rolling_hedge_ratios_batched,
+    rolling_beta_without_constant,
+)
+from main.utilities.constants import (
+    LENGTH_OF_ROLLING_HEDGE_RATIO,
 )
 
 from main.utilities.paths import (
@@ -13,20 +19,6 @@ from main.utilities.paths import (
 LENGTH_OF_EXPECTED_SERIES = 1337
 
 
-def mocking_function_replace_save_to_database_instead_return_object(
-    hedge_ratio_series,
-    table_name,
-    engine,
-):
-    return None
-
-
-def mocking_function_create_db_engine(
-    args,
-):
-    return None
-
-
 def test_calculate_rolling_hedge_ratio_whole_set(
     mocker,
 ):
@@ -35,16 +27,6 @@ def test_calculate_rolling_hedge_ratio_whole_set(
     testing_results_df = pd.read_parquet(PATHWAY_TO_TESTING_RESULTS_DF)
     row = testing_results_df.iloc[0]
 
-    mocker.patch(
-        "main.model_building.scripts.hedge_ratio_calculations._save_to_database",
-        side_effect=mocking_function_replace_save_to_database_instead_return_object,
-    )
-
-    mocker.patch(
-        "main.model_building.scripts.hedge_ratio_calculations.custom_create_db_engine",
-        side_effect=mocking_function_create_db_engine,
-    )
-
     testing_obj = _process_row_rolling_hedge_ratio(
         row,
         testing_prices_df,
@@ -53,3 +35,76 @@ def test_calculate_rolling_hedge_ratio_whole_set(
     assert len(testing_obj) == LENGTH_OF_EXPECTED_SERIES
     assert testing_obj.name == "ACN"
     assert testing_obj.dtype == np.dtype("float64")
+
+
+def generate_testing_prices_and_results_df() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    rng = np.random.default_rng(4)
+    dates = pd.bdate_range("2008-01-01", "2016-01-01", name="Date")
+    prices_df = pd.DataFrame(
+        np.abs(100 + np.cumsum(rng.normal(size=(len(dates), 4)), axis=0)) + 1,
+        index=dates,
+        columns=["AAA", "BBB", "CCC", "DDD"],
+    )
+    prices_df.iloc[:300, 2] = np.nan
+    prices_df.iloc[1_000:1_010, 3] = np.nan
+    results_df = pd.DataFrame(
+        {
+            "first_ticker": ["AAA", "AAA", "BBB", "AAA"],
+            "second_ticker": ["BBB", "CCC", "DDD", "DDD"],
+            "pair_start_date": pd.to_datetime(
+                ["2008-01-01", "2009-03-02", "2008-01-01", "2013-01-01"]
+            ),
+            "trading_period_mid_point_date": pd.Timestamp("2013-06-01"),
+            "pair_finish_date": pd.to_datetime(
+                ["2016-01-01", "2016-01-01", "2015-06-01", "2013-09-01"]
+            ),
+        }
+    )
+
+    return prices_df, results_df
+
+
+def test_rolling_beta_without_constant_matches_rolling_ols():
+
+    prices_df, _ = generate_testing_prices_and_results_df()
+
+    testing_obj = rolling_beta_without_constant(
+        prices_df[["AAA", "AAA"]].to_numpy(),
+        prices_df[["CCC", "DDD"]].to_numpy(),
+    )
+
+    for column, exog_ticker in enumerate(["CCC", "DDD"]):
+        expected_obj = (
+            RollingOLS(
+                prices_df["AAA"],
+                prices_df[exog_ticker],
+                window=LENGTH_OF_ROLLING_HEDGE_RATIO,
+            )
+            .fit()
+            .params[exog_ticker]
+            .to_numpy()
+        )
+        assert np.array_equal(np.isnan(testing_obj[:, column]), np.isnan(expected_obj))
+        assert np.nanmax(np.abs(testing_obj[:, column] - expected_obj)) < 1e-10
+
+
+def test_calculate_rolling_hedge_ratios_batched_matches_single_pairs():
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+
+    for backtest_spread in (False, True):
+        testing_obj = calculate_rolling_hedge_ratios_batched(
+            results_df, prices_df, backtest_spread
+        )
+
+        for (_, row), hedge_ratio_series in zip(results_df.iterrows(), testing_obj):
+            expected_obj = _process_row_rolling_hedge_ratio(
+                row, prices_df, backtest_spread
+            )
+            if expected_obj is None:
+                assert hedge_ratio_series is None
+                continue
+            pd.testing.assert_frame_equal(
+                hedge_ratio_series, expected_obj, rtol=0, atol=1e-10
+            )
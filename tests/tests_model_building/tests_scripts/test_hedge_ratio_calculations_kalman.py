@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    _calculate_single_rolling_hedge_ratio_kalman,
+    _process_row_rolling_hedge_ratio_kalman,
+    calculate_rolling_hedge_ratios_kalman_batched,
+)
+
+PROCESS_NOISES_TO_TEST_WITH = [0.0001, 0.001, 0.01, 0.0001]
+MEASUREMENT_NOISES_TO_TEST_WITH = [1.99, 0.5, 3.0, 1.99]
+
+
+def generate_testing_prices_and_results_df() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    rng = np.random.default_rng(6)
+    dates = pd.bdate_range("2010-01-01", "2016-01-01", name="Date")
+    prices_df = pd.DataFrame(
+        np.abs(100 + np.cumsum(rng.normal(size=(len(dates), 4)), axis=0)) + 1,
+        index=dates,
+        columns=["AAA", "BBB", "CCC", "DDD"],
+    )
+    prices_df.iloc[-200:, 2] = np.nan
+    prices_df.iloc[900:905, 0] = np.nan
+    results_df = pd.DataFrame(
+        {
+            "first_ticker": ["AAA", "AAA", "BBB", "DDD"],
+            "second_ticker": ["BBB", "CCC", "DDD", "CCC"],
+            "trading_period_mid_point_date": pd.to_datetime(
+                ["2013-06-01", "2013-06-01", "2014-02-03", "2013-06-01"]
+            ),
+            "pair_finish_date": pd.to_datetime(
+                ["2016-01-01", "2016-01-01", "2015-06-01", "2014-01-01"]
+            ),
+        }
+    )
+
+    return prices_df, results_df
+
+
+def test_calculate_rolling_hedge_ratios_kalman_batched_matches_loop_exactly():
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+
+    testing_obj = calculate_rolling_hedge_ratios_kalman_batched(results_df, prices_df)
+
+    for (_, row), hedge_ratio_series in zip(results_df.iterrows(), testing_obj):
+        expected_obj = _process_row_rolling_hedge_ratio_kalman(row, prices_df)
+        pd.testing.assert_series_equal(
+            hedge_ratio_series, expected_obj, check_exact=True, check_freq=False
+        )
+
+
+def test_calculate_rolling_hedge_ratios_kalman_batched_with_noise_per_pair():
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+
+    testing_obj = calculate_rolling_hedge_ratios_kalman_batched(
+        results_df,
+        prices_df,
+        process_noise=np.array(PROCESS_NOISES_TO_TEST_WITH),
+        measurement_noise=np.array(MEASUREMENT_NOISES_TO_TEST_WITH),
+    )
+
+    for (_, row), hedge_ratio_series, process_noise, measurement_noise in zip(
+        results_df.iterrows(),
+        testing_obj,
+        PROCESS_NOISES_TO_TEST_WITH,
+        MEASUREMENT_NOISES_TO_TEST_WITH,
+    ):
+        expected_obj = _calculate_single_rolling_hedge_ratio_kalman(
+            ticker1=row["first_ticker"],
+            ticker2=row["second_ticker"],
+            start_date=row["trading_period_mid_point_date"],
+            end_date=row["pair_finish_date"],
+            prices_df=prices_df,
+            process_noise=process_noise,
+            measurement_noise=measurement_noise,
+        )
+        pd.testing.assert_series_equal(
+            hedge_ratio_series, expected_obj, check_exact=True, check_freq=False
+        )
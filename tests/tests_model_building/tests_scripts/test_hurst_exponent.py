@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 from main.utilities.paths import (
@@ -5,10 +6,14 @@ from main.utilities.paths import (
 )
 from main.model_building.scripts.hurst_exponent import (
     hurst_exponent_whole_set,
+    perform_hurst_exponent_single,
+    batched_hurst_exponents,
 )
 
 TICKER_1_TO_TEST_WITH = "XRXOQ"
 TICKER_2_TO_TEST_WITH = "PBIN"
+NUMBER_OF_SPREADS = 40
+NUMBER_OF_DATES = 1_500
 
 
 def test_hurst_exponent_whole_set():
@@ -21,3 +26,35 @@ def test_hurst_exponent_whole_set():
 
     testing_obj = hurst_exponent_whole_set(row)
     assert round(testing_obj[0], 4) == 0.3995
+
+
+def test_batched_hurst_exponents_matches_single():
+
+    rng = np.random.default_rng(12)
+    spread_matrix = np.full((NUMBER_OF_DATES, NUMBER_OF_SPREADS), np.nan)
+    for spread_number in range(NUMBER_OF_SPREADS):
+        length = int(rng.integers(200, NUMBER_OF_DATES))
+        start = int(rng.integers(0, NUMBER_OF_DATES - length + 1))
+        persistence = rng.uniform(0.5, 1.0)
+        spread_values = np.zeros(length)
+        for position in range(1, length):
+            spread_values[position] = (
+                persistence * spread_values[position - 1] + rng.normal()
+            )
+        spread_matrix[
+            start : start + length, spread_number
+        ] = spread_values + rng.uniform(-50, 50)
+    spread_matrix[700, 0] = np.nan
+
+    testing_obj = batched_hurst_exponents(spread_matrix)
+
+    assert np.isnan(testing_obj[0])
+    for spread_number in range(1, NUMBER_OF_SPREADS):
+        spread_values = spread_matrix[:, spread_number]
+        expected_obj = perform_hurst_exponent_single(
+            pd.Series(dtype=object),
+            spread_series_from_rolling=pd.DataFrame(
+                spread_values[~np.isnan(spread_values)]
+            ),
+        )
+        assert abs(testing_obj[spread_number] - expected_obj) < 1e-10
@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+
+from main.model_building.scripts.hedge_ratio_calculations import (
+    calculate_rolling_hedge_ratios_batched,
+)
+from main.model_building.scripts.hedge_ratio_calculations_kalman import (
+    calculate_rolling_hedge_ratios_kalman_batched,
+)
+from main.model_building.backtesting.backtest_batch import (
+    backtest_pairs_batch,
+)
+from main.model_building.scripts.incremental_update import (
+    append_new_prices,
+    advance_incremental_state,
+    build_incremental_state,
+)
+
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("CCC", "DDD")]
+NUMBER_OF_DATES = 900
+NUMBER_OF_NEW_DATES = 60
+BACKTEST_THRESHOLDS_TO_TEST = (1, 0.2, 3)
+
+
+def generate_testing_prices_and_results_df() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    rng = np.random.default_rng(15)
+    dates = pd.bdate_range(
+        "2010-01-01", periods=NUMBER_OF_DATES + NUMBER_OF_NEW_DATES, name="Date"
+    )
+    common_walks = 100 + np.cumsum(rng.normal(size=(len(dates), 2)), axis=0)
+    prices_df = pd.DataFrame(
+        np.repeat(common_walks, 2, axis=1) * [1.0, 0.5, 1.0, 2.0]
+        + rng.normal(scale=0.5, size=(len(dates), 4)),
+        index=dates,
+        columns=["AAA", "BBB", "CCC", "DDD"],
+    )
+    results_df = pd.DataFrame(
+        {
+            "first_ticker": [pair[0] for pair in PAIRS_TO_TEST_WITH],
+            "second_ticker": [pair[1] for pair in PAIRS_TO_TEST_WITH],
+            "trading_period_mid_point_date": dates[300],
+            "pair_finish_date": dates[NUMBER_OF_DATES - 1],
+        }
+    )
+
+    return prices_df, results_df
+
+
+def pipeline_series(
+    results_df: pd.DataFrame,
+    prices_df: pd.DataFrame,
+) -> dict[str, pd.DataFrame]:
+
+    """The backtest hedge ratios and spreads the full pipeline computes, as wide frames"""
+
+    series = {
+        "hedge_ratio": pd.concat(
+            [
+                hedge_ratio_series.squeeze(axis=1)
+                for hedge_ratio_series in calculate_rolling_hedge_ratios_batched(
+                    results_df, prices_df, backtest_spread=True
+                )
+            ],
+            axis=1,
+        ),
+        "hedge_ratio_kalman": pd.concat(
+            calculate_rolling_hedge_ratios_kalman_batched(results_df, prices_df),
+            axis=1,
+        ),
+    }
+    for suffix in ["", "_kalman"]:
+        series[f"hedge_ratio{suffix}"].columns = [
+            f"{first_ticker}_{second_ticker}"
+            for first_ticker, second_ticker in PAIRS_TO_TEST_WITH
+        ]
+        regular_spread_df = pd.DataFrame(
+            {
+                f"{first_ticker}_{second_ticker}": prices_df[first_ticker]
+                - prices_df[second_ticker]
+                * series[f"hedge_ratio{suffix}"][f"{first_ticker}_{second_ticker}"]
+                for first_ticker, second_ticker in PAIRS_TO_TEST_WITH
+            }
+        ).dropna()
+        series[f"regular_spread{suffix}"] = regular_spread_df
+        series[f"standardised_spread{suffix}"] = (
+            regular_spread_df - regular_spread_df.mean()
+        ) / regular_spread_df.std()
+
+    return series
+
+
+def test_advance_incremental_state_matches_full_recomputation():
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+    old_prices_df = prices_df.iloc[:NUMBER_OF_DATES]
+    old_series = pipeline_series(results_df, old_prices_df)
+    state_df, _ = build_incremental_state(
+        results_df,
+        old_prices_df,
+        old_series["standardised_spread"],
+        old_series["regular_spread"],
+        old_series["regular_spread_kalman"],
+        old_series["hedge_ratio_kalman"],
+        *BACKTEST_THRESHOLDS_TO_TEST,
+    )
+
+    (
+        testing_state_df,
+        testing_series,
+        testing_backtest_results,
+    ) = advance_incremental_state(state_df, prices_df, NUMBER_OF_DATES)
+
+    full_series = pipeline_series(
+        results_df.assign(pair_finish_date=prices_df.index[-1]), prices_df
+    )
+    new_dates = prices_df.index[NUMBER_OF_DATES:]
+    pd.testing.assert_frame_equal(
+        testing_series["hedge_ratio_kalman"],
+        full_series["hedge_ratio_kalman"].loc[new_dates],
+        check_exact=True,
+        check_freq=False,
+    )
+    for series_key in ["hedge_ratio", "regular_spread", "regular_spread_kalman"]:
+        pd.testing.assert_frame_equal(
+            testing_series[series_key],
+            full_series[series_key].loc[new_dates],
+            check_exact=False,
+            rtol=1e-9,
+            check_freq=False,
+        )
+    for suffix in ["", "_kalman"]:
+        regular_spread_df = full_series[f"regular_spread{suffix}"]
+        pd.testing.assert_frame_equal(
+            testing_series[f"standardised_spread{suffix}"],
+            (
+                (regular_spread_df - regular_spread_df.expanding().mean())
+                / regular_spread_df.expanding().std()
+            ).loc[new_dates],
+            check_exact=False,
+            rtol=1e-9,
+            check_freq=False,
+        )
+
+    expected_backtest_results = backtest_pairs_batch(
+        prices_df,
+        pd.concat(
+            [old_series["standardised_spread"], testing_series["standardised_spread"]]
+        ),
+        PAIRS_TO_TEST_WITH,
+        *BACKTEST_THRESHOLDS_TO_TEST,
+        live_pairs=np.ones(len(PAIRS_TO_TEST_WITH), dtype=bool),
+    )
+    np.testing.assert_array_equal(
+        testing_backtest_results["valuation"],
+        expected_backtest_results["valuation"][-NUMBER_OF_NEW_DATES:],
+    )
+    np.testing.assert_array_equal(
+        testing_state_df["backtest_capital"],
+        expected_backtest_results["state"]["capital"],
+    )
+    expected_closed_on_new_dates = (
+        expected_backtest_results["dates"][
+            expected_backtest_results["trades"]["closing_position"].astype(np.int64)
+        ]
+        >= new_dates[0]
+    )
+    assert expected_closed_on_new_dates.sum() > 0
+    for position_field in ["opening_position", "closing_position"]:
+        np.testing.assert_array_equal(
+            prices_df.index[testing_backtest_results["trades"][position_field]],
+            expected_backtest_results["dates"][
+                expected_backtest_results["trades"][position_field].astype(np.int64)
+            ][expected_closed_on_new_dates],
+        )
+    assert (testing_state_df["last_update_date"] == prices_df.index[-1]).all()
+
+
+def test_advance_incremental_state_skips_missing_prices_like_full_recomputation():
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+    prices_df.iloc[600:603, 0] = np.nan
+    prices_df.iloc[NUMBER_OF_DATES - 1, 3] = np.nan
+    prices_df.iloc[NUMBER_OF_DATES + 5 : NUMBER_OF_DATES + 8, 1] = np.nan
+    old_prices_df = prices_df.iloc[:NUMBER_OF_DATES]
+    old_series = pipeline_series(results_df, old_prices_df)
+    state_df, _ = build_incremental_state(
+        results_df,
+        old_prices_df,
+        old_series["standardised_spread"],
+        old_series["regular_spread"],
+        old_series["regular_spread_kalman"],
+        old_series["hedge_ratio_kalman"],
+        *BACKTEST_THRESHOLDS_TO_TEST,
+    )
+
+    _, testing_series, _ = advance_incremental_state(
+        state_df, prices_df, NUMBER_OF_DATES
+    )
+
+    full_series = pipeline_series(
+        results_df.assign(pair_finish_date=prices_df.index[-1]), prices_df
+    )
+    new_dates = prices_df.index[NUMBER_OF_DATES:]
+    assert testing_series["hedge_ratio_kalman"].isna().sum().tolist() == [3, 0]
+    pd.testing.assert_frame_equal(
+        testing_series["hedge_ratio_kalman"],
+        full_series["hedge_ratio_kalman"].loc[new_dates],
+        check_exact=True,
+        check_freq=False,
+    )
+
+
+def test_append_new_prices_only_adds_later_rows(
+    tmp_path,
+):
+
+    prices_df, _ = generate_testing_prices_and_results_df()
+    prices_df.iloc[:NUMBER_OF_DATES].to_parquet(tmp_path / "prices.parquet")
+
+    testing_obj, first_new_position = append_new_prices(
+        prices_df.iloc[NUMBER_OF_DATES - 5 :][["DDD", "AAA", "CCC"]],
+        pathway=tmp_path / "prices.parquet",
+    )
+
+    assert first_new_position == NUMBER_OF_DATES
+    expected_obj = prices_df.copy()
+    expected_obj.iloc[NUMBER_OF_DATES:, 1] = np.nan
+    pd.testing.assert_frame_equal(testing_obj, expected_obj, check_freq=False)
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(tmp_path / "prices.parquet"), expected_obj, check_freq=False
+    )
@@ -0,0 +1,137 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+import main.model_building.scripts.cointegration_testing as cointegration_testing
+from main.model_building.scripts.cointegration_testing import (
+    prefilter_pairs,
+    prefilter_recall_report,
+    perform_multiple_cointegration_tests,
+)
+
+NUMBER_OF_TICKERS = 6
+TICKER_SECTORS = {
+    "T0": "Energy",
+    "T1": "Energy",
+    "T2": "Energy",
+    "T3": "Utilities",
+    "T4": "Utilities",
+}
+
+
+def generate_testing_prices_df() -> pd.DataFrame:
+
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range("2010-01-01", "2016-01-01")
+    common_trend = np.cumsum(rng.normal(size=len(dates)))
+    prices_df = pd.DataFrame(
+        {
+            f"T{ticker_number}": 1_000
+            + common_trend * (ticker_number % 2)
+            + np.cumsum(rng.normal(scale=0.5 + ticker_number, size=len(dates)))
+            for ticker_number in range(NUMBER_OF_TICKERS)
+        },
+        index=dates,
+    )
+    prices_df.loc[prices_df.index[:200], "T5"] = np.nan
+
+    return prices_df
+
+
+def test_prefilter_pairs_scores_on_the_training_window():
+
+    prices_df = generate_testing_prices_df()
+    training_prices_df = prices_df.loc[: cointegration_testing.TRADING_DATE_MID_POINT]
+
+    testing_obj = prefilter_pairs(prices_df, method="correlation")
+
+    assert list(zip(testing_obj["first_ticker"], testing_obj["second_ticker"])) == list(
+        combinations(prices_df.columns, 2)
+    )
+    expected_correlations = training_prices_df.pct_change(fill_method=None).corr()
+    for _, row in testing_obj.iterrows():
+        assert np.isclose(
+            row["prefilter_score"],
+            expected_correlations.loc[row["first_ticker"], row["second_ticker"]],
+            atol=1e-12 if row["second_ticker"] != "T5" else 1e-2,
+        )
+
+    testing_obj = prefilter_pairs(prices_df, method="distance")
+
+    row = testing_obj.iloc[-1]
+    normalised_prices_df = training_prices_df / training_prices_df.apply(
+        lambda prices: prices.dropna().iloc[0]
+    )
+    expected_distance = (
+        (
+            normalised_prices_df[row["first_ticker"]]
+            - normalised_prices_df[row["second_ticker"]]
+        )
+        ** 2
+    ).mean()
+    assert np.isclose(row["prefilter_score"], -expected_distance)
+
+
+def test_prefilter_pairs_applies_top_k_threshold_and_sector():
+
+    prices_df = generate_testing_prices_df()
+
+    testing_obj = prefilter_pairs(prices_df, method="correlation", top_k_per_ticker=1)
+
+    correlation_scores = prefilter_pairs(prices_df, method="correlation")
+    best_partners = set()
+    for ticker in prices_df.columns:
+        ticker_scores = correlation_scores[
+            (correlation_scores["first_ticker"] == ticker)
+            | (correlation_scores["second_ticker"] == ticker)
+        ]
+        best_row = ticker_scores.loc[ticker_scores["prefilter_score"].idxmax()]
+        best_partners.add((best_row["first_ticker"], best_row["second_ticker"]))
+    assert set(zip(testing_obj["first_ticker"], testing_obj["second_ticker"])) == (
+        best_partners
+    )
+
+    testing_obj = prefilter_pairs(
+        prices_df,
+        method="correlation",
+        score_threshold=0.5,
+        ticker_sectors=TICKER_SECTORS,
+    )
+
+    assert (testing_obj["prefilter_score"] >= 0.5).all()
+    assert (
+        testing_obj["first_ticker"].map(TICKER_SECTORS)
+        == testing_obj["second_ticker"].map(TICKER_SECTORS)
+    ).all()
+    assert "T5" not in set(testing_obj["first_ticker"]) | set(
+        testing_obj["second_ticker"]
+    )
+
+
+def test_prefiltered_cointegration_tests_and_recall_report(mocker):
+
+    mocker.patch.object(cointegration_testing, "ENGLE_COINT_P_VALUE_THRESHOLD", 1.0)
+    prices_df = generate_testing_prices_df()
+    candidate_pairs_df = prefilter_pairs(
+        prices_df, method="distance", top_k_per_ticker=1
+    )
+
+    unfiltered_results_df = perform_multiple_cointegration_tests(prices_df)
+    testing_obj = perform_multiple_cointegration_tests(
+        prices_df, candidate_pairs_df=candidate_pairs_df
+    )
+
+    expected_obj = unfiltered_results_df.merge(
+        candidate_pairs_df[["first_ticker", "second_ticker"]]
+    )
+    pd.testing.assert_frame_equal(testing_obj, expected_obj)
+
+    recall_report = prefilter_recall_report(
+        unfiltered_results_df, candidate_pairs_df, NUMBER_OF_TICKERS
+    )
+
+    assert recall_report["pairs_total"] == len(unfiltered_results_df)
+    assert recall_report["pairs_tested"] == len(candidate_pairs_df)
+    assert recall_report["cointegrated_pairs_recovered"] == len(testing_obj)
+    assert recall_report["recall"] == len(testing_obj) / len(unfiltered_results_df)
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+import main.utilities.functions as functions
+from main.utilities.series_store import (
+    get_series_store,
+)
+from main.model_building.scripts.adf_testing import perform_adf_single
+from main.model_building.scripts.hurst_exponent import perform_hurst_exponent_single
+from main.model_building.scripts.half_life import perform_half_life_ornstein_single
+from main.model_building.scripts.spread_diagnostics import (
+    SPREAD_DIAGNOSTICS,
+    register_spread_diagnostic,
+    spread_diagnostics_whole_set,
+)
+
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("CCC", "DDD"), ("EEE", "FFF")]
+BATCHED_COLUMNS = ["adf_result", "hurst_exponent_results", "half_life_results"]
+
+
+def spread_length_diagnostic(
+    row: pd.Series,
+    spread_series_from_rolling: pd.DataFrame | None = None,
+) -> float:
+    return float(len(spread_series_from_rolling))
+
+
+def write_testing_spreads(
+    tmp_path,
+) -> pd.DataFrame:
+
+    rng = np.random.default_rng(8)
+    series_store = get_series_store(str(tmp_path / "spread_database.db"))
+    for pair_number, (first_ticker, second_ticker) in enumerate(PAIRS_TO_TEST_WITH):
+        dates = pd.bdate_range(
+            "2010-01-01", periods=600 + 100 * pair_number, name="Date"
+        )[50 * pair_number :]
+        innovations = rng.normal(size=len(dates))
+        spread_values = np.zeros(len(dates))
+        for position in range(1, len(dates)):
+            spread_values[position] = (
+                0.95 * spread_values[position - 1] + innovations[position]
+            )
+        series_store.write_series(
+            first_ticker,
+            second_ticker,
+            "regular_spread",
+            pd.Series(spread_values, index=dates),
+        )
+
+    return pd.DataFrame(
+        {
+            "first_ticker": [pair[0] for pair in PAIRS_TO_TEST_WITH],
+            "second_ticker": [pair[1] for pair in PAIRS_TO_TEST_WITH],
+            "engle_test_training": [0.01, 0.2, 0.03],
+        },
+        index=[5, 6, 7],
+    )
+
+
+def test_spread_diagnostics_whole_set_reads_each_spread_once(
+    mocker,
+    tmp_path,
+):
+
+    mocker.patch("main.model_building.scripts.spread_diagnostics.CORES_TO_USE", 1)
+    mocker.patch(
+        "main.utilities.functions.get_series_store",
+        side_effect=lambda pathway: get_series_store(
+            str(tmp_path / "spread_database.db")
+        ),
+    )
+    results_df = write_testing_spreads(tmp_path)
+    mocker.patch.dict(SPREAD_DIAGNOSTICS)
+    register_spread_diagnostic("spread_length", spread_length_diagnostic)
+    retrieve_spy = mocker.spy(functions, "get_series_store")
+
+    testing_obj = spread_diagnostics_whole_set(results_df, batched=False)
+
+    assert retrieve_spy.call_count == len(results_df)
+    assert list(testing_obj.columns) == [
+        "adf_result",
+        "hurst_exponent_results",
+        "half_life_results",
+        "spread_length",
+    ]
+    assert testing_obj.index.equals(results_df.index)
+    assert testing_obj["spread_length"].tolist() == [600.0, 650.0, 700.0]
+    for index, row in results_df.iterrows():
+        adf_result = perform_adf_single(row)
+        if np.isnan(adf_result):
+            assert np.isnan(testing_obj.loc[index, "adf_result"])
+        else:
+            assert testing_obj.loc[index, "adf_result"] == adf_result
+        assert testing_obj.loc[
+            index, "hurst_exponent_results"
+        ] == perform_hurst_exponent_single(row)
+        assert testing_obj.loc[
+            index, "half_life_results"
+        ] == perform_half_life_ornstein_single(row)
+
+
+def test_spread_diagnostics_whole_set_batched_matches_single(
+    mocker,
+    tmp_path,
+):
+
+    mocker.patch("main.model_building.scripts.spread_diagnostics.CORES_TO_USE", 1)
+    mocker.patch(
+        "main.model_building.scripts.spread_diagnostics.SPREAD_DIAGNOSTICS_BATCH_SIZE",
+        2,
+    )
+    mocker.patch(
+        "main.utilities.functions.get_series_store",
+        side_effect=lambda pathway: get_series_store(
+            str(tmp_path / "spread_database.db")
+        ),
+    )
+    results_df = write_testing_spreads(tmp_path)
+    results_df.loc[8] = ["GGG", "HHH", 0.01]
+    mocker.patch.dict(SPREAD_DIAGNOSTICS)
+    register_spread_diagnostic("spread_length", spread_length_diagnostic)
+
+    testing_obj = spread_diagnostics_whole_set(results_df)
+    expected_obj = spread_diagnostics_whole_set(results_df.iloc[:3], batched=False)
+
+    assert list(testing_obj.columns) == list(expected_obj.columns)
+    assert testing_obj.index.equals(results_df.index)
+    assert testing_obj.loc[8].isna().all()
+    pd.testing.assert_frame_equal(
+        testing_obj.iloc[:3].drop(columns=BATCHED_COLUMNS),
+        expected_obj.drop(columns=BATCHED_COLUMNS),
+        check_exact=True,
+        check_dtype=False,
+    )
+    np.testing.assert_allclose(
+        testing_obj[BATCHED_COLUMNS].iloc[:3],
+        expected_obj[BATCHED_COLUMNS],
+        rtol=1e-10,
+    )
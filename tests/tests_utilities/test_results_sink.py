@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from main.utilities.results_sink import (
+    ResultsSink,
+)
+
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("CCC", "DDD"), ("AAA", "DDD"), ("BBB", "CCC")]
+
+
+def generate_testing_rows(
+    pairs: list[tuple[str, str]],
+) -> list[dict]:
+
+    return [
+        {
+            "first_ticker": first_ticker,
+            "second_ticker": second_ticker,
+            "sharpe_ratio": float(number),
+        }
+        for number, (first_ticker, second_ticker) in enumerate(pairs)
+    ]
+
+
+def test_results_sink_flushes_row_groups_as_rows_arrive(
+    tmp_path,
+):
+
+    results_sink = ResultsSink(
+        str(tmp_path), partition={"kalman": False}, row_group_size=2
+    )
+    for row in generate_testing_rows(PAIRS_TO_TEST_WITH[:3]):
+        results_sink.append([row])
+
+    assert results_sink.written_keys() == set(PAIRS_TO_TEST_WITH[:2])
+    assert os.path.isdir(tmp_path / "kalman=False")
+
+    results_sink.flush()
+    pd.testing.assert_frame_equal(
+        results_sink.read().sort_values("sharpe_ratio", ignore_index=True),
+        pd.DataFrame(generate_testing_rows(PAIRS_TO_TEST_WITH[:3])),
+    )
+
+
+def test_results_sink_resumes_then_compacts(
+    tmp_path,
+):
+
+    with ResultsSink(str(tmp_path), row_group_size=1) as results_sink:
+        results_sink.append(generate_testing_rows(PAIRS_TO_TEST_WITH[:2]))
+
+    resumed_results_sink = ResultsSink(str(tmp_path), resume=True, row_group_size=2)
+    assert resumed_results_sink.written_keys() == set(PAIRS_TO_TEST_WITH[:2])
+    resumed_results_sink.append(generate_testing_rows(PAIRS_TO_TEST_WITH)[2:])
+    resumed_results_sink.compact()
+
+    file_names = os.listdir(resumed_results_sink.directory)
+    assert file_names == ["compacted.parquet"]
+    assert pq.ParquetFile(tmp_path / "compacted.parquet").metadata.num_row_groups == 2
+    testing_obj = resumed_results_sink.read().sort_values(
+        "sharpe_ratio", ignore_index=True
+    )
+    pd.testing.assert_frame_equal(
+        testing_obj, pd.DataFrame(generate_testing_rows(PAIRS_TO_TEST_WITH))
+    )
+
+    assert ResultsSink(str(tmp_path)).written_keys() == set()
+
+
+def test_results_sink_read_keeps_last_row_of_each_key(
+    tmp_path,
+):
+
+    results_sink = ResultsSink(str(tmp_path), row_group_size=1)
+    results_sink.append(generate_testing_rows(PAIRS_TO_TEST_WITH[:1]))
+    results_sink.append([dict(generate_testing_rows(PAIRS_TO_TEST_WITH[:1])[0])])
+    results_sink.compact()
+    results_sink.append(
+        [{"first_ticker": "AAA", "second_ticker": "BBB", "sharpe_ratio": np.nan}]
+    )
+
+    testing_obj = results_sink.read()
+
+    assert len(testing_obj) == 1
+    assert np.isnan(testing_obj["sharpe_ratio"].iloc[0])
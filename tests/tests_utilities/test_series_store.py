@@ -0,0 +1,240 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+
+from main.utilities.series_store import (
+    get_series_store,
+    split_series_suffix,
+    backtest_parameters_series_type,
+    migrate_sqlite_database_to_series_store,
+    SQLiteSeriesStore,
+    SeriesNotFoundError,
+    SeriesRecord,
+)
+from main.utilities.functions import (
+    retrieve_spread_table_from_sql_df,
+    retrieve_spread_tables_from_sql_df,
+    retrieve_backtest_equity_curve_spread_table_from_sql_df,
+    get_table_from_backtest_results_dfs,
+)
+
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("CCC", "DDD")]
+SERIES_BACKENDS_TO_TEST = ["sqlite", "parquet"]
+
+
+def generate_testing_spread(
+    start_date: str,
+    periods: int,
+) -> pd.Series:
+
+    return pd.Series(
+        np.arange(periods, dtype=float),
+        index=pd.date_range(start_date, periods=periods, name="Date"),
+    )
+
+
+@pytest.mark.parametrize(
+    "series_suffix, expected",
+    [
+        ("_regular_spread", ("regular_spread", False)),
+        ("_standardised_spread_kalman", ("standardised_spread", True)),
+        ("_2_0p5_6", ("2_0p5_6", False)),
+        ("_kalman", ("hedge_ratio", True)),
+        ("", ("hedge_ratio", False)),
+    ],
+)
+def test_split_series_suffix(series_suffix, expected):
+
+    assert split_series_suffix(series_suffix) == expected
+
+
+def test_backtest_parameters_series_type_is_the_same_for_ints_and_floats():
+
+    assert backtest_parameters_series_type(2, 0.5, 6) == "2_0p5_6"
+    assert backtest_parameters_series_type(2.0, 0.5, 6.0) == "2_0p5_6"
+    assert backtest_parameters_series_type(2.0, 0.5, 6) != (
+        backtest_parameters_series_type(20, 0.5, 6)
+    )
+    assert backtest_parameters_series_type(1.5, 0.1, 3) == "1p5_0p1_3"
+
+
+@pytest.mark.parametrize("backend", SERIES_BACKENDS_TO_TEST)
+def test_retrieve_helpers_read_through_series_store(
+    mocker,
+    tmp_path,
+    backend,
+):
+
+    mocker.patch(
+        "main.utilities.functions.get_series_store",
+        side_effect=lambda pathway: get_series_store(pathway, backend=backend),
+    )
+    testing_db_pathway = str(tmp_path / "spread_database.db")
+    series_store = get_series_store(testing_db_pathway, backend=backend)
+    spread_series_list = [
+        generate_testing_spread("2020-01-01", 10),
+        generate_testing_spread("2020-01-05", 10),
+    ]
+    for (first_ticker, second_ticker), spread_series in zip(
+        PAIRS_TO_TEST_WITH, spread_series_list
+    ):
+        series_store.write_series(
+            first_ticker, second_ticker, "regular_spread", spread_series, kalman=True
+        )
+
+    testing_obj = retrieve_spread_table_from_sql_df(
+        pd.Series({"first_ticker": "AAA", "second_ticker": "BBB"}),
+        pathway=testing_db_pathway,
+        spread_type="_regular_spread_kalman",
+    )
+    assert list(testing_obj.columns) == ["AAA_BBB_regular_spread_kalman"]
+    assert testing_obj.index.equals(spread_series_list[0].index)
+    assert np.array_equal(testing_obj.squeeze().to_numpy(), spread_series_list[0])
+
+    testing_obj = retrieve_spread_tables_from_sql_df(
+        pd.DataFrame(
+            [("CCC", "DDD"), ("EEE", "FFF"), ("AAA", "BBB")],
+            columns=["first_ticker", "second_ticker"],
+        ),
+        pathway=testing_db_pathway,
+        spread_type="_regular_spread_kalman",
+    )
+    expected_obj = pd.concat(
+        [
+            spread_series_list[1].rename("CCC_DDD"),
+            spread_series_list[0].rename("AAA_BBB"),
+        ],
+        axis=1,
+    ).sort_index()
+    pd.testing.assert_frame_equal(testing_obj, expected_obj, check_freq=False)
+
+    with pytest.raises(SeriesNotFoundError):
+        retrieve_spread_table_from_sql_df(
+            pd.Series({"first_ticker": "AAA", "second_ticker": "BBB"}),
+            pathway=testing_db_pathway,
+        )
+
+
+@pytest.mark.parametrize("backend", SERIES_BACKENDS_TO_TEST)
+def test_backtest_outputs_round_trip(
+    mocker,
+    tmp_path,
+    backend,
+):
+
+    mocker.patch(
+        "main.utilities.functions.get_series_store",
+        side_effect=lambda pathway: get_series_store(pathway, backend=backend),
+    )
+    testing_db_pathway = str(tmp_path / "backtest_results_df_database.db")
+    series_store = get_series_store(testing_db_pathway, backend=backend)
+    valuation_ledger = generate_testing_spread("2020-01-01", 5).to_frame(
+        "AAA_BBB_regular_spread"
+    )
+    valuation_ledger["valuation"] = 100_000.0
+    trade_history_frame = pd.DataFrame(
+        {
+            "opening_position": [1.5, np.nan],
+            "closing_capital": [100_500.0, np.nan],
+            "opened_abandoned": [False, True],
+        }
+    )
+    series_store.write_series("AAA", "BBB", "2_0p5_6", valuation_ledger)
+    series_store.write_series("AAA", "BBB", "2_0p5_6", trade_history_frame, kalman=True)
+
+    testing_obj = retrieve_backtest_equity_curve_spread_table_from_sql_df(
+        pd.Series({"first_ticker": "AAA", "second_ticker": "BBB"}),
+        pathway=testing_db_pathway,
+        backtest_parameters=(2, 0.5, 6),
+    )
+    assert testing_obj.tolist() == [100_000.0] * 5
+
+    testing_obj = get_table_from_backtest_results_dfs(
+        "AAA_BBB",
+        db_path=testing_db_pathway,
+        backtest_parameters=(2, 0.5, 6),
+        kalman=True,
+    )
+    assert testing_obj["opened_abandoned"].astype(bool).tolist() == [False, True]
+    assert testing_obj["closing_capital"].isna().tolist() == [False, True]
+
+
+@pytest.mark.parametrize("backend", SERIES_BACKENDS_TO_TEST)
+def test_append_series_many_extends_stored_series(
+    tmp_path,
+    backend,
+):
+
+    series_store = get_series_store(
+        str(tmp_path / "spread_database.db"), backend=backend
+    )
+    spread_series = generate_testing_spread("2020-01-01", 10)
+    valuation_ledger = spread_series.to_frame("AAA_BBB_regular_spread")
+    valuation_ledger["valuation"] = 100_000.0
+    series_store.write_series("AAA", "BBB", "regular_spread", spread_series[:8])
+    series_store.write_series("AAA", "BBB", "2_0p5_6", valuation_ledger[:8])
+
+    number_written = series_store.append_series_many(
+        [
+            SeriesRecord("AAA", "BBB", "regular_spread", spread_series[6:]),
+            SeriesRecord("AAA", "BBB", "2_0p5_6", valuation_ledger[7:]),
+            SeriesRecord("CCC", "DDD", "regular_spread", spread_series[:3]),
+        ]
+    )
+
+    assert number_written == 3
+    testing_obj = series_store.read_series("AAA", "BBB", "regular_spread")
+    assert list(testing_obj.columns) == ["AAA_BBB_regular_spread"]
+    assert testing_obj.squeeze().tolist() == spread_series.tolist()
+    testing_obj = series_store.read_series("AAA", "BBB", "2_0p5_6")
+    assert testing_obj.index.equals(valuation_ledger.index)
+    assert testing_obj["valuation"].tolist() == [100_000.0] * 10
+    assert len(series_store.read_series("CCC", "DDD", "regular_spread")) == 3
+
+
+def test_migrate_sqlite_database_to_series_store(tmp_path):
+
+    testing_db_pathway = str(tmp_path / "rolling_hedge_ratio_database.db")
+    sqlite_series_store = SQLiteSeriesStore(testing_db_pathway)
+    hedge_ratio_series = generate_testing_spread("2020-01-01", 10)
+    sqlite_series_store.write_series("AAA", "BBB", "hedge_ratio", hedge_ratio_series)
+    sqlite_series_store.write_series(
+        "AAA", "BBB", "hedge_ratio", hedge_ratio_series * 2, kalman=True
+    )
+
+    migrate_sqlite_database_to_series_store(testing_db_pathway, backend="parquet")
+
+    parquet_series_store = get_series_store(testing_db_pathway, backend="parquet")
+    for kalman in (False, True):
+        pd.testing.assert_frame_equal(
+            parquet_series_store.read_series(
+                "AAA", "BBB", "hedge_ratio", kalman=kalman
+            ),
+            sqlite_series_store.read_series("AAA", "BBB", "hedge_ratio", kalman=kalman),
+            check_freq=False,
+        )
+
+
+def test_sqlite_write_series_many_commits_in_batches_with_write_ahead_log(tmp_path):
+
+    testing_db_pathway = str(tmp_path / "spread_database.db")
+    sqlite_series_store = SQLiteSeriesStore(testing_db_pathway)
+    series_records = (
+        SeriesRecord(
+            f"T{pair_number}",
+            "BBB",
+            "regular_spread",
+            generate_testing_spread("2020-01-01", 5) * pair_number,
+        )
+        for pair_number in range(7)
+    )
+
+    number_written = sqlite_series_store.write_series_many(series_records, batch_size=3)
+
+    assert number_written == 7
+    with sqlite3.connect(testing_db_pathway) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    testing_obj = sqlite_series_store.read_series("T6", "BBB", "regular_spread")
+    assert list(testing_obj.columns) == ["T6_BBB_regular_spread"]
+    assert testing_obj.squeeze().tolist() == [0.0, 6.0, 12.0, 18.0, 24.0]
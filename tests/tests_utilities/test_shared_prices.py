@@ -0,0 +1,86 @@
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from main.utilities.shared_prices import (
+    shared_price_matrix,
+    SharedPriceMatrix,
+)
+from main.model_building.scripts.hedge_ratio_calculations import (
+    _process_row_rolling_hedge_ratio,
+)
+
+NUMBER_OF_TICKERS = 50
+NUMBER_OF_DATES = 2_000
+
+
+def generate_testing_prices_df() -> pd.DataFrame:
+
+    rng = np.random.default_rng(2)
+    prices_df = pd.DataFrame(
+        100 + np.cumsum(rng.normal(size=(NUMBER_OF_DATES, NUMBER_OF_TICKERS)), axis=0),
+        index=pd.bdate_range("2005-01-03", periods=NUMBER_OF_DATES, name="Date"),
+        columns=[f"T{ticker_number}" for ticker_number in range(NUMBER_OF_TICKERS)],
+    )
+    prices_df.iloc[:300, 1] = np.nan
+
+    return prices_df
+
+
+def test_shared_price_matrix_reads_like_prices_df_without_copying():
+
+    prices_df = generate_testing_prices_df()
+
+    with shared_price_matrix(prices_df) as shared_prices:
+        testing_obj = shared_prices["T1"]
+
+        pd.testing.assert_series_equal(testing_obj, prices_df["T1"], check_freq=False)
+        assert not testing_obj.to_numpy().flags.writeable
+        assert len(pickle.dumps(shared_prices)) < len(pickle.dumps(prices_df)) / 10
+        shared_prices_directory = shared_prices.directory
+
+    assert not os.path.exists(shared_prices_directory)
+
+
+def test_close_keeps_a_directory_given_by_the_caller(
+    tmp_path,
+):
+
+    prices_df = generate_testing_prices_df()
+    (tmp_path / "other_file.txt").write_text("kept")
+
+    shared_prices = SharedPriceMatrix.from_prices_df(prices_df, directory=str(tmp_path))
+    pd.testing.assert_series_equal(
+        shared_prices["T0"], prices_df["T0"], check_freq=False
+    )
+    shared_prices.close()
+
+    assert sorted(os.listdir(tmp_path)) == ["other_file.txt"]
+
+
+def test_workers_compute_the_same_hedge_ratios_from_shared_prices():
+
+    prices_df = generate_testing_prices_df()
+    row = pd.Series(
+        {
+            "first_ticker": "T0",
+            "second_ticker": "T1",
+            "pair_start_date": prices_df.index[300],
+            "trading_period_mid_point_date": prices_df.index[1_200],
+            "pair_finish_date": prices_df.index[-1],
+        }
+    )
+
+    expected_obj = _process_row_rolling_hedge_ratio(row, prices_df)
+    with shared_price_matrix(prices_df) as shared_prices:
+        testing_obj = Parallel(n_jobs=2)(
+            delayed(_process_row_rolling_hedge_ratio)(row, shared_prices)
+            for _ in range(2)
+        )
+
+    for hedge_ratio_series in testing_obj:
+        pd.testing.assert_frame_equal(
+            hedge_ratio_series, expected_obj, check_freq=False
+        )
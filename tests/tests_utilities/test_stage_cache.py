@@ -0,0 +1,151 @@
+import os
+import numpy as np
+import pandas as pd
+
+from main.utilities.stage_cache import (
+    StageCache,
+    cached_pair_outputs,
+    input_fingerprint,
+    pipeline_code_fingerprint,
+)
+from main.model_building.scripts.hedge_ratio_calculations import (
+    calculate_rolling_hedge_ratios_batched,
+)
+
+PAIRS_TO_TEST_WITH = [("AAA", "BBB"), ("CCC", "DDD"), ("AAA", "DDD")]
+
+
+def generate_testing_prices_and_results_df() -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    rng = np.random.default_rng(17)
+    dates = pd.bdate_range("2010-01-01", periods=900, name="Date")
+    prices_df = pd.DataFrame(
+        100 + np.cumsum(rng.normal(size=(len(dates), 4)), axis=0),
+        index=dates,
+        columns=["AAA", "BBB", "CCC", "DDD"],
+    )
+    results_df = pd.DataFrame(
+        {
+            "first_ticker": [pair[0] for pair in PAIRS_TO_TEST_WITH],
+            "second_ticker": [pair[1] for pair in PAIRS_TO_TEST_WITH],
+            "pair_start_date": dates[0],
+            "trading_period_mid_point_date": dates[600],
+            "pair_finish_date": dates[-1],
+        }
+    )
+
+    return prices_df, results_df
+
+
+def test_input_fingerprint_changes_with_values_only():
+
+    prices_df, _ = generate_testing_prices_and_results_df()
+    changed_prices_df = prices_df.copy()
+    changed_prices_df.iloc[-1, 0] += 1e-9
+
+    assert input_fingerprint(prices_df, 2, 0.5) == input_fingerprint(
+        prices_df.copy(), 2, 0.5
+    )
+    assert input_fingerprint(prices_df, 2, 0.5) != input_fingerprint(
+        changed_prices_df, 2, 0.5
+    )
+    assert input_fingerprint(prices_df, 2, 0.5) != input_fingerprint(prices_df, 2, 0.25)
+
+
+def test_cached_pair_outputs_only_recomputes_changed_pairs(
+    tmp_path,
+):
+
+    prices_df, results_df = generate_testing_prices_and_results_df()
+    stage_cache = StageCache(str(tmp_path))
+    computed_pairs = []
+
+    def compute_pairs(pairs_df):
+        computed_pairs.extend(zip(pairs_df["first_ticker"], pairs_df["second_ticker"]))
+        return calculate_rolling_hedge_ratios_batched(pairs_df, prices_df)
+
+    expected_obj = calculate_rolling_hedge_ratios_batched(results_df, prices_df)
+    for _ in range(2):
+        testing_obj = list(
+            cached_pair_outputs(
+                stage_cache, "hedge_ratio", results_df, prices_df, compute_pairs
+            )
+        )
+        for testing_series, expected_series in zip(testing_obj, expected_obj):
+            pd.testing.assert_frame_equal(testing_series, expected_series)
+    assert computed_pairs == PAIRS_TO_TEST_WITH
+
+    prices_df["CCC"] *= 1.01
+    computed_pairs.clear()
+    list(
+        cached_pair_outputs(
+            stage_cache, "hedge_ratio", results_df, prices_df, compute_pairs
+        )
+    )
+    assert computed_pairs == [("CCC", "DDD")]
+
+    computed_pairs.clear()
+    list(
+        cached_pair_outputs(
+            stage_cache, "hedge_ratio", results_df, prices_df, compute_pairs, 250
+        )
+    )
+    assert computed_pairs == PAIRS_TO_TEST_WITH
+
+
+def test_cached_stage_skips_unchanged_inputs(
+    tmp_path,
+    mocker,
+):
+
+    stage_cache = StageCache(str(tmp_path))
+    compute_stage = mocker.Mock(return_value=pd.DataFrame({"engle": [0.01]}))
+
+    for _ in range(2):
+        testing_obj = stage_cache.cached_stage("cointegration", compute_stage, 1, "a")
+        pd.testing.assert_frame_equal(testing_obj, pd.DataFrame({"engle": [0.01]}))
+    stage_cache.cached_stage("cointegration", compute_stage, 2, "a")
+
+    assert compute_stage.call_count == 2
+
+
+def test_cached_stage_recomputes_after_a_code_change(
+    tmp_path,
+    mocker,
+):
+
+    stage_cache = StageCache(str(tmp_path / "stage_cache"))
+    compute_stage = mocker.Mock(return_value=pd.DataFrame({"engle": [0.01]}))
+    source_directory = tmp_path / "main"
+    source_directory.mkdir()
+
+    code_fingerprints = []
+    for stage_version in [1, 1, 2]:
+        (source_directory / "stage.py").write_text(f"STAGE_VERSION = {stage_version}\n")
+        pipeline_code_fingerprint.cache_clear()
+        code_fingerprints.append(pipeline_code_fingerprint(str(source_directory)))
+        mocker.patch(
+            "main.utilities.stage_cache.pipeline_code_fingerprint",
+            return_value=code_fingerprints[-1],
+        )
+        stage_cache.cached_stage("cointegration", compute_stage, 1, "a")
+
+    assert code_fingerprints[0] == code_fingerprints[1] != code_fingerprints[2]
+    assert compute_stage.call_count == 2
+
+
+def test_evict_removes_least_recently_used_entries(
+    tmp_path,
+):
+
+    stage_cache = StageCache(str(tmp_path))
+    for entry_number, key in enumerate(["first", "second", "third"]):
+        stage_cache.store(key, np.zeros(1_000))
+        os.utime(stage_cache._entry_path(key), ns=(entry_number, entry_number))
+    stage_cache.load("first")
+    stage_cache.max_bytes = 2 * os.path.getsize(stage_cache._entry_path("first"))
+
+    assert stage_cache.evict() == 1
+    assert "second" not in stage_cache
+    assert "first" in stage_cache and "third" in stage_cache
+    assert stage_cache.evict() == 0